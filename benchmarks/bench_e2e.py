@@ -0,0 +1,194 @@
+"""
+端到端基准测试：用合成语料通过本地插件运行时调用全部工具
+
+按文档类型（合同、制度、普通文档）× 页数 × 是否碎片化Run生成语料，
+对每份文档调用word-chunk、word_comment、word_insert_text（PDF语料调用pdf_to_word），
+记录墙钟时间、峰值内存、输出大小和各阶段耗时，结果保存为JSON。
+指定--baseline时与之前保存的结果逐项对比，列出变慢超过阈值的用例。
+
+用法:
+    python benchmarks/bench_e2e.py [--pages 10,100,1000] [--kinds contract,policy,general]
+        [--tools word-chunk,word_comment,word_insert_text,pdf_to_word] [--fragmented]
+        [--repeat 3] [--output results.json] [--baseline old.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from corpus import DOCUMENT_KINDS, generate_blocks, load_or_build, sample_comment_keys
+from runtime import ROOT_DIR, TOOL_SOURCES, LocalPluginRuntime
+
+DEFAULT_CORPUS_DIR = os.path.join(tempfile.gettempdir(), "word_tools_bench_corpus")
+
+# pdf2docx转换很慢（每页约0.3秒），超过该页数的PDF用例会超过工作进程的任务超时，默认跳过
+DEFAULT_PDF_MAX_PAGES = 100
+
+# 插入工具使用的Markdown报告（标题、列表、表格、代码），模拟LLM生成的审核意见
+INSERT_REPORT = "\n".join(
+    ["## 审核意见", ""]
+    + [f"{i}. **第{i}项**：建议补充*违约责任*条款，并明确`付款节点`。" for i in range(1, 21)]
+    + ["", "| 条款 | 风险等级 | 建议 |", "|---|---|---|"]
+    + [f"| 第{i}条 | 中 | 补充约定 |" for i in range(1, 31)]
+    + ["", "- 保密义务", "    - 期限不少于两年", "- 知识产权归属", ""]
+)
+
+
+def tool_cases(kind, pages, fragmented, blocks, tools, pdf_max_pages):
+    """生成一份语料上的全部调用：(工具名, 输入扩展名, 工具参数)"""
+    cases = []
+    if "word-chunk" in tools:
+        cases.append(("word-chunk", ".docx", {"chunk_num": 30, "docx_type": kind}))
+    if "word_comment" in tools:
+        comments = sample_comment_keys(blocks, exact=10, fuzzy=5, missing=5, multi_line=2)
+        cases.append(
+            ("word_comment", ".docx", {"comments_json": json.dumps(comments, ensure_ascii=False)})
+        )
+    if "word_insert_text" in tools:
+        cases.append(
+            (
+                "word_insert_text",
+                ".docx",
+                {"text_to_insert": INSERT_REPORT, "is_markdown": True, "insert_position": "end"},
+            )
+        )
+    if "pdf_to_word" in tools and not fragmented and pages <= pdf_max_pages:
+        cases.append(("pdf_to_word", ".pdf", {}))
+    return cases
+
+
+def run_case(runtime, tool, blob, filename, parameters, repeat):
+    """重复调用工具，返回用例结果（耗时取最小值和中位数，峰值内存取最大值）"""
+    seconds = []
+    peaks = []
+    last = None
+    for _ in range(repeat):
+        last = runtime.invoke(tool, blob, filename, **dict(parameters))
+        if not last.ok:
+            break
+        seconds.append(last.seconds)
+        if last.peak_memory_mb is not None:
+            peaks.append(last.peak_memory_mb)
+
+    result = {"input_bytes": len(blob)}
+    if not last.ok:
+        result["error"] = last.summary_error()
+        return result
+    result.update(
+        {
+            "wall_seconds_min": round(min(seconds), 4),
+            "wall_seconds_median": round(statistics.median(seconds), 4),
+            "peak_memory_mb": max(peaks) if peaks else None,
+            "output_bytes": last.output_bytes,
+            "stages_ms": last.metrics.get("stages_ms") if last.metrics else None,
+        }
+    )
+    return result
+
+
+def environment():
+    """记录结果对应的代码版本和运行环境"""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "env": {key: value for key, value in os.environ.items() if key.startswith("WORD_TOOLS_")},
+    }
+
+
+def compare(results, baseline, threshold):
+    """与基准结果逐项对比，返回 (对比行, 变慢超过阈值的用例数)"""
+    rows = []
+    regressions = 0
+    for key, case in results.items():
+        old = baseline.get("cases", {}).get(key)
+        if not case.get("wall_seconds_min") or not (old or {}).get("wall_seconds_min"):
+            continue
+        ratio = case["wall_seconds_min"] / old["wall_seconds_min"]
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  <-- 变慢"
+            regressions += 1
+        rows.append(
+            f"{key:<48} {old['wall_seconds_min']:>9.3f}s -> {case['wall_seconds_min']:>9.3f}s"
+            f"  x{ratio:.2f}{flag}"
+        )
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", default="10,100,1000", help="页数，逗号分隔")
+    parser.add_argument("--kinds", default=",".join(DOCUMENT_KINDS), help="文档类型，逗号分隔")
+    parser.add_argument("--tools", default=",".join(TOOL_SOURCES), help="工具，逗号分隔")
+    parser.add_argument("--fragmented", action="store_true", help="同时测试碎片化Run的文档")
+    parser.add_argument("--repeat", type=int, default=3, help="每个用例重复次数")
+    parser.add_argument(
+        "--pdf-max-pages", type=int, default=DEFAULT_PDF_MAX_PAGES, help="PDF用例的最大页数"
+    )
+    parser.add_argument("--corpus-dir", default=DEFAULT_CORPUS_DIR, help="语料缓存目录")
+    parser.add_argument("--output", help="结果JSON文件，默认输出到标准输出")
+    parser.add_argument("--baseline", help="之前保存的结果JSON，用于对比")
+    parser.add_argument("--threshold", type=float, default=0.1, help="判定变慢的比例阈值")
+    args = parser.parse_args()
+
+    tools = [name for name in args.tools.split(",") if name]
+    runtime = LocalPluginRuntime(tools)
+    cases = {}
+    try:
+        for kind in args.kinds.split(","):
+            for pages in [int(value) for value in args.pages.split(",") if value]:
+                blocks = generate_blocks(kind, pages)
+                for fragmented in [False, True] if args.fragmented else [False]:
+                    for tool, ext, parameters in tool_cases(
+                        kind, pages, fragmented, blocks, tools, args.pdf_max_pages
+                    ):
+                        blob = load_or_build(args.corpus_dir, kind, pages, ext, fragmented)
+                        key = f"{tool}/{kind}/{pages}p" + ("/fragmented" if fragmented else "")
+                        print(f"运行 {key} ...", file=sys.stderr)
+                        cases[key] = run_case(
+                            runtime, tool, blob, f"{kind}{ext}", parameters, args.repeat
+                        )
+    finally:
+        runtime.close()
+
+    report = {"environment": environment(), "repeat": args.repeat, "cases": cases}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存到 {args.output}", file=sys.stderr)
+    else:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        rows, regressions = compare(cases, baseline, args.threshold)
+        print(f"\n与 {args.baseline}（{baseline['environment'].get('commit')}）对比:", file=sys.stderr)
+        for row in rows:
+            print(row, file=sys.stderr)
+        if regressions:
+            print(f"{regressions} 个用例变慢超过 {args.threshold:.0%}", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+插件冷启动导入耗时基准
+
+插件进程启动时会加载所有工具模块。本脚本在全新的子进程中分别测量：
+dify_plugin框架本身的导入耗时、每个工具模块在框架之上额外的导入耗时、
+以及加载全部工具模块（与main.py启动时一致）的总耗时，并列出被连带导入的重量级依赖。
+
+用法:
+    python benchmarks/bench_import_time.py [--repeat 5]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 工具模块（与provider/word-chunk.yaml中的顺序一致）
+TOOL_MODULES = [
+    "tools/pdf_to_word.py",
+    "tools/word-chunk.py",
+    "tools/word_comment.py",
+    "tools/word_insert_text.py",
+]
+
+# 关注的重量级依赖
+HEAVY_MODULES = ["pdf2docx", "fitz", "cv2", "numpy", "markdown", "bs4"]
+
+# 在子进程中执行的测量代码：先导入框架，再按插件运行时的方式逐个加载工具模块
+_CHILD_SCRIPT = r"""
+import importlib.util, json, os, sys, time
+sys.path.insert(0, {root!r})
+os.chdir({root!r})
+start = time.perf_counter()
+import dify_plugin
+framework = time.perf_counter() - start
+start = time.perf_counter()
+for path in {paths!r}:
+    name = os.path.splitext(path)[0].replace("/", ".")
+    spec = importlib.util.spec_from_file_location(name, os.path.join({root!r}, path))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+tools = time.perf_counter() - start
+heavy = [m for m in {heavy!r} if m in sys.modules]
+print(json.dumps({{"framework": framework, "tools": tools, "heavy": heavy}}))
+"""
+
+
+def measure(paths, repeat):
+    """在全新子进程中加载指定的工具模块，返回最短的框架耗时、工具耗时和被导入的重量级依赖"""
+    best = None
+    for _ in range(repeat):
+        script = _CHILD_SCRIPT.format(root=ROOT_DIR, paths=paths, heavy=HEAVY_MODULES)
+        output = subprocess.run(
+            [sys.executable, "-c", script],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        # 插件日志也会输出到stdout，只取最后一行的测量结果
+        result = json.loads(output.strip().splitlines()[-1])
+        if best is None or result["tools"] < best["tools"]:
+            best = result
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="每项测试重复次数（取最短）")
+    args = parser.parse_args()
+
+    report = {"tools": {}}
+    for path in TOOL_MODULES:
+        result = measure([path], args.repeat)
+        report["tools"][path] = {
+            "import_ms": round(result["tools"] * 1000, 1),
+            "heavy_modules": result["heavy"],
+        }
+
+    result = measure(TOOL_MODULES, args.repeat)
+    report["framework_ms"] = round(result["framework"] * 1000, 1)
+    report["all_tools_ms"] = round(result["tools"] * 1000, 1)
+    report["all_tools_heavy_modules"] = result["heavy"]
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
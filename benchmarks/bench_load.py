@@ -0,0 +1,331 @@
+"""
+本地并发负载测试
+
+通过本地插件运行时（与插件进程一样运行在gevent上，使用同一个工作进程池和准入控制）
+模拟多个工作流同时调用插件：N个并发用户按负载配置中的权重随机选择请求，连续发送，
+报告整体和各请求类型的延迟分位数（p50/p95/p99）、吞吐量、错误率（按原因分类），
+以及插件进程和工作进程的常驻内存随时间的变化。不需要Dify服务或网络。
+
+负载配置为JSON列表，每项是一种请求:
+    [{"name": "chunk-contract", "tool": "word-chunk", "weight": 3,
+      "kind": "contract", "pages": 10, "parameters": {"chunk_num": 10, "docx_type": "contract"}}]
+word_comment的parameters中可以用 "comments": {"exact": 5, "fuzzy": 2, "missing": 1} 代替comments_json，
+按文档内容自动抽取批注key。不指定--profile时使用DEFAULT_PROFILE。
+--storage-cache使用内存中的插件存储替身，测试持久化结果缓存命中后的效果。
+
+用法:
+    python benchmarks/bench_load.py [--concurrency 8] [--duration 60 | --requests 200]
+        [--profile workload.json] [--think-time 0] [--storage-cache] [--output result.json]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+from corpus import generate_blocks, load_or_build, sample_comment_keys
+from runtime import LocalPluginRuntime
+
+# runtime导入dify_plugin时已完成gevent的monkey patch，与插件进程的运行环境一致
+import gevent  # noqa: E402
+from gevent.pool import Pool  # noqa: E402
+
+DEFAULT_CORPUS_DIR = os.path.join(tempfile.gettempdir(), "word_tools_bench_corpus")
+
+# 默认负载：以分段和插入为主，少量批注和PDF转换
+DEFAULT_PROFILE = [
+    {
+        "name": "chunk-contract-10p",
+        "tool": "word-chunk",
+        "weight": 4,
+        "kind": "contract",
+        "pages": 10,
+        "parameters": {"chunk_num": 10, "docx_type": "contract"},
+    },
+    {
+        "name": "chunk-policy-100p",
+        "tool": "word-chunk",
+        "weight": 2,
+        "kind": "policy",
+        "pages": 100,
+        "parameters": {"chunk_num": 30, "docx_type": "policy"},
+    },
+    {
+        "name": "insert-contract-10p",
+        "tool": "word_insert_text",
+        "weight": 3,
+        "kind": "contract",
+        "pages": 10,
+        "parameters": {"text_to_insert": "## 审核结论\n\n- 建议补充**违约责任**条款", "is_markdown": True},
+    },
+    {
+        "name": "comment-contract-10p",
+        "tool": "word_comment",
+        "weight": 1,
+        "kind": "contract",
+        "pages": 10,
+        "parameters": {"comments": {"exact": 2, "fuzzy": 1, "missing": 0}},
+    },
+    {
+        "name": "pdf-general-10p",
+        "tool": "pdf_to_word",
+        "weight": 1,
+        "kind": "general",
+        "pages": 10,
+        "parameters": {},
+    },
+]
+
+# RSS采样间隔（秒）
+RSS_SAMPLE_INTERVAL = 0.5
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """线性插值的分位数，q取0~100"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def _rss_kb(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError, IndexError):
+        pass
+    return 0
+
+
+def _child_pids(pid: int) -> List[int]:
+    """读取/proc找出pid的直接子进程（工作进程）"""
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # 进程名可能包含空格和括号，父进程号在最后一个")"之后的第二个字段
+                fields = f.read().rsplit(")", 1)[1].split()
+            if int(fields[1]) == pid:
+                children.append(int(entry))
+        except (OSError, ValueError, IndexError):
+            continue
+    return children
+
+
+def sample_rss(samples: List[Dict], started: float, interval: float) -> None:
+    """定时记录插件进程和工作进程的常驻内存（MB）"""
+    pid = os.getpid()
+    while True:
+        workers = [_rss_kb(child) for child in _child_pids(pid)]
+        samples.append(
+            {
+                "t": round(time.perf_counter() - started, 2),
+                "plugin_mb": round(_rss_kb(pid) / 1024, 1),
+                "workers_mb": round(sum(workers) / 1024, 1),
+                "workers": len(workers),
+            }
+        )
+        gevent.sleep(interval)
+
+
+def prepare_requests(profile: List[Dict], corpus_dir: str) -> List[Dict]:
+    """生成每种请求的输入文件和参数（语料按类型和页数缓存，多种请求可以共用）"""
+    prepared = []
+    for item in profile:
+        ext = ".pdf" if item["tool"] == "pdf_to_word" else ".docx"
+        blob = load_or_build(corpus_dir, item["kind"], item["pages"], ext)
+        parameters = dict(item.get("parameters", {}))
+        mix = parameters.pop("comments", None)
+        if mix is not None:
+            blocks = generate_blocks(item["kind"], item["pages"])
+            comments = sample_comment_keys(blocks, **mix)
+            parameters["comments_json"] = json.dumps(comments, ensure_ascii=False)
+        prepared.append(
+            {
+                "name": item.get("name", item["tool"]),
+                "tool": item["tool"],
+                "weight": item.get("weight", 1),
+                "blob": blob,
+                "filename": f"{item['kind']}{ext}",
+                "parameters": parameters,
+            }
+        )
+    return prepared
+
+
+def classify_error(message: str) -> str:
+    """按错误信息归类：内存准入拒绝、进程池排队已满、超时、其他"""
+    if "内存" in message and "请稍后重试" in message:
+        return "admission_rejected"
+    if "处理任务过多" in message:
+        return "pool_full"
+    if "超过" in message and "秒" in message:
+        return "timeout"
+    return "other"
+
+
+def run_load(runtime, requests, concurrency, duration, total, think_time, seed):
+    """并发执行请求，返回每个请求的 (名称, 开始时间, 耗时, 错误类型或None)"""
+    rng = random.Random(seed)
+    weights = [item["weight"] for item in requests]
+    records = []
+    started = time.perf_counter()
+    issued = [0]
+
+    def next_request():
+        if total is not None:
+            if issued[0] >= total:
+                return None
+        elif time.perf_counter() - started >= duration:
+            return None
+        issued[0] += 1
+        return rng.choices(requests, weights)[0]
+
+    def user(_):
+        while True:
+            item = next_request()
+            if item is None:
+                return
+            begin = time.perf_counter() - started
+            result = runtime.invoke(
+                item["tool"], item["blob"], item["filename"], **dict(item["parameters"])
+            )
+            error = None if result.ok else classify_error(result.summary_error() or "")
+            records.append((item["name"], begin, result.seconds, error))
+            if think_time:
+                gevent.sleep(rng.expovariate(1 / think_time))
+
+    pool = Pool(concurrency)
+    pool.map(user, range(concurrency))
+    return records, time.perf_counter() - started
+
+
+def summarize(records, elapsed) -> Dict:
+    def stats(items):
+        latencies = [seconds for _, _, seconds, error in items if error is None]
+        errors: Dict[str, int] = {}
+        for _, _, _, error in items:
+            if error is not None:
+                errors[error] = errors.get(error, 0) + 1
+        return {
+            "requests": len(items),
+            "succeeded": len(latencies),
+            "error_rate": round(sum(errors.values()) / len(items), 4) if items else 0.0,
+            "errors": errors,
+            "throughput_rps": round(len(latencies) / elapsed, 3) if elapsed else None,
+            "latency_seconds": {
+                name: round(value, 4) if value is not None else None
+                for name, value in (
+                    ("p50", percentile(latencies, 50)),
+                    ("p95", percentile(latencies, 95)),
+                    ("p99", percentile(latencies, 99)),
+                    ("max", max(latencies) if latencies else None),
+                )
+            },
+        }
+
+    by_name: Dict[str, list] = {}
+    for record in records:
+        by_name.setdefault(record[0], []).append(record)
+    return {
+        "elapsed_seconds": round(elapsed, 2),
+        "overall": stats(records),
+        "by_request": {name: stats(items) for name, items in by_name.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=8, help="并发用户数")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--duration", type=float, default=60.0, help="持续时间（秒）")
+    group.add_argument("--requests", type=int, help="总请求数（指定后忽略--duration）")
+    parser.add_argument("--profile", help="负载配置JSON文件")
+    parser.add_argument("--think-time", type=float, default=0.0, help="每个用户两次请求之间的平均间隔（秒）")
+    parser.add_argument("--seed", type=int, default=0, help="请求选择的随机种子")
+    parser.add_argument("--corpus-dir", default=DEFAULT_CORPUS_DIR, help="语料缓存目录")
+    parser.add_argument(
+        "--storage-cache", action="store_true", help="使用内存中的插件存储替身（1 MB配额）"
+    )
+    parser.add_argument("--output", help="结果JSON文件，默认输出到标准输出")
+    args = parser.parse_args()
+
+    profile = DEFAULT_PROFILE
+    if args.profile:
+        with open(args.profile, encoding="utf-8") as f:
+            profile = json.load(f)
+    requests = prepare_requests(profile, args.corpus_dir)
+    storage = None
+    if args.storage_cache:
+        from tools.utils.persistent_cache import InMemoryStorage
+
+        storage = InMemoryStorage(quota=1024 * 1024)
+    runtime = LocalPluginRuntime(sorted({item["tool"] for item in requests}), storage=storage)
+
+    rss_samples: List[Dict] = []
+    sampler = gevent.spawn(sample_rss, rss_samples, time.perf_counter(), RSS_SAMPLE_INTERVAL)
+    try:
+        records, elapsed = run_load(
+            runtime,
+            requests,
+            args.concurrency,
+            args.duration,
+            args.requests,
+            args.think_time,
+            args.seed,
+        )
+    finally:
+        sampler.kill()
+        runtime.close()
+
+    from tools.utils.admission import get_admission_controller
+    from tools.utils.persistent_cache import persistent_cache_stats
+    from tools.utils.process_pool import get_process_pool
+
+    report = {
+        "concurrency": args.concurrency,
+        "think_time": args.think_time,
+        "profile": [{key: value for key, value in item.items() if key != "parameters"} for item in profile],
+        **summarize(records, elapsed),
+        "pool": get_process_pool().stats(),
+        "admission": {
+            key: value
+            for key, value in get_admission_controller().stats().items()
+            if key != "models"
+        },
+        "storage_cache": persistent_cache_stats(),
+        "rss": {
+            "peak_plugin_mb": max((sample["plugin_mb"] for sample in rss_samples), default=None),
+            "peak_workers_mb": max((sample["workers_mb"] for sample in rss_samples), default=None),
+            "samples": rss_samples,
+        },
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    else:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+
+    overall = report["overall"]
+    print(
+        f"{overall['requests']} 个请求，成功 {overall['succeeded']} 个，"
+        f"错误率 {overall['error_rate']:.1%}，吞吐量 {overall['throughput_rps']} 请求/秒，"
+        f"p50/p95/p99 = {overall['latency_seconds']['p50']}/{overall['latency_seconds']['p95']}/"
+        f"{overall['latency_seconds']['p99']} 秒",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+"""
+word_comment匹配算法的复杂度基准
+
+不经过docx读写，直接用合成段落文本驱动WordCommentTool的匹配方法，
+分别扫描段落数、key数量、key长度、精确/模糊/不存在key的比例、跨段落key的比例，
+报告每个取值下的总耗时以及各层匹配（_find_fuzzy_match、跨段落匹配、关键词回退、
+相似度计算）的耗时和调用次数，可选用matplotlib画出扩展曲线。
+
+--engine可以指定另一个匹配引擎（module:factory），与当前算法在相同输入上对比耗时和匹配结果。
+引擎工厂返回一个可调用对象 match(keys, paragraphs, threshold) -> {key: 匹配到的段落序号列表}。
+
+用法:
+    python benchmarks/bench_matcher.py [--dimensions paragraphs,keys,key_length,mix,multi_line]
+        [--point-timeout 60] [--engine my_engine:create] [--plot out_dir] [--output result.json]
+"""
+
+import argparse
+import importlib
+import json
+import os
+import sys
+import time
+from typing import Callable, Dict, List
+
+from corpus import generate_blocks, paragraph_texts, sample_comment_keys
+from runtime import LocalPluginRuntime
+
+# 基准点：扫描某一维度时其他维度取这些值
+BASE_POINT = {
+    "paragraphs": 50,
+    "keys": 6,
+    "key_length": 30,
+    "mix": "2:1:1",
+    "multi_line": 0.0,
+}
+
+# 各维度默认的扫描取值
+SWEEPS = {
+    "paragraphs": [25, 50, 100, 200, 400],
+    "keys": [2, 4, 8, 16, 32],
+    "key_length": [10, 20, 40, 80, 160],
+    "mix": ["1:0:0", "0:1:0", "0:0:1", "2:1:1"],
+    "multi_line": [0.0, 0.25, 0.5],
+}
+
+# 需要计时的匹配层：方法名 -> 报告中的名称
+TIERS = {
+    "_find_fuzzy_match": "fuzzy_match",
+    "_find_cross_paragraph_match": "cross_paragraph",
+    "_find_flexible_cross_paragraph_match": "flexible_cross_paragraph",
+    "_find_best_keyword_match": "keyword_fallback",
+    "_calculate_similarity": "similarity",
+}
+
+
+class TierTimer:
+    """把工具实例上的匹配方法替换为计时包装，记录每层的累计耗时（含内层调用）和调用次数"""
+
+    def __init__(self, tool):
+        self.seconds: Dict[str, float] = {}
+        self.calls: Dict[str, int] = {}
+        for method, name in TIERS.items():
+            setattr(tool, method, self._wrap(name, getattr(tool, method)))
+
+    def _wrap(self, name: str, func: Callable) -> Callable:
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.seconds[name] = self.seconds.get(name, 0.0) + time.perf_counter() - start
+                self.calls[name] = self.calls.get(name, 0) + 1
+
+        return timed
+
+    def reset(self) -> None:
+        self.seconds = {}
+        self.calls = {}
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        return {
+            name: {"seconds": round(self.seconds[name], 4), "calls": self.calls[name]}
+            for name in self.seconds
+        }
+
+
+class CurrentEngine:
+    """
+    当前的匹配算法：与WordCommentTool.add_native_comments_to_document的匹配顺序一致，
+    单段落key逐段落调用_find_fuzzy_match，跨段落key先严格匹配、失败后灵活匹配
+    """
+
+    def __init__(self, tool):
+        self.tool = tool
+
+    def __call__(self, keys: List[str], paragraphs: List[str], threshold: float) -> Dict[str, List[int]]:
+        result: Dict[str, List[int]] = {}
+        indexed = [(None, text) for text in paragraphs]
+        for key in keys:
+            if "\n" in key:
+                found, span, _, _ = self.tool._find_cross_paragraph_match(key, indexed, 0, threshold)
+                if found:
+                    result[key] = list(range(span[0], span[1] + 1))
+                    continue
+                found, indices, _, _ = self.tool._find_flexible_cross_paragraph_match(
+                    key, indexed, 0, threshold
+                )
+                result[key] = list(indices) if found else []
+            else:
+                result[key] = [
+                    i
+                    for i, text in enumerate(paragraphs)
+                    if self.tool._find_fuzzy_match(key, text, threshold)[0]
+                ]
+        return result
+
+
+def build_inputs(point: Dict, seed: int = 0):
+    """按维度取值生成段落文本和批注key"""
+    # 普通文档的段落最长，按需要的段落数多生成一些页面
+    texts = []
+    pages = max(point["paragraphs"] // 4, 1)
+    while len(texts) < point["paragraphs"]:
+        blocks = generate_blocks("general", pages, seed)
+        texts = paragraph_texts(blocks)
+        pages *= 2
+    texts = texts[: point["paragraphs"]]
+    blocks = [("paragraph", text) for text in texts]
+
+    exact, fuzzy, missing = (int(value) for value in point["mix"].split(":"))
+    total = exact + fuzzy + missing
+    multi = int(round(point["keys"] * point["multi_line"]))
+    single = point["keys"] - multi
+    counts = [single * value // total for value in (exact, fuzzy, missing)] if total else [0, 0, 0]
+    # 取整的余数分给比例最大的类型
+    counts[max(range(3), key=lambda i: (exact, fuzzy, missing)[i])] += single - sum(counts)
+    keys = sample_comment_keys(
+        blocks,
+        exact=counts[0],
+        fuzzy=counts[1],
+        missing=counts[2],
+        multi_line=multi,
+        key_length=point["key_length"],
+        seed=seed,
+    )
+    return texts, list(keys)
+
+
+def load_engine(spec: str, tool):
+    """加载 module:factory 指定的匹配引擎，工厂接收WordCommentTool实例"""
+    module_name, _, factory = spec.partition(":")
+    module = importlib.import_module(module_name)
+    return getattr(module, factory or "create")(tool)
+
+
+def run_point(point, tool, timer, engines, threshold):
+    texts, keys = build_inputs(point)
+    result = {"point": dict(point), "key_count": len(keys), "engines": {}}
+    reference = None
+    for name, engine in engines.items():
+        timer.reset()
+        start = time.perf_counter()
+        matches = engine(keys, texts, threshold)
+        seconds = time.perf_counter() - start
+        entry = {
+            "seconds": round(seconds, 4),
+            "ms_per_pair": round(seconds * 1000 / max(len(keys) * len(texts), 1), 4),
+            "keys_matched": sum(1 for value in matches.values() if value),
+        }
+        if name == "current":
+            entry["tiers"] = timer.report()
+            reference = matches
+        elif reference is not None:
+            entry["agreement"] = round(
+                sum(1 for key in keys if bool(matches.get(key)) == bool(reference.get(key)))
+                / max(len(keys), 1),
+                4,
+            )
+        result["engines"][name] = entry
+    return result
+
+
+def plot(results, out_dir):
+    """每个维度画一张 耗时-取值 曲线（数值维度用对数坐标）"""
+    try:
+        import matplotlib
+
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print("未安装matplotlib，跳过绘图", file=sys.stderr)
+        return
+
+    os.makedirs(out_dir, exist_ok=True)
+    for dimension, points in results.items():
+        if not points:
+            continue
+        figure, axis = plt.subplots(figsize=(6, 4))
+        labels = [str(item["point"][dimension]) for item in points]
+        numeric = dimension not in ("mix",)
+        positions = [item["point"][dimension] for item in points] if numeric else range(len(points))
+        for engine in points[0]["engines"]:
+            axis.plot(positions, [item["engines"][engine]["seconds"] for item in points], "o-", label=engine)
+        tiers = sorted({tier for item in points for tier in item["engines"]["current"].get("tiers", {})})
+        for tier in tiers:
+            axis.plot(
+                positions,
+                [item["engines"]["current"]["tiers"].get(tier, {}).get("seconds", 0) for item in points],
+                "--",
+                label=f"current/{tier}",
+            )
+        if numeric and dimension != "multi_line":
+            axis.set_xscale("log")
+            axis.set_yscale("log")
+        else:
+            axis.set_xticks(list(positions))
+            axis.set_xticklabels(labels)
+        axis.set_xlabel(dimension)
+        axis.set_ylabel("seconds")
+        axis.legend(fontsize=7)
+        figure.tight_layout()
+        path = os.path.join(out_dir, f"matcher_{dimension}.png")
+        figure.savefig(path)
+        plt.close(figure)
+        print(f"已保存 {path}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dimensions", default=",".join(SWEEPS), help="要扫描的维度，逗号分隔")
+    for dimension, values in SWEEPS.items():
+        parser.add_argument(
+            f"--{dimension.replace('_', '-')}",
+            default=",".join(str(value) for value in values),
+            help=f"{dimension}的扫描取值",
+        )
+    parser.add_argument("--threshold", type=float, default=0.8, help="相似度阈值")
+    parser.add_argument(
+        "--point-timeout",
+        type=float,
+        default=60.0,
+        help="单个取值的耗时超过该秒数后，不再测试该维度更大的取值",
+    )
+    parser.add_argument("--engine", action="append", default=[], help="对比的匹配引擎 module:factory")
+    parser.add_argument("--plot", help="保存扩展曲线图的目录（需要matplotlib）")
+    parser.add_argument("--output", help="结果JSON文件，默认输出到标准输出")
+    args = parser.parse_args()
+
+    runtime = LocalPluginRuntime(["word_comment"], start_pool=False)
+    tool = runtime.create_tool("word_comment", "bench-matcher")
+    timer = TierTimer(tool)
+    engines = {"current": CurrentEngine(tool)}
+    for spec in args.engine:
+        engines[spec] = load_engine(spec, tool)
+
+    results = {}
+    for dimension in args.dimensions.split(","):
+        raw = getattr(args, dimension)
+        values = raw.split(",") if dimension == "mix" else [
+            (float if dimension == "multi_line" else int)(value) for value in raw.split(",")
+        ]
+        results[dimension] = []
+        for value in values:
+            point = dict(BASE_POINT, **{dimension: value})
+            print(f"{dimension}={value} ...", file=sys.stderr)
+            item = run_point(point, tool, timer, engines, args.threshold)
+            results[dimension].append(item)
+            if item["engines"]["current"]["seconds"] > args.point_timeout:
+                print(f"{dimension}={value} 超过 {args.point_timeout:g} 秒，停止该维度", file=sys.stderr)
+                break
+
+    report = {"base_point": BASE_POINT, "threshold": args.threshold, "sweeps": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    else:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    if args.plot:
+        plot(results, args.plot)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+pdf转word结果优化前后的对比基准
+
+对同一个PDF分别生成"未优化"和"已优化"两份docx，报告正文XML大小、Run数量，
+以及后续word-chunk分段和word_comment批注的耗时。
+
+用法:
+    python benchmarks/bench_pdf_optimize.py input.pdf [--comments comments.json] [--repeat 3]
+"""
+
+import argparse
+import importlib.util
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+import zipfile
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+
+def load_tool(relative_path, class_name, log_level=logging.ERROR):
+    """按插件运行时的方式从源码文件加载工具类，并创建不依赖Dify会话的实例"""
+    module_name = os.path.splitext(relative_path)[0].replace("/", ".")
+    spec = importlib.util.spec_from_file_location(
+        module_name, os.path.join(ROOT_DIR, relative_path)
+    )
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    tool_cls = getattr(module, class_name)
+    # 基准测试中屏蔽逐条处理日志，避免日志输出影响计时
+    tool_cls.logger.setLevel(log_level)
+    return tool_cls.from_credentials({})
+
+
+def document_xml_size(docx_path):
+    """返回docx中word/document.xml的未压缩大小"""
+    with zipfile.ZipFile(docx_path) as zf:
+        return zf.getinfo("word/document.xml").file_size
+
+
+def timed(func, repeat):
+    """重复执行func，返回最短耗时（秒）和最后一次的返回值"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def default_comments(docx_path, limit=20):
+    """从文档中抽取若干句子作为批注key，模拟LLM引用原文"""
+    from docx import Document
+
+    doc = Document(docx_path)
+    comments = {}
+    for paragraph in doc.paragraphs:
+        text = paragraph.text.strip()
+        if len(text) >= 12:
+            comments[text[: min(len(text), 40)]] = "基准测试批注"
+        if len(comments) >= limit:
+            break
+    return comments
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("pdf", help="输入PDF文件")
+    parser.add_argument("--comments", help="批注JSON文件（对象格式），默认从文档中抽取")
+    parser.add_argument("--repeat", type=int, default=3, help="每项测试重复次数")
+    args = parser.parse_args()
+
+    pdf_tool = load_tool("tools/pdf_to_word.py", "PdfToWordTool")
+    chunk_tool = load_tool("tools/word-chunk.py", "WordChunkTool")
+    comment_tool = load_tool("tools/word_comment.py", "WordCommentTool")
+
+    work_dir = tempfile.mkdtemp(prefix="bench_pdf_optimize_")
+    raw_path = os.path.join(work_dir, "raw.docx")
+    optimized_path = os.path.join(work_dir, "optimized.docx")
+
+    pdf_tool.pdf_to_docx(args.pdf, raw_path)
+    with open(raw_path, "rb") as src, open(optimized_path, "wb") as dst:
+        dst.write(src.read())
+    optimize_seconds, stats = timed(lambda: pdf_tool.optimize_docx(optimized_path), 1)
+
+    if args.comments:
+        with open(args.comments, encoding="utf-8") as f:
+            comments = json.load(f)
+    else:
+        comments = default_comments(raw_path)
+
+    report = {
+        "optimize_seconds": round(optimize_seconds, 4),
+        "optimize_stats": stats,
+        "variants": {},
+    }
+    for label, path in (("raw", raw_path), ("optimized", optimized_path)):
+        chunk_seconds, chunks = timed(
+            lambda: chunk_tool.smart_chunk_paragraphs(path, doc_type="contract"),
+            args.repeat,
+        )
+        output_path = os.path.join(work_dir, f"{label}_commented.docx")
+        comment_seconds, comment_count = timed(
+            lambda: comment_tool.add_native_comments_to_document(
+                path, output_path, comments
+            ),
+            args.repeat,
+        )
+        report["variants"][label] = {
+            "file_bytes": os.path.getsize(path),
+            "document_xml_bytes": document_xml_size(path),
+            "chunk_seconds": round(chunk_seconds, 4),
+            "chunk_count": len(chunks),
+            "comment_seconds": round(comment_seconds, 4),
+            "comments_added": comment_count,
+            "comments_requested": len(comments),
+        }
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+doc.save()与save_document()保存耗时对比（save_document直接复制未修改二进制部件的原始压缩数据，只重新序列化XML部件）
+
+对一个docx（默认自动生成含大量图片的文档）做一次典型修改（添加批注、插入段落），
+分别用两种方式保存，报告墙钟时间、CPU时间和输出大小，并校验输出可以正常打开。
+
+用法:
+    python benchmarks/bench_save.py [input.docx] [--images 40] [--image-kb 512] [--repeat 3]
+"""
+
+import argparse
+import json
+import os
+import struct
+import sys
+import tempfile
+import time
+import zlib
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+from docx import Document  # noqa: E402
+from docx.opc.constants import RELATIONSHIP_TYPE as RT  # noqa: E402
+from docx.shared import Inches  # noqa: E402
+
+from tools.utils.docx_save_utils import document_parts, save_document  # noqa: E402
+
+
+def random_png(path, size_kb):
+    """生成一张像素随机（几乎不可压缩）的PNG，模拟扫描件/照片"""
+    width = 256
+    height = max(1, size_kb * 1024 // (width * 3))
+    raw = b"".join(b"\x00" + os.urandom(width * 3) for _ in range(height))
+
+    def chunk(tag, data):
+        body = tag + data
+        return struct.pack(">I", len(data)) + body + struct.pack(">I", zlib.crc32(body))
+
+    with open(path, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n")
+        f.write(chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)))
+        f.write(chunk(b"IDAT", zlib.compress(raw, 1)))
+        f.write(chunk(b"IEND", b""))
+
+
+def build_image_document(path, images, image_kb, work_dir):
+    """生成一份图文混排的合同样例"""
+    doc = Document()
+    for i in range(images):
+        doc.add_paragraph(f"第{i + 1}条 本条款约定附件{i + 1}所示内容，双方应遵照执行。")
+        image_path = os.path.join(work_dir, f"image_{i}.png")
+        random_png(image_path, image_kb)
+        doc.add_picture(image_path, width=Inches(2))
+    doc.save(path)
+
+
+def modify(doc):
+    """模拟工具的典型修改：添加一个批注并插入一个段落"""
+    paragraph = doc.paragraphs[0]
+    doc.add_comment(paragraph.runs, text="基准测试批注", author="bench")
+    doc.add_paragraph("基准测试插入的段落")
+
+
+def measure(save, source_path, output_path, repeat):
+    """重复打开-修改-保存，返回保存阶段的最短墙钟时间和CPU时间"""
+    best_wall = best_cpu = None
+    for _ in range(repeat):
+        doc = Document(source_path)
+        modify(doc)
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        save(doc, output_path)
+        wall = time.perf_counter() - wall_start
+        cpu = time.process_time() - cpu_start
+        best_wall = wall if best_wall is None else min(best_wall, wall)
+        best_cpu = cpu if best_cpu is None else min(best_cpu, cpu)
+    # 校验输出可以被重新打开，且修改内容都在
+    check = Document(output_path)
+    assert check.paragraphs[-1].text == "基准测试插入的段落"
+    assert len(list(check.comments)) >= 1
+    return best_wall, best_cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("docx", nargs="?", help="输入docx文件，默认自动生成")
+    parser.add_argument("--images", type=int, default=40, help="自动生成文档中的图片数量")
+    parser.add_argument("--image-kb", type=int, default=512, help="每张图片的大小（KB）")
+    parser.add_argument("--repeat", type=int, default=3, help="每项测试重复次数")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="bench_save_")
+    source_path = args.docx
+    if not source_path:
+        source_path = os.path.join(work_dir, "images.docx")
+        build_image_document(source_path, args.images, args.image_kb, work_dir)
+
+    full_path = os.path.join(work_dir, "full_save.docx")
+    passthrough_path = os.path.join(work_dir, "passthrough_save.docx")
+
+    full_wall, full_cpu = measure(
+        lambda doc, path: doc.save(path), source_path, full_path, args.repeat
+    )
+    passthrough_wall, passthrough_cpu = measure(
+        lambda doc, path: save_document(
+            doc, path, source_path, document_parts(doc, RT.COMMENTS)
+        ),
+        source_path,
+        passthrough_path,
+        args.repeat,
+    )
+
+    report = {
+        "source_bytes": os.path.getsize(source_path),
+        "doc_save": {
+            "wall_seconds": round(full_wall, 4),
+            "cpu_seconds": round(full_cpu, 4),
+            "output_bytes": os.path.getsize(full_path),
+        },
+        "save_document": {
+            "wall_seconds": round(passthrough_wall, 4),
+            "cpu_seconds": round(passthrough_cpu, 4),
+            "output_bytes": os.path.getsize(passthrough_path),
+        },
+        "speedup": round(full_wall / passthrough_wall, 2) if passthrough_wall else None,
+    }
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,389 @@
+"""
+基准测试用的合成文档语料
+
+按文档类型（合同、制度、普通文档）和页数生成内容确定（固定随机种子）的文档结构，
+再渲染为docx（可选碎片化Run、带合并单元格的表格）或PDF。
+同时提供从文档内容中抽取批注key（精确、模糊、不存在、跨段落）的方法。
+
+用法:
+    python benchmarks/corpus.py out_dir [--kinds contract,policy,general] [--pages 10,100,1000]
+"""
+
+import argparse
+import io
+import os
+import random
+from typing import Dict, Iterator, List, Optional, Tuple
+
+DOCUMENT_KINDS = ("contract", "policy", "general")
+
+# 语料格式版本，生成规则变化时递增，使缓存的旧语料失效
+CORPUS_VERSION = 1
+
+# 每页的正文段落数（按A4页面约500个汉字估算）
+PARAGRAPHS_PER_PAGE = 5
+
+SUBJECTS = ["甲方", "乙方", "双方", "服务提供方", "委托方", "本单位", "各部门", "项目组", "承包人", "管理部门"]
+VERBS = ["应当按照", "有权依据", "须严格遵守", "可以参照", "负责落实", "不得违反", "应及时执行", "需书面确认"]
+OBJECTS = [
+    "本合同约定的服务标准",
+    "国家有关法律法规",
+    "双方确认的技术方案",
+    "年度预算管理办法",
+    "信息安全管理要求",
+    "验收流程和付款节点",
+    "保密义务及违约责任",
+    "人员配置和考核指标",
+    "档案管理相关规定",
+    "质量保证和售后服务条款",
+]
+TAILS = [
+    "，并在约定期限内完成相关工作。",
+    "，如有争议应协商解决。",
+    "，相关费用由责任方承担。",
+    "，逾期未履行的按日计付违约金。",
+    "，具体要求以附件为准。",
+    "，未尽事宜另行签订补充协议。",
+    "。",
+]
+CONTRACT_CLAUSES = [
+    "合同标的", "服务内容", "服务期限", "合同价款", "付款方式", "双方权利义务",
+    "验收标准", "知识产权", "保密条款", "违约责任", "不可抗力", "争议解决",
+]
+POLICY_CHAPTERS = ["总则", "组织机构与职责", "管理要求", "工作流程", "监督检查", "奖励与处罚", "附则"]
+GENERAL_SECTIONS = ["项目背景", "现状分析", "建设目标", "总体方案", "实施计划", "风险分析", "预期效益"]
+
+# 文档块：("heading", 级别, 文本) | ("paragraph", 文本) | ("table", 行列表, 是否合并单元格)
+Block = Tuple
+
+
+def chinese_number(n: int) -> str:
+    """把正整数转换为中文数字（用于"第十二条"等编号）"""
+    digits = "零一二三四五六七八九"
+    units = ["", "十", "百", "千"]
+    if n < 10:
+        return digits[n]
+    if n < 20:
+        return "十" + (digits[n % 10] if n % 10 else "")
+    result = ""
+    zero = False
+    for power in range(len(str(n)) - 1, -1, -1):
+        digit = n // (10 ** power) % 10
+        if digit == 0:
+            zero = bool(result)
+            continue
+        if zero:
+            result += "零"
+            zero = False
+        result += digits[digit] + units[power]
+    return result
+
+
+def _sentence(rng: random.Random) -> str:
+    return rng.choice(SUBJECTS) + rng.choice(VERBS) + rng.choice(OBJECTS) + rng.choice(TAILS)
+
+
+def _paragraph(rng: random.Random, sentences: Tuple[int, int] = (3, 6)) -> str:
+    return "".join(_sentence(rng) for _ in range(rng.randint(*sentences)))
+
+
+def _table(rng: random.Random, index: int, rows: int = 6, cols: int = 4) -> List[List[str]]:
+    header = ["序号", "项目名称", "数量", "金额（元）"][:cols]
+    body = []
+    for r in range(1, rows):
+        name = f"{rng.choice(OBJECTS)[:6]}{index}-{r}"
+        amount = f"{rng.randint(1, 999) * 100:,}"
+        body.append([str(r), name, str(rng.randint(1, 50)), amount][:cols])
+    return [header] + body
+
+
+def generate_blocks(
+    kind: str, pages: int, seed: int = 0, table_every: int = 5
+) -> List[Block]:
+    """
+    生成指定类型和页数的文档结构
+
+    Args:
+        kind: 文档类型（contract/policy/general）
+        pages: 目标页数
+        seed: 随机种子，相同参数总是生成相同的内容
+        table_every: 每隔多少页插入一个表格（0表示不插入）
+
+    Returns:
+        list: 文档块列表
+    """
+    if kind not in DOCUMENT_KINDS:
+        raise ValueError(f"未知的文档类型: {kind}")
+    rng = random.Random(f"{kind}-{pages}-{seed}")
+    blocks: List[Block] = []
+    target = pages * PARAGRAPHS_PER_PAGE
+    if kind == "contract":
+        blocks.append(("heading", 0, "技术服务合同"))
+        blocks.append(("paragraph", "甲方：某某科技有限公司\n乙方：某某信息技术有限公司"))
+    elif kind == "policy":
+        blocks.append(("heading", 0, "信息化项目管理办法"))
+    else:
+        blocks.append(("heading", 0, "数字化转型项目建设方案"))
+
+    paragraphs = 0
+    section = 0
+    clause = 0
+    next_table = table_every * PARAGRAPHS_PER_PAGE if table_every else None
+    while paragraphs < target:
+        section += 1
+        if kind == "contract":
+            name = CONTRACT_CLAUSES[(section - 1) % len(CONTRACT_CLAUSES)]
+            blocks.append(("paragraph", f"第{chinese_number(section)}条 {name}"))
+            items = rng.randint(2, 4)
+            for item in range(1, items + 1):
+                prefix = f"{section}.{item} " if item > 1 else ""
+                blocks.append(("paragraph", prefix + _paragraph(rng)))
+        elif kind == "policy":
+            name = POLICY_CHAPTERS[(section - 1) % len(POLICY_CHAPTERS)]
+            blocks.append(("heading", 1, f"第{chinese_number(section)}章 {name}"))
+            items = rng.randint(3, 6)
+            for _ in range(items):
+                clause += 1
+                blocks.append(("paragraph", f"第{chinese_number(clause)}条 " + _paragraph(rng)))
+        else:
+            name = GENERAL_SECTIONS[(section - 1) % len(GENERAL_SECTIONS)]
+            blocks.append(("heading", 1, f"{chinese_number(section)}、{name}"))
+            items = rng.randint(3, 6)
+            for item in range(1, items + 1):
+                if item == 2:
+                    blocks.append(("heading", 2, f"（{chinese_number(item)}）{rng.choice(OBJECTS)}"))
+                blocks.append(("paragraph", _paragraph(rng)))
+        paragraphs += items
+        if next_table is not None and paragraphs >= next_table:
+            blocks.append(("paragraph", f"表{len([b for b in blocks if b[0] == 'table']) + 1} 费用明细"))
+            blocks.append(("table", _table(rng, section), True))
+            next_table += table_every * PARAGRAPHS_PER_PAGE
+
+    if kind == "contract":
+        blocks.append(("table", [["甲方（盖章）", "乙方（盖章）"], ["日期：", "日期："]], False))
+    return blocks
+
+
+def _add_fragmented_runs(paragraph, text: str, rng: random.Random) -> None:
+    """把文本拆成2~6个字符的多个Run并交替设置格式，模拟反复编辑或PDF转换得到的碎片化段落"""
+    position = 0
+    bold = False
+    while position < len(text):
+        size = rng.randint(2, 6)
+        run = paragraph.add_run(text[position:position + size])
+        if bold:
+            run.bold = True
+        bold = not bold and rng.random() < 0.3
+        position += size
+
+
+def _merge_cells(table) -> None:
+    """合并首行的后两列和首列的最后两行，生成包含横向和纵向合并单元格的表格"""
+    rows = len(table.rows)
+    cols = len(table.columns)
+    if cols >= 3:
+        merged = table.cell(0, cols - 2).merge(table.cell(0, cols - 1))
+        merged.text = "金额明细"
+    if rows >= 3:
+        table.cell(rows - 2, 0).merge(table.cell(rows - 1, 0))
+
+
+def render_docx(blocks: List[Block], fragmented: bool = False, seed: int = 0) -> bytes:
+    """
+    把文档结构渲染为docx
+
+    Args:
+        blocks: generate_blocks生成的文档块
+        fragmented: 正文段落是否拆分为碎片化的Run
+        seed: 碎片化拆分的随机种子
+
+    Returns:
+        bytes: docx文件内容
+    """
+    from docx import Document
+
+    rng = random.Random(seed)
+    doc = Document()
+    for block in blocks:
+        if block[0] == "heading":
+            doc.add_heading(block[2], level=block[1])
+        elif block[0] == "paragraph":
+            if fragmented:
+                _add_fragmented_runs(doc.add_paragraph(), block[1], rng)
+            else:
+                doc.add_paragraph(block[1])
+        else:
+            rows = block[1]
+            table = doc.add_table(rows=len(rows), cols=len(rows[0]))
+            table.style = "Table Grid"
+            for r, row in enumerate(rows):
+                for c, value in enumerate(row):
+                    table.cell(r, c).text = value
+            if block[2]:
+                _merge_cells(table)
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+def render_pdf(blocks: List[Block]) -> bytes:
+    """把文档结构渲染为PDF（表格按行输出为文本），每页排满后换页"""
+    import fitz
+
+    margin = 56
+    line_height = 18
+    pdf = fitz.open()
+    page = None
+    y = 0.0
+
+    def lines(block: Block) -> Iterator[Tuple[str, float]]:
+        if block[0] == "heading":
+            yield block[2], 15 if block[1] <= 1 else 13
+        elif block[0] == "paragraph":
+            text = block[1]
+            for start in range(0, len(text), 36):
+                yield text[start:start + 36], 11
+        else:
+            for row in block[1]:
+                yield "    ".join(row), 10
+
+    for block in blocks:
+        for text, size in lines(block):
+            if page is None or y > page.rect.height - margin:
+                page = pdf.new_page()
+                y = margin
+            page.insert_text((margin, y), text, fontsize=size, fontname="china-s")
+            y += line_height
+        y += line_height / 2
+    data = pdf.tobytes(garbage=3, deflate=True)
+    pdf.close()
+    return data
+
+
+def paragraph_texts(blocks: List[Block]) -> List[str]:
+    """返回文档块中的正文段落文本"""
+    return [block[1] for block in blocks if block[0] == "paragraph" and len(block[1]) >= 20]
+
+
+def _perturb(text: str, rng: random.Random) -> str:
+    """对文本做轻微改动（删标点、改一个字），模拟LLM转述后只能模糊匹配的引用"""
+    text = text.replace("，", "").replace("。", "")
+    if len(text) > 4:
+        i = rng.randrange(len(text))
+        text = text[:i] + "之" + text[i + 1:]
+    return text
+
+
+def sample_comment_keys(
+    blocks: List[Block],
+    exact: int = 10,
+    fuzzy: int = 5,
+    missing: int = 5,
+    multi_line: int = 0,
+    key_length: int = 30,
+    seed: int = 0,
+) -> Dict[str, str]:
+    """
+    从文档内容中抽取批注key
+
+    Args:
+        blocks: 文档块
+        exact: 原文摘录（精确匹配）的数量
+        fuzzy: 改动过的摘录（只能模糊匹配）的数量
+        missing: 文档中不存在的文本的数量
+        multi_line: 跨两个段落的摘录（用换行连接）的数量
+        key_length: 每个摘录的长度（字符）
+        seed: 随机种子
+
+    Returns:
+        dict: {key: 批注内容}
+    """
+    rng = random.Random(seed)
+    texts = paragraph_texts(blocks)
+    if not texts:
+        return {}
+
+    def excerpt(text: str) -> str:
+        if len(text) <= key_length:
+            return text
+        start = rng.randrange(len(text) - key_length)
+        return text[start:start + key_length]
+
+    comments: Dict[str, str] = {}
+    for i in range(exact):
+        comments[excerpt(rng.choice(texts))] = f"精确匹配批注{i + 1}"
+    for i in range(fuzzy):
+        comments[_perturb(excerpt(rng.choice(texts)), rng)] = f"模糊匹配批注{i + 1}"
+    for i in range(missing):
+        comments[f"文档中不存在的内容{i + 1}" + "测试" * max(key_length // 2 - 5, 0)] = f"未匹配批注{i + 1}"
+    for i in range(multi_line):
+        j = rng.randrange(max(len(texts) - 1, 1))
+        pair = texts[j:j + 2]
+        half = max(key_length // 2, 4)
+        comments["\n".join([pair[0][-half:]] + [text[:half] for text in pair[1:]])] = (
+            f"跨段落批注{i + 1}"
+        )
+    return comments
+
+
+def corpus_path(corpus_dir: str, kind: str, pages: int, fragmented: bool, seed: int, ext: str) -> str:
+    suffix = "-fragmented" if fragmented and ext == ".docx" else ""
+    return os.path.join(
+        corpus_dir, f"v{CORPUS_VERSION}-{kind}-{pages}p{suffix}-seed{seed}{ext}"
+    )
+
+
+def load_or_build(
+    corpus_dir: Optional[str],
+    kind: str,
+    pages: int,
+    ext: str = ".docx",
+    fragmented: bool = False,
+    seed: int = 0,
+) -> bytes:
+    """
+    返回语料文件内容；指定corpus_dir时优先读取缓存，不存在时生成并写入缓存
+
+    1000页的文档生成需要数十秒，缓存后不同版本的基准测试可以使用完全相同的输入
+    """
+    path = corpus_path(corpus_dir, kind, pages, fragmented, seed, ext) if corpus_dir else None
+    if path and os.path.exists(path):
+        with open(path, "rb") as f:
+            return f.read()
+    blocks = generate_blocks(kind, pages, seed)
+    data = render_pdf(blocks) if ext == ".pdf" else render_docx(blocks, fragmented, seed)
+    if path:
+        os.makedirs(corpus_dir, exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+    return data
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("out_dir", help="输出目录")
+    parser.add_argument("--kinds", default=",".join(DOCUMENT_KINDS), help="文档类型，逗号分隔")
+    parser.add_argument("--pages", default="10,100,1000", help="页数，逗号分隔")
+    parser.add_argument("--fragmented", action="store_true", help="同时生成碎片化Run的docx")
+    parser.add_argument("--pdf", action="store_true", help="同时生成PDF")
+    parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    args = parser.parse_args()
+
+    for kind in args.kinds.split(","):
+        for pages in _int_list(args.pages):
+            variants = [(".docx", False)]
+            if args.fragmented:
+                variants.append((".docx", True))
+            if args.pdf:
+                variants.append((".pdf", False))
+            for ext, fragmented in variants:
+                load_or_build(args.out_dir, kind, pages, ext, fragmented, args.seed)
+                print(corpus_path(args.out_dir, kind, pages, fragmented, args.seed, ext))
+
+
+if __name__ == "__main__":
+    main()
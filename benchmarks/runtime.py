@@ -0,0 +1,201 @@
+"""
+基准测试使用的本地插件运行时
+
+按插件运行时的方式从源码加载工具类，每次调用创建一个带独立会话ID的工具实例，
+把输入文件包装成已带内容的File对象，执行_invoke并收集返回的消息。
+不需要Dify守护进程或网络，工作进程池、准入控制等与插件进程中完全一致。
+插件存储默认不可用（持久化缓存自动降级），可以传入InMemoryStorage等替身。
+"""
+
+import json
+import os
+import sys
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT_DIR not in sys.path:
+    sys.path.insert(0, ROOT_DIR)
+
+# 基准测试中默认只输出错误日志，避免日志输出影响计时（需要在加载工具模块之前设置）
+os.environ.setdefault("WORD_TOOLS_LOG_LEVEL", "ERROR")
+
+from dify_plugin import Tool  # noqa: E402
+from dify_plugin.core.runtime import Session  # noqa: E402
+from dify_plugin.core.utils.class_loader import load_single_subclass_from_source  # noqa: E402
+from dify_plugin.entities.tool import ToolRuntime  # noqa: E402
+from dify_plugin.file.file import File  # noqa: E402
+
+# 工具名 -> 源码路径
+TOOL_SOURCES = {
+    "pdf_to_word": "tools/pdf_to_word.py",
+    "word-chunk": "tools/word-chunk.py",
+    "word_comment": "tools/word_comment.py",
+    "word_insert_text": "tools/word_insert_text.py",
+    "register_document": "tools/register_document.py",
+}
+
+# 工具名 -> 文件参数名
+FILE_PARAMETERS = {
+    "pdf_to_word": "pdf_content",
+    "word-chunk": "word_content",
+    "word_comment": "word_content",
+    "word_insert_text": "word_content",
+    "register_document": "document",
+}
+
+MIME_TYPES = {
+    ".docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    ".pdf": "application/pdf",
+}
+
+
+class InvokeResult:
+    """一次工具调用收集到的消息和耗时"""
+
+    def __init__(self, tool: str, request_id: str):
+        self.tool = tool
+        self.request_id = request_id
+        self.texts: List[str] = []
+        self.jsons: List[dict] = []
+        self.blobs: List[bytes] = []
+        self.metrics: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.seconds = 0.0
+
+    @property
+    def ok(self) -> bool:
+        """调用是否产生了结果（文件或JSON）。工具在出错时只返回文本消息，不会抛出异常"""
+        return self.error is None and bool(self.blobs or self.jsons)
+
+    @property
+    def output_bytes(self) -> int:
+        """输出文件的总大小；只返回JSON的工具取JSON结果的序列化大小"""
+        if self.blobs:
+            return sum(len(blob) for blob in self.blobs)
+        return sum(len(json.dumps(item, ensure_ascii=False).encode("utf-8")) for item in self.jsons)
+
+    @property
+    def peak_memory_mb(self) -> Optional[float]:
+        """工作进程（或插件进程）中测得的任务峰值内存"""
+        if self.metrics:
+            return self.metrics.get("counters", {}).get("memory_peak_mb")
+        return None
+
+    def summary_error(self) -> Optional[str]:
+        """失败时的错误信息：异常信息，或工具返回的最后一条文本消息"""
+        if self.ok:
+            return None
+        return self.error or (self.texts[-1] if self.texts else "没有返回任何结果")
+
+
+class LocalPluginRuntime:
+    """
+    本地工具运行时
+
+    用法:
+        runtime = LocalPluginRuntime()
+        result = runtime.invoke("word-chunk", docx_bytes, "a.docx", chunk_num=10, docx_type="contract")
+        runtime.close()
+    """
+
+    def __init__(
+        self,
+        tools: Optional[List[str]] = None,
+        start_pool: bool = True,
+        storage: Optional[Any] = None,
+    ):
+        self.tool_classes = {name: self._load(name) for name in (tools or TOOL_SOURCES)}
+        # 所有会话共用的插件存储替身（如InMemoryStorage），None表示存储不可用
+        self.storage = storage
+        if start_pool:
+            # 与main.py一致：工具模块加载之后再启动工作进程
+            from tools.utils.process_pool import start_process_pool
+
+            start_process_pool()
+
+    @staticmethod
+    def _load(name: str):
+        source = TOOL_SOURCES[name]
+        return load_single_subclass_from_source(
+            module_name=os.path.splitext(source)[0].replace("/", "."),
+            script_path=os.path.join(ROOT_DIR, source),
+            parent_type=Tool,
+        )
+
+    def create_tool(self, name: str, request_id: str) -> Tool:
+        """创建工具实例，会话ID即请求ID"""
+        session = Session.empty_session()
+        session.session_id = request_id
+        if self.storage is not None:
+            session.storage = self.storage
+        runtime = ToolRuntime(credentials={}, user_id="benchmark", session_id=request_id)
+        return self.tool_classes[name](runtime=runtime, session=session)
+
+    @staticmethod
+    def make_file(blob: bytes, filename: str) -> File:
+        """把文件内容包装成已加载内容的File对象（不会再通过URL下载）"""
+        extension = os.path.splitext(filename)[1]
+        file = File(
+            url=f"http://localhost/files/{filename}",
+            mime_type=MIME_TYPES.get(extension, "application/octet-stream"),
+            filename=filename,
+            extension=extension,
+            size=len(blob),
+            type="document",
+        )
+        file._blob = blob
+        return file
+
+    def invoke(
+        self,
+        name: str,
+        blob: Optional[bytes],
+        filename: str,
+        request_id: Optional[str] = None,
+        **parameters,
+    ) -> InvokeResult:
+        """
+        调用工具并收集全部消息
+
+        Args:
+            name: 工具名
+            blob: 输入文件内容，为None时不传文件参数（如改用document_handle）
+            filename: 输入文件名
+            request_id: 请求ID，默认随机生成
+            **parameters: 其余工具参数
+
+        Returns:
+            InvokeResult: 调用结果（总是请求返回指标）
+        """
+        request_id = request_id or uuid.uuid4().hex
+        result = InvokeResult(name, request_id)
+        tool = self.create_tool(name, request_id)
+        if blob is not None:
+            parameters[FILE_PARAMETERS[name]] = self.make_file(blob, filename)
+        parameters.setdefault("return_metrics", True)
+
+        start = time.perf_counter()
+        try:
+            for message in tool._invoke(parameters):
+                kind = message.type.value
+                if kind == "text":
+                    result.texts.append(message.message.text)
+                elif kind == "blob":
+                    result.blobs.append(message.message.blob)
+                elif kind == "json":
+                    data = message.message.json_object
+                    if isinstance(data, dict) and set(data) == {"metrics"}:
+                        result.metrics = data["metrics"]
+                    else:
+                        result.jsons.append(data)
+        except Exception as e:
+            result.error = f"{type(e).__name__}: {e}"
+        result.seconds = time.perf_counter() - start
+        return result
+
+    def close(self) -> None:
+        from tools.utils.process_pool import get_process_pool
+
+        get_process_pool().shutdown()
@@ -1,6 +1,13 @@
 from dify_plugin import Plugin, DifyPluginEnv
 
+from tools.utils.process_pool import start_process_pool
+from tools.utils.warmup import run_warmup_if_enabled
+
 plugin = Plugin(DifyPluginEnv(MAX_REQUEST_TIMEOUT=120))
 
 if __name__ == '__main__':
+    # 可选的预热（环境变量WORD_TOOLS_WARMUP开启），在开始接收请求之前完成
+    run_warmup_if_enabled(plugin.registration)
+    # 预热之后再启动工作进程，使工作进程继承已加载的依赖和编译好的规则
+    start_process_pool()
     plugin.run()
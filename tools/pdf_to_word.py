@@ -1,6 +1,5 @@
 from collections.abc import Generator
 from typing import Any
-import tempfile
 import os
 import re
 import json
@@ -8,9 +7,20 @@ from dify_plugin.file.file import File
 from dify_plugin import Tool
 from dify_plugin.entities.tool import ToolInvokeMessage
 from docx import Document
-from pdf2docx import Converter
 from tools.utils.logger_utils import get_logger
-from tools.utils.file_utils import get_meta_data, sanitize_filename
+from tools.utils.document_store import DocumentHandleError, StoredDocument, document_owner, get_document_store
+from tools.utils.file_utils import get_meta_data, sanitize_filename, temporary_io_files
+from tools.utils.docx_optimize_utils import optimize_document
+from tools.utils.admission import run_admitted_task
+from tools.utils.document_cache import document_key
+from tools.utils.instrumentation import Metrics, collect_metrics, set_value, stage
+from tools.utils.persistent_cache import get_persistent_cache
+from tools.utils.process_pool import register_task
+
+# 提交到工作进程池的任务名
+CONVERT_PDF_TASK = "pdf_to_word.convert"
+# 转换结果在持久化缓存中的版本，转换或优化逻辑变化时递增，使旧结果失效
+CONVERT_CACHE_VERSION = 1
 
 
 class PdfToWordTool(Tool):
@@ -21,12 +31,25 @@ class PdfToWordTool(Tool):
         # 获取上传的PDF文件和自定义文件名
         pdf_content: File = tool_parameters.get("pdf_content")
         custom_filename = tool_parameters.get("output_filename", "").strip()
+        optimize_output = tool_parameters.get("optimize_output", True)
+        return_metrics = tool_parameters.get("return_metrics", False)
+        metrics = Metrics(request_id=self.session.session_id)
+
+        # 没有上传文件时，从本地文档存储中取回register_document登记的文档
+        document_handle = (tool_parameters.get("document_handle") or "").strip()
+        if not pdf_content and document_handle:
+            try:
+                pdf_content = get_document_store().get(document_handle, document_owner(self))
+            except DocumentHandleError as e:
+                self.logger.error(str(e))
+                yield self.create_text_message(str(e))
+                return
 
         if not pdf_content:
-            yield self.create_text_message("请提供PDF文件")
+            yield self.create_text_message("请提供PDF文件或文档句柄")
             return
         # 检查文件类型
-        if not isinstance(pdf_content, File):
+        if not isinstance(pdf_content, (File, StoredDocument)):
             yield self.create_text_message("无效的文件格式，期望File对象")
             return
 
@@ -34,28 +57,24 @@ class PdfToWordTool(Tool):
             self.logger.info(
                 f"开始处理PDF转Word，文件名: {pdf_content.filename if pdf_content.filename else '未知'}，自定义文件名: {custom_filename if custom_filename else '未设置'}"
             )
-            # 创建临时文件保存上传的PDF文件
-            with tempfile.NamedTemporaryFile(
-                delete=False, suffix=".pdf"
-            ) as temp_pdf_file:
-                # 获取文件内容（字节）并写入临时文件
-                temp_pdf_file.write(pdf_content.blob)
-                temp_pdf_path = temp_pdf_file.name
-
-            # 创建临时文件保存转换后的Word文件
-            with tempfile.NamedTemporaryFile(
-                delete=False, suffix=".docx"
-            ) as temp_docx_file:
-                temp_docx_path = temp_docx_file.name
-
-            # 调用PDF转Word函数
-            self.logger.info("开始执行PDF到DOCX的转换")
-            self.pdf_to_docx(temp_pdf_path, temp_docx_path)
-            self.logger.info("PDF转换完成")
-
-            # 读取转换后的Word文件内容
-            with open(temp_docx_path, "rb") as docx_file:
-                docx_blob = docx_file.read()
+            with metrics.stage("decode"):
+                blob = pdf_content.blob
+            # 转换结果较小时保存在插件存储中，同一PDF再次转换时直接复用
+            cache = get_persistent_cache(self.session)
+            cache_key = (document_key(blob), bool(optimize_output), CONVERT_CACHE_VERSION)
+            with collect_metrics(metrics):
+                docx_blob = cache.get("pdf_to_word", cache_key)
+            if docx_blob is not None:
+                self.logger.info("命中持久化缓存，直接返回之前的转换结果")
+            else:
+                # PDF转换是整个插件中最耗CPU的工作，交给工作进程池执行，不阻塞其他请求
+                self.logger.info("开始执行PDF到DOCX的转换")
+                with collect_metrics(metrics):
+                    docx_blob = run_admitted_task(
+                        "pdf_to_word", CONVERT_PDF_TASK, blob, optimize_output
+                    )
+                    cache.set("pdf_to_word", cache_key, docx_blob)
+                self.logger.info("PDF转换完成")
 
             # 处理输出文件名
             if custom_filename:
@@ -80,19 +99,73 @@ class PdfToWordTool(Tool):
                 ),
             )
 
-            # 清理临时文件
-            os.unlink(temp_pdf_path)
-            os.unlink(temp_docx_path)
-            self.logger.info("PDF转Word处理完成，临时文件已清理")
+            if return_metrics:
+                yield self.create_json_message({"metrics": metrics.report()})
+            self.logger.info("PDF转Word处理完成")
 
         except Exception as e:
             self.logger.exception("处理PDF文件时发生异常")
             yield self.create_text_message(f"处理PDF文件时出错: {str(e)}")
 
     def pdf_to_docx(self, pdf_path, docx_path):
-        # 创建转换器对象
-        cv = Converter(pdf_path)
-        # 转换整个PDF（start=起始页，end=结束页，None表示全部）
-        cv.convert(docx_path, start=0, end=None)
-        # 关闭转换器释放资源
-        cv.close()
+        # pdf2docx会连带导入PyMuPDF、OpenCV和NumPy，只在实际转换时才导入，
+        # 避免只使用其他工具的插件进程承担这部分启动开销
+        from pdf2docx import Converter
+
+        with stage("convert"):
+            # 创建转换器对象
+            cv = Converter(pdf_path)
+            set_value("pages", len(cv.fitz_doc))
+            # 转换整个PDF（start=起始页，end=结束页，None表示全部）
+            cv.convert(docx_path, start=0, end=None)
+            # 关闭转换器释放资源
+            cv.close()
+
+    def optimize_docx(self, docx_path):
+        """
+        对转换结果做结构优化（合并相邻同格式Run、移除空Run、提取共享样式）并原地保存
+
+        Args:
+            docx_path: 转换后的Word文档路径
+
+        Returns:
+            dict: 优化统计信息
+        """
+        with stage("parse"):
+            doc = Document(docx_path)
+        with stage("optimize"):
+            stats = optimize_document(doc)
+        with stage("save"):
+            doc.save(docx_path)
+        set_value("runs_before", stats["runs_before"])
+        set_value("runs_after", stats["runs_after"])
+        self.logger.info(
+            f"文档优化完成，Run数量: {stats['runs_before']} -> {stats['runs_after']}，"
+            f"正文XML大小: {stats['xml_bytes_before']} -> {stats['xml_bytes_after']} 字节，"
+            f"新增共享样式: {stats['styles_created']} 个"
+        )
+        return stats
+
+
+def _convert_pdf_task(pdf_blob: bytes, optimize_output: bool) -> bytes:
+    """
+    PDF转换任务（在工作进程中执行）：把PDF内容转换为Word文档内容
+
+    Args:
+        pdf_blob: PDF文件内容
+        optimize_output: 是否合并碎片化的Run并提取共享样式
+
+    Returns:
+        bytes: 转换后的Word文档内容
+    """
+    tool = PdfToWordTool.from_credentials({})
+    with temporary_io_files(pdf_blob, ".pdf", ".docx") as (pdf_path, docx_path):
+        tool.pdf_to_docx(pdf_path, docx_path)
+        # 合并碎片化的Run并提取共享样式，减小文档体积
+        if optimize_output:
+            tool.optimize_docx(docx_path)
+        with open(docx_path, "rb") as f:
+            return f.read()
+
+
+register_task(CONVERT_PDF_TASK, _convert_pdf_task)
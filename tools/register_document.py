@@ -0,0 +1,52 @@
+from collections.abc import Generator
+from typing import Any
+from dify_plugin.file.file import File
+from dify_plugin import Tool
+from dify_plugin.entities.tool import ToolInvokeMessage
+from tools.utils.logger_utils import get_logger
+from tools.utils.document_store import document_owner, get_document_store
+from tools.utils.instrumentation import Metrics
+
+
+class RegisterDocumentTool(Tool):
+    # 获取当前模块的日志记录器
+    logger = get_logger(__name__)
+
+    def _invoke(self, tool_parameters: dict[str, Any]) -> Generator[ToolInvokeMessage]:
+        # 获取上传的文件（Word或PDF）
+        document: File = tool_parameters.get("document")
+        return_metrics = tool_parameters.get("return_metrics", False)
+        metrics = Metrics(request_id=self.session.session_id)
+
+        if not document:
+            self.logger.error("未提供文件")
+            yield self.create_text_message("请提供要登记的文件")
+            return
+        # 检查文件类型
+        if not isinstance(document, File):
+            self.logger.error("无效的文件格式，期望File对象")
+            yield self.create_text_message("无效的文件格式，期望File对象")
+            return
+
+        try:
+            with metrics.stage("decode"):
+                blob = document.blob
+            # 只保存文件并计算句柄，不需要交给工作进程；句柄只能由同一应用中的同一用户使用
+            with metrics.stage("save"):
+                handle = get_document_store().put(blob, document.filename, document_owner(self))
+            self.logger.info(
+                f"文档登记完成，文件名: {document.filename if document.filename else '未知'}，"
+                f"大小: {len(blob)} 字节，句柄: {handle}"
+            )
+
+            # 文本消息只包含句柄，便于在工作流中直接作为其他工具的document_handle参数
+            yield self.create_text_message(handle)
+            yield self.create_json_message(
+                {"document_handle": handle, "filename": document.filename, "size": len(blob)}
+            )
+            if return_metrics:
+                yield self.create_json_message({"metrics": metrics.report()})
+
+        except Exception as e:
+            self.logger.exception("登记文档时发生异常")
+            yield self.create_text_message(f"登记文档时出错: {str(e)}")
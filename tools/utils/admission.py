@@ -0,0 +1,326 @@
+import io
+import os
+import threading
+import time
+import zipfile
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Dict, Generator, Iterator, Optional
+
+from tools.utils.instrumentation import set_value, stage
+from tools.utils.logger_utils import get_logger
+from tools.utils.process_pool import get_process_pool
+
+logger = get_logger(__name__)
+
+# 准入控制配置（环境变量）
+MEMORY_BUDGET_ENV = "WORD_TOOLS_MEMORY_BUDGET_MB"  # 同时处理的请求的估算内存总量上限
+ADMISSION_QUEUE_ENV = "WORD_TOOLS_ADMISSION_QUEUE"  # 等待内存额度的请求数上限
+ADMISSION_TIMEOUT_ENV = "WORD_TOOLS_ADMISSION_TIMEOUT"  # 等待内存额度的最长时间（秒）
+DEFAULT_MEMORY_BUDGET_MB = 128
+DEFAULT_ADMISSION_QUEUE = 16
+DEFAULT_ADMISSION_TIMEOUT = 60.0
+
+MB = 1024 * 1024
+
+# 各工具的初始内存模型：估算值 = 基础开销 + 系数 × 输入规模 + 输入内容大小
+# 输入规模对docx取XML部件的解压后大小（解析后的XML树与之成正比，图片等二进制部件只是原样复制），
+# 对其他文件（PDF）取文件大小。系数会根据实际测得的峰值内存不断调整
+DEFAULT_COST_MODELS = {
+    "pdf_to_word": (48 * MB, 40.0),
+    "word-chunk": (4 * MB, 16.0),
+    "word_comment": (6 * MB, 16.0),
+    "word_insert_text": (4 * MB, 12.0),
+}
+GENERIC_COST_MODEL = (8 * MB, 16.0)
+
+# 实测值低于估算时，系数按该比例向实测值靠拢；高于估算时立即采用实测值，宁可高估也不要OOM
+COST_DECAY = 0.2
+MIN_COST_FACTOR = 1.0
+MAX_COST_FACTOR = 1000.0
+
+
+class AdmissionRejectedError(RuntimeError):
+    """内存额度不足且等待队列已满（或等待超时），请求被拒绝"""
+
+
+def input_units(blob: bytes) -> int:
+    """
+    计算内存模型使用的输入规模：docx为XML部件解压后的总大小（只读取zip目录，不解压），
+    其他文件为文件大小
+
+    Args:
+        blob: 输入文件内容
+
+    Returns:
+        int: 输入规模（字节）
+    """
+    if blob[:2] == b"PK":
+        try:
+            with zipfile.ZipFile(io.BytesIO(blob)) as zf:
+                return sum(
+                    info.file_size
+                    for info in zf.infolist()
+                    if info.filename.endswith((".xml", ".rels"))
+                )
+        except (zipfile.BadZipFile, OSError):
+            pass
+    return len(blob)
+
+
+class CostModel:
+    """单个工具的内存模型，根据实测峰值内存自适应调整系数"""
+
+    def __init__(self, base: int, factor: float):
+        self.base = base
+        self.factor = factor
+        self.samples = 0
+        self.max_peak = 0
+
+    def estimate(self, units: int, blob_size: int) -> int:
+        return int(self.base + self.factor * units + blob_size)
+
+    def observe(self, units: int, blob_size: int, peak: int) -> None:
+        """用一次实测的峰值内存更新系数"""
+        self.samples += 1
+        self.max_peak = max(self.max_peak, peak)
+        if units <= 0:
+            return
+        measured = (peak - self.base - blob_size) / units
+        measured = min(max(measured, MIN_COST_FACTOR), MAX_COST_FACTOR)
+        if measured > self.factor:
+            self.factor = measured
+        else:
+            self.factor += (measured - self.factor) * COST_DECAY
+
+
+class _Ticket:
+    """一次获准执行的请求：记录估算值，并接收实测的峰值内存"""
+
+    def __init__(self, tool: str, units: int, blob_size: int, estimate: int, reserved: int):
+        self.tool = tool
+        self.units = units
+        self.blob_size = blob_size
+        self.estimate = estimate
+        self.reserved = reserved
+        self.peak: Optional[int] = None
+
+    def observe(self, peak: Optional[int]) -> None:
+        self.peak = peak
+
+
+class AdmissionController:
+    """
+    按估算内存占用控制同时处理的请求
+
+    - 每个请求的内存占用按工具类型和输入大小估算（见CostModel）
+    - 正在处理的请求的估算总量不超过预算；超出时请求按到达顺序排队等待
+    - 排队请求数达到上限或等待超时时直接拒绝，返回明确的提示
+    - 单个请求的估算值超过整个预算时，等其他请求全部完成后单独执行
+    """
+
+    def __init__(
+        self,
+        budget_bytes: int,
+        max_queue: int = DEFAULT_ADMISSION_QUEUE,
+        timeout: float = DEFAULT_ADMISSION_TIMEOUT,
+    ):
+        self.budget = max(budget_bytes, 0)
+        self.max_queue = max(max_queue, 0)
+        self.timeout = timeout
+        self.models: Dict[str, CostModel] = {
+            tool: CostModel(*model) for tool, model in DEFAULT_COST_MODELS.items()
+        }
+        self._cond = threading.Condition()
+        self._waiting: deque = deque()
+        self.in_use = 0
+        self.active = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.max_waiting = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.budget > 0
+
+    def _model(self, tool: str) -> CostModel:
+        model = self.models.get(tool)
+        if model is None:
+            model = self.models[tool] = CostModel(*GENERIC_COST_MODEL)
+        return model
+
+    def estimate(self, tool: str, blob: bytes) -> int:
+        """估算工具处理该输入的峰值内存（字节）"""
+        return self._model(tool).estimate(input_units(blob), len(blob))
+
+    @contextmanager
+    def admit(self, tool: str, blob: bytes) -> Iterator[_Ticket]:
+        """
+        等待内存额度后执行请求，退出时归还额度并用实测峰值更新内存模型
+
+        Args:
+            tool: 工具名
+            blob: 输入文件内容
+
+        Raises:
+            AdmissionRejectedError: 等待队列已满或等待超时
+        """
+        units = input_units(blob)
+        estimate = self._model(tool).estimate(units, len(blob))
+        reserved = min(estimate, self.budget)
+        ticket = _Ticket(tool, units, len(blob), estimate, reserved)
+
+        if self.enabled:
+            with stage("admission_wait"):
+                self._acquire(ticket)
+        try:
+            yield ticket
+        finally:
+            with self._cond:
+                if self.enabled:
+                    self.in_use -= reserved
+                    self.active -= 1
+                    self._cond.notify_all()
+                if ticket.peak is not None:
+                    model = self._model(tool)
+                    model.observe(units, len(blob), ticket.peak)
+                    logger.info(
+                        f"{tool} 实际峰值内存 {ticket.peak / MB:.1f} MB，"
+                        f"估算 {estimate / MB:.1f} MB，调整后系数 {model.factor:.1f}"
+                    )
+
+    def _acquire(self, ticket: _Ticket) -> None:
+        with self._cond:
+            if not self._waiting and self._fits(ticket.reserved):
+                self._grant(ticket)
+                return
+            if len(self._waiting) >= self.max_queue:
+                self.rejected += 1
+                raise AdmissionRejectedError(
+                    f"当前内存负载较高（{self.active} 个请求处理中，{len(self._waiting)} 个排队），"
+                    f"请稍后重试"
+                )
+
+            self._waiting.append(ticket)
+            self.max_waiting = max(self.max_waiting, len(self._waiting))
+            logger.info(
+                f"{ticket.tool} 估算需要 {ticket.estimate / MB:.1f} MB内存，"
+                f"当前已占用 {self.in_use / MB:.1f}/{self.budget / MB:.0f} MB，排队等待"
+                f"（队列深度: {len(self._waiting)}）"
+            )
+            deadline = time.monotonic() + self.timeout
+            try:
+                # 按到达顺序放行，避免大请求被源源不断的小请求饿死
+                while not (self._waiting[0] is ticket and self._fits(ticket.reserved)):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.rejected += 1
+                        raise AdmissionRejectedError(
+                            f"等待内存额度超过 {self.timeout:g} 秒，请稍后重试"
+                        )
+                    self._cond.wait(remaining)
+            finally:
+                self._waiting.remove(ticket)
+                self._cond.notify_all()
+            self._grant(ticket)
+
+    def _fits(self, reserved: int) -> bool:
+        return self.active == 0 or self.in_use + reserved <= self.budget
+
+    def _grant(self, ticket: _Ticket) -> None:
+        self.in_use += ticket.reserved
+        self.active += 1
+        self.admitted += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """返回预算、当前占用、排队数、累计放行/拒绝数和各工具的内存模型"""
+        with self._cond:
+            return {
+                "budget": self.budget,
+                "in_use": self.in_use,
+                "active": self.active,
+                "waiting": len(self._waiting),
+                "max_waiting": self.max_waiting,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "models": {
+                    tool: {
+                        "base": model.base,
+                        "factor": round(model.factor, 2),
+                        "samples": model.samples,
+                        "max_peak": model.max_peak,
+                    }
+                    for tool, model in self.models.items()
+                },
+            }
+
+
+def _env_number(name: str, default, cast=int):
+    """读取数值环境变量，无效时使用默认值"""
+    try:
+        return cast(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+_controller: Optional[AdmissionController] = None
+_controller_lock = threading.Lock()
+
+
+def get_admission_controller() -> AdmissionController:
+    """返回进程内共享的准入控制器（预算由环境变量配置）"""
+    global _controller
+    if _controller is None:
+        with _controller_lock:
+            if _controller is None:
+                _controller = AdmissionController(
+                    budget_bytes=_env_number(MEMORY_BUDGET_ENV, DEFAULT_MEMORY_BUDGET_MB) * MB,
+                    max_queue=_env_number(ADMISSION_QUEUE_ENV, DEFAULT_ADMISSION_QUEUE),
+                    timeout=_env_number(ADMISSION_TIMEOUT_ENV, DEFAULT_ADMISSION_TIMEOUT, float),
+                )
+    return _controller
+
+
+def run_admitted_task(
+    tool: str, name: str, blob: bytes, *args, affinity: Optional[str] = None, **kwargs
+) -> Any:
+    """
+    经过内存准入控制后在共享进程池中执行任务，任务的第一个参数为输入文件内容
+
+    Args:
+        tool: 工具名（决定使用哪个内存模型）
+        name: 任务名（见process_pool.register_task）
+        blob: 输入文件内容
+        *args, **kwargs: 其余任务参数
+        affinity: 可选的工作进程亲和键
+
+    Returns:
+        任务函数的返回值
+    """
+    with get_admission_controller().admit(tool, blob) as ticket:
+        result, peak = get_process_pool().run_measured(
+            name, blob, *args, affinity=affinity, **kwargs
+        )
+        ticket.observe(peak)
+    set_value("memory_estimate_mb", round(ticket.estimate / MB, 1))
+    if peak is not None:
+        set_value("memory_peak_mb", round(peak / MB, 1))
+    return result
+
+
+def stream_admitted_task(
+    tool: str, name: str, blob: bytes, *args, affinity: Optional[str] = None, **kwargs
+) -> Generator[Any, None, None]:
+    """
+    经过内存准入控制后在共享进程池中执行流式任务（任务函数返回迭代器），逐项产生任务的结果
+
+    参数见run_admitted_task。准入的内存预留在迭代结束（或调用方停止迭代）时释放
+    """
+    with get_admission_controller().admit(tool, blob) as ticket:
+        peak = yield from get_process_pool().stream_measured(
+            name, blob, *args, affinity=affinity, **kwargs
+        )
+        ticket.observe(peak)
+    set_value("memory_estimate_mb", round(ticket.estimate / MB, 1))
+    if peak is not None:
+        set_value("memory_peak_mb", round(peak / MB, 1))
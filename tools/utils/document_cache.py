@@ -0,0 +1,277 @@
+import hashlib
+import io
+import os
+import re
+import threading
+import zipfile
+from collections import OrderedDict, namedtuple
+from typing import Dict, Optional, Tuple, Union
+
+from docx import Document
+from docx.oxml.ns import qn
+from docx.table import Table
+from docx.text.paragraph import Paragraph
+
+from tools.utils.instrumentation import count, stage
+from tools.utils.lazy_package import load_document
+
+# 缓存容量配置（环境变量），设为0表示关闭缓存
+CACHE_MAX_BYTES_ENV = "WORD_TOOLS_DOCUMENT_CACHE_MB"
+CACHE_MAX_ENTRIES_ENV = "WORD_TOOLS_DOCUMENT_CACHE_ENTRIES"
+# 插件进程和每个工作进程各有一份缓存，合计需要远低于manifest.yaml中申请的内存（256 MB）
+DEFAULT_CACHE_MAX_MB = 16
+DEFAULT_CACHE_MAX_ENTRIES = 4
+
+# 共享的只读文档随正文一起加载的部件（分段等只读工具需要样式来识别标题）
+SHARED_PARTS = ("styles",)
+
+# 解析后的XML树在内存中约为原始XML文本大小的几倍，用于估算缓存占用
+PARSED_XML_FACTOR = 4
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# 文档正文中的一个块级元素：类型（paragraph/table）、body中的下标、文本、python-docx对象
+DocumentElement = namedtuple("DocumentElement", ["type", "index", "text", "block"])
+
+
+def table_text(table: Table) -> str:
+    """
+    表格的文本表示：单元格内多个段落用" | "连接，单元格之间用制表符，行之间用换行符
+
+    Args:
+        table: python-docx表格对象
+
+    Returns:
+        str: 表格文本
+    """
+    lines = []
+    for row in table.rows:
+        row_text = []
+        for cell in row.cells:
+            row_text.append(" | ".join(p.text.strip() for p in cell.paragraphs))
+        lines.append("\t".join(row_text))
+    return "\n".join(lines).strip()
+
+
+def document_texts(document) -> Tuple[str, ...]:
+    """
+    文档正文各块级元素（段落和表格）的文本，与ParsedDocument.texts的规则一致
+
+    Args:
+        document: python-docx文档对象
+
+    Returns:
+        Tuple[str, ...]: 按文档顺序的元素文本
+    """
+    texts = []
+    for element in document.element.body:
+        if element.tag == qn("w:p"):
+            texts.append(Paragraph(element, document).text)
+        elif element.tag == qn("w:tbl"):
+            texts.append(table_text(Table(element, document)))
+    return tuple(texts)
+
+
+def document_key(blob: bytes) -> str:
+    """文档内容的缓存键（SHA-256），也用于把同一文档的任务交给同一个工作进程"""
+    return hashlib.sha256(blob).hexdigest()
+
+
+def normalize_text(text: str) -> str:
+    """去掉首尾空白并把连续空白合并为一个空格（与批注匹配的标准化方式一致）"""
+    return _WHITESPACE_RE.sub(" ", text.strip())
+
+
+class ParsedDocument:
+    """
+    一份docx解析后的只读表示，在同一进程内的多个工具之间共享
+
+    - document: 只读的python-docx文档对象（只加载正文和样式，见lazy_package）
+    - elements: 正文块级元素流（段落和表格，按文档顺序）
+    - texts / normalized_texts: 各元素的原始文本和标准化文本
+    - run_index(i): 第i个元素（段落）中每个Run的文本区间
+
+    共享对象不允许修改，需要修改文档的工具通过open_document()直接解析完整文档
+    """
+
+    def __init__(self, blob: bytes, key: str):
+        self.blob = blob
+        self.key = key
+        self.document = load_document(blob, parts=SHARED_PARTS)
+
+        elements = []
+        for index, element in enumerate(self.document.element.body):
+            if element.tag == qn("w:p"):
+                paragraph = Paragraph(element, self.document)
+                elements.append(
+                    DocumentElement("paragraph", index, paragraph.text, paragraph)
+                )
+            elif element.tag == qn("w:tbl"):
+                table = Table(element, self.document)
+                elements.append(DocumentElement("table", index, table_text(table), table))
+        self.elements: Tuple[DocumentElement, ...] = tuple(elements)
+        self.texts: Tuple[str, ...] = tuple(e.text for e in elements)
+        self.normalized_texts: Tuple[str, ...] = tuple(
+            normalize_text(text) for text in self.texts
+        )
+
+        self._run_indexes: Dict[int, Tuple[Tuple[int, int, object], ...]] = {}
+
+        with zipfile.ZipFile(io.BytesIO(blob)) as zf:
+            member_sizes = {info.filename: info.file_size for info in zf.infolist()}
+        parsed_xml = sum(
+            member_sizes.get(name.lstrip("/"), 0)
+            for name in self.document.part.package.parts_read
+        )
+        # 估算的内存占用（字节），供缓存按总大小淘汰
+        self.nbytes = len(blob) + parsed_xml * PARSED_XML_FACTOR
+
+    def run_index(self, i: int) -> Tuple[Tuple[int, int, object], ...]:
+        """
+        返回第i个元素中各Run在段落文本中的区间 (起始偏移, 结束偏移, Run对象)
+
+        按需计算并缓存；表格元素返回空元组
+        """
+        runs = self._run_indexes.get(i)
+        if runs is None:
+            element = self.elements[i]
+            entries = []
+            if element.type == "paragraph":
+                offset = 0
+                for run in element.block.runs:
+                    text = run.text
+                    entries.append((offset, offset + len(text), run))
+                    offset += len(text)
+            runs = self._run_indexes[i] = tuple(entries)
+        return runs
+
+
+class DocumentCache:
+    """
+    进程内的解析文档缓存，以文件内容的SHA-256为键，按总字节数和条目数做LRU淘汰
+    """
+
+    def __init__(self, max_bytes: int, max_entries: int):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, ParsedDocument]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0 and self.max_entries > 0
+
+    def get(self, source: Union[bytes, str]) -> ParsedDocument:
+        """
+        获取文档的解析结果，缓存中没有时解析并放入缓存
+
+        Args:
+            source: docx文件内容（字节）或文件路径
+
+        Returns:
+            ParsedDocument: 共享的只读解析结果
+        """
+        if isinstance(source, str):
+            with open(source, "rb") as f:
+                source = f.read()
+        key = document_key(source)
+
+        with self._lock:
+            parsed = self._entries.get(key)
+            if parsed is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                count("document_cache_hits")
+                return parsed
+            self.misses += 1
+        count("document_cache_misses")
+
+        # 解析不持有锁，避免大文档阻塞其他请求
+        with stage("parse"):
+            parsed = ParsedDocument(source, key)
+        if self.enabled:
+            with self._lock:
+                self._entries[key] = parsed
+                self._entries.move_to_end(key)
+                self._evict()
+        return parsed
+
+    def _evict(self) -> None:
+        """淘汰最久未使用的条目，直到总大小和条目数都在限制之内（至少保留最新的一个）"""
+        total = sum(parsed.nbytes for parsed in self._entries.values())
+        while len(self._entries) > 1 and (
+            total > self.max_bytes or len(self._entries) > self.max_entries
+        ):
+            _, evicted = self._entries.popitem(last=False)
+            total -= evicted.nbytes
+            self.evictions += 1
+        if total > self.max_bytes and self._entries:
+            # 单个文档就超过上限时不缓存
+            self._entries.clear()
+            self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """返回命中、未命中、淘汰次数以及当前条目数和估算占用"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": sum(parsed.nbytes for parsed in self._entries.values()),
+                "max_bytes": self.max_bytes,
+            }
+
+
+def _env_int(name: str, default: int) -> int:
+    """读取整数环境变量，无效时使用默认值"""
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+_cache: Optional[DocumentCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_document_cache() -> DocumentCache:
+    """返回进程内共享的文档缓存（容量由环境变量配置）"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = DocumentCache(
+                    max_bytes=_env_int(CACHE_MAX_BYTES_ENV, DEFAULT_CACHE_MAX_MB) * 1024 * 1024,
+                    max_entries=_env_int(CACHE_MAX_ENTRIES_ENV, DEFAULT_CACHE_MAX_ENTRIES),
+                )
+    return _cache
+
+
+def get_parsed_document(source: Union[bytes, str]) -> ParsedDocument:
+    """从共享缓存获取文档的解析结果"""
+    return get_document_cache().get(source)
+
+
+def open_document(source: Union[bytes, str]):
+    """
+    直接解析完整文档，返回可以修改和保存的python-docx文档对象
+
+    修改文档的工具（批注、插入）每次都处理新上传的文档，不经过共享缓存：
+    缓存的只读解析和复制完整包的开销都高于直接解析一次
+
+    Args:
+        source: docx文件内容（字节）或文件路径
+
+    Returns:
+        Document: 独立的python-docx文档对象
+    """
+    with stage("parse"):
+        return Document(io.BytesIO(source) if isinstance(source, bytes) else source)
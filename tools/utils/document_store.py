@@ -0,0 +1,254 @@
+"""
+本地文档存储：register_document工具登记的文档保存在插件所在机器的磁盘上，返回简短的句柄
+
+工作流中同一个文件往往要依次交给多个工具（多次分段后再批注），每次都以完整文件传输。
+先登记一次得到句柄，后续工具传入document_handle代替文件参数，从本地存储读取文档内容，
+不再经过Dify传输；同一内容的文档还会被交给同一个工作进程，只解析一次。
+
+- 所有者: 登记时记录调用方（应用ID和用户ID的摘要），只有同一应用中的同一用户可以取回，
+  其他调用方使用该句柄时与句柄不存在的处理相同
+- 句柄: "doc_" + 所有者和内容SHA-256摘要的前24位十六进制，同一调用方重复登记相同内容得到同一个句柄，
+  不同调用方登记相同内容得到不同的句柄
+- 过期: 超过有效期（从最近一次使用算起）没有使用的文档被删除
+- 容量: 总大小超过上限时按最近使用时间淘汰，至少保留最新的一个
+- 权限: 存储目录只有插件进程的用户可以访问（0700），文件以0600创建
+"""
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from tools.utils.document_cache import document_key
+from tools.utils.logger_utils import get_logger
+
+logger = get_logger(__name__)
+
+# 存储配置（环境变量）
+STORE_DIR_ENV = "WORD_TOOLS_DOCUMENT_STORE_DIR"  # 存储目录
+STORE_MAX_MB_ENV = "WORD_TOOLS_DOCUMENT_STORE_MB"  # 存储总大小上限
+STORE_TTL_ENV = "WORD_TOOLS_DOCUMENT_STORE_TTL"  # 文档有效期（小时）
+DEFAULT_STORE_DIR = os.path.join(tempfile.gettempdir(), "word_tools_documents")
+DEFAULT_STORE_MAX_MB = 512
+# 句柄通常只在一次工作流运行中使用，文档不必长时间保留
+DEFAULT_STORE_TTL_HOURS = 1
+
+HANDLE_PREFIX = "doc_"
+HANDLE_DIGITS = 24
+# 只接受格式正确的句柄，避免拼接出存储目录之外的路径
+HANDLE_RE = re.compile(rf"^{HANDLE_PREFIX}[0-9a-f]{{{HANDLE_DIGITS}}}$")
+
+
+class DocumentHandleError(ValueError):
+    """句柄格式错误、文档不存在、已过期或不属于调用方"""
+
+
+def document_owner(tool: Any) -> str:
+    """
+    调用方标识：应用ID和用户ID的摘要，登记和取回文档时用于校验
+
+    Args:
+        tool: 工具实例（使用self.session.app_id和self.runtime.user_id）
+
+    Returns:
+        str: 调用方标识（不包含原始ID）
+    """
+    app_id = getattr(getattr(tool, "session", None), "app_id", None) or ""
+    user_id = getattr(getattr(tool, "runtime", None), "user_id", None) or ""
+    return hashlib.sha256(f"{app_id}\n{user_id}".encode("utf-8")).hexdigest()[:32]
+
+
+class StoredDocument:
+    """
+    通过句柄取回的文档，提供与File相同的blob和filename属性，工具可以不加区分地使用
+
+    文档内容在第一次访问blob时才读取
+    """
+
+    def __init__(self, handle: str, path: str, filename: Optional[str], size: int):
+        self.handle = handle
+        self.path = path
+        self.filename = filename
+        self.size = size
+        self._blob: Optional[bytes] = None
+
+    @property
+    def blob(self) -> bytes:
+        if self._blob is None:
+            with open(self.path, "rb") as f:
+                self._blob = f.read()
+        return self._blob
+
+
+class DocumentStore:
+    """磁盘上的文档存储，每个文档保存为 <句柄>.bin（内容）和 <句柄>.json（文件名等信息）"""
+
+    def __init__(self, directory: str, max_bytes: int, ttl: float):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def put(self, blob: bytes, filename: Optional[str], owner: str) -> str:
+        """
+        登记文档，同一调用方已登记相同内容时只更新文件名和使用时间
+
+        Args:
+            blob: 文档内容
+            filename: 原始文件名
+            owner: 调用方标识（见document_owner）
+
+        Returns:
+            str: 文档句柄
+        """
+        digest = hashlib.sha256(f"{owner}\n{document_key(blob)}".encode("utf-8")).hexdigest()
+        handle = HANDLE_PREFIX + digest[:HANDLE_DIGITS]
+        data_path, meta_path = self._paths(handle)
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        with self._lock:
+            if os.path.exists(data_path) and os.path.getsize(data_path) == len(blob):
+                os.utime(data_path)
+            else:
+                self._write(data_path, blob)
+            meta = {"filename": filename, "size": len(blob), "owner": owner, "registered": time.time()}
+            self._write(meta_path, json.dumps(meta, ensure_ascii=False).encode("utf-8"))
+            self._evict(keep=handle)
+        return handle
+
+    def get(self, handle: str, owner: str) -> StoredDocument:
+        """
+        按句柄取回文档并刷新使用时间
+
+        Args:
+            handle: register_document返回的句柄
+            owner: 调用方标识（见document_owner），必须与登记时的一致
+
+        Returns:
+            StoredDocument: 文档
+
+        Raises:
+            DocumentHandleError: 句柄格式错误、文档不存在、已过期或不属于调用方
+        """
+        handle = handle.strip()
+        if not HANDLE_RE.match(handle):
+            raise DocumentHandleError(f"无效的文档句柄: {handle[:40]}")
+        missing = DocumentHandleError(
+            f"文档句柄 {handle} 不存在或已过期，请重新使用register_document登记文档"
+        )
+        data_path, meta_path = self._paths(handle)
+        try:
+            last_used = os.path.getmtime(data_path)
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            raise missing
+        if meta.get("owner") != owner:
+            # 不提示句柄属于其他调用方，与句柄不存在时的处理相同
+            logger.warning(f"文档句柄 {handle} 不属于当前调用方，拒绝访问")
+            raise missing
+        if self.ttl > 0 and time.time() - last_used > self.ttl:
+            self._remove(handle)
+            raise missing
+        os.utime(data_path)
+        return StoredDocument(handle, data_path, meta.get("filename"), meta.get("size", 0))
+
+    def _paths(self, handle: str):
+        base = os.path.join(self.directory, handle)
+        return base + ".bin", base + ".json"
+
+    @staticmethod
+    def _write(path: str, data: bytes) -> None:
+        """先写临时文件再替换，其他进程不会读到写了一半的文件"""
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _remove(self, handle: str) -> None:
+        for path in self._paths(handle):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _evict(self, keep: str) -> None:
+        """删除过期文档，再按最近使用时间淘汰，直到总大小不超过上限（保留刚登记的文档）"""
+        entries = []
+        now = time.time()
+        for name in os.listdir(self.directory):
+            if not name.endswith(".bin"):
+                continue
+            handle = name[:-4]
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
+            if handle != keep and self.ttl > 0 and now - stat.st_mtime > self.ttl:
+                self._remove(handle)
+                self.evictions += 1
+                continue
+            entries.append((stat.st_mtime, stat.st_size, handle))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, handle in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if handle == keep:
+                continue
+            self._remove(handle)
+            total -= size
+            self.evictions += 1
+            logger.info(f"文档存储超过容量上限，淘汰最久未使用的文档 {handle}")
+
+    def stats(self) -> Dict[str, int]:
+        """返回当前文档数、总大小和淘汰次数"""
+        sizes = []
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if name.endswith(".bin"):
+                    try:
+                        sizes.append(os.path.getsize(os.path.join(self.directory, name)))
+                    except FileNotFoundError:
+                        pass
+        return {
+            "documents": len(sizes),
+            "bytes": sum(sizes),
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+        }
+
+
+def _env_number(name: str, default, cast=int):
+    """读取数值环境变量，无效时使用默认值"""
+    try:
+        return cast(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+_store: Optional[DocumentStore] = None
+_store_lock = threading.Lock()
+
+
+def get_document_store() -> DocumentStore:
+    """返回进程内共享的文档存储（目录、容量和有效期由环境变量配置）"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = DocumentStore(
+                    directory=os.environ.get(STORE_DIR_ENV) or DEFAULT_STORE_DIR,
+                    max_bytes=_env_number(STORE_MAX_MB_ENV, DEFAULT_STORE_MAX_MB) * 1024 * 1024,
+                    ttl=_env_number(STORE_TTL_ENV, DEFAULT_STORE_TTL_HOURS, float) * 3600,
+                )
+    return _store
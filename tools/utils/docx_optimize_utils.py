@@ -0,0 +1,276 @@
+import copy
+from typing import Dict, Optional
+
+from docx.enum.style import WD_STYLE_TYPE
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+from lxml import etree
+
+# 常用的WordprocessingML标签
+_RUN_TAG = qn("w:r")
+_RPR_TAG = qn("w:rPr")
+_TEXT_TAG = qn("w:t")
+_RSTYLE_TAG = qn("w:rStyle")
+_RPR_CHANGE_TAG = qn("w:rPrChange")
+
+# 拼写/语法检查标记，不影响显示，但会把相邻Run隔开导致无法合并
+_PROOF_ERR_TAG = qn("w:proofErr")
+
+# 可以包含Run的行内容器，需要递归处理
+_INLINE_CONTAINER_TAGS = {
+    qn("w:hyperlink"),
+    qn("w:smartTag"),
+    qn("w:customXml"),
+    qn("w:fldSimple"),
+}
+
+# 不含任何Run时可以安全移除的行内容器（空超链接、空智能标记）
+_REMOVABLE_CONTAINER_TAGS = {
+    qn("w:hyperlink"),
+    qn("w:smartTag"),
+}
+
+# 切换型属性（toggle property）在段落样式与字符样式之间是按异或叠加的，
+# 放进字符样式会改变显示效果，因此始终保留为直接格式
+_TOGGLE_PROPERTY_TAGS = {
+    qn("w:b"),
+    qn("w:bCs"),
+    qn("w:i"),
+    qn("w:iCs"),
+    qn("w:caps"),
+    qn("w:smallCaps"),
+    qn("w:strike"),
+    qn("w:dstrike"),
+    qn("w:outline"),
+    qn("w:shadow"),
+    qn("w:emboss"),
+    qn("w:imprint"),
+    qn("w:vanish"),
+}
+
+# 共享字符样式的名称前缀
+SHARED_STYLE_PREFIX = "PDF Char"
+
+
+def optimize_document(
+    doc, min_style_usage: int = 8, min_style_properties: int = 2
+) -> Dict[str, int]:
+    """
+    对文档做一次结构优化：合并格式相同的相邻Run、移除空Run和空的行内容器，
+    并把重复出现的行内格式提取为共享的字符样式
+
+    主要用于pdf2docx转换结果，这类文档往往每几个字符就是一个Run，
+    且每个Run都带有完整的rPr，导致XML体积很大、后续处理很慢
+
+    Args:
+        doc: Word文档对象
+        min_style_usage: 行内格式至少重复出现多少次才提取为共享样式
+        min_style_properties: 行内格式至少包含多少个非切换型属性才值得提取
+
+    Returns:
+        dict: 优化统计信息（Run数量、XML字节数等）
+    """
+    body = doc.element.body
+    stats = {
+        "xml_bytes_before": len(etree.tostring(body, encoding="utf-8")),
+        "runs_before": sum(1 for _ in body.iter(_RUN_TAG)),
+        "runs_merged": 0,
+        "empty_runs_removed": 0,
+        "empty_containers_removed": 0,
+        "proof_marks_removed": 0,
+        "styles_created": 0,
+        "runs_restyled": 0,
+    }
+
+    # 1. 逐段合并Run（包括表格单元格中的段落）
+    for paragraph in list(body.iter(qn("w:p"))):
+        _coalesce_container(paragraph, stats)
+
+    # 2. 提取重复的行内格式为共享字符样式
+    if min_style_usage > 0:
+        _extract_shared_styles(doc, body, min_style_usage, min_style_properties, stats)
+
+    stats["runs_after"] = sum(1 for _ in body.iter(_RUN_TAG))
+    stats["xml_bytes_after"] = len(etree.tostring(body, encoding="utf-8"))
+    return stats
+
+
+def _coalesce_container(container, stats: Dict[str, int]) -> None:
+    """
+    合并容器（段落或超链接等）中直接包含的相邻Run
+
+    Args:
+        container: 段落或行内容器元素
+        stats: 统计信息字典（原地更新）
+    """
+    previous_run = None
+    previous_key: Optional[bytes] = None
+
+    for child in list(container):
+        tag = child.tag
+
+        if tag == _PROOF_ERR_TAG:
+            container.remove(child)
+            stats["proof_marks_removed"] += 1
+            continue
+
+        if tag in _INLINE_CONTAINER_TAGS:
+            _coalesce_container(child, stats)
+            if tag in _REMOVABLE_CONTAINER_TAGS and not any(
+                sub.tag == _RUN_TAG for sub in child.iter()
+            ):
+                container.remove(child)
+                stats["empty_containers_removed"] += 1
+            else:
+                previous_run = None
+            continue
+
+        if tag != _RUN_TAG:
+            # 书签、域代码等元素会打断Run的连续性
+            previous_run = None
+            continue
+
+        if _is_empty_run(child):
+            container.remove(child)
+            stats["empty_runs_removed"] += 1
+            continue
+
+        if not _is_text_run(child):
+            previous_run = None
+            continue
+
+        key = _rpr_key(child)
+        if previous_run is not None and key == previous_key:
+            _append_run_text(previous_run, child)
+            container.remove(child)
+            stats["runs_merged"] += 1
+            continue
+
+        # 同一个Run中的多个w:t也合并为一个
+        if len(child.findall(_TEXT_TAG)) > 1:
+            _merge_text_nodes(child)
+
+        previous_run = child
+        previous_key = key
+
+
+def _is_empty_run(run) -> bool:
+    """判断Run是否为空（只有格式没有内容，或只有空文本）"""
+    for child in run:
+        if child.tag == _RPR_TAG:
+            continue
+        if child.tag == _TEXT_TAG and not child.text:
+            continue
+        return False
+    return True
+
+
+def _is_text_run(run) -> bool:
+    """判断Run是否只包含格式和纯文本"""
+    has_text = False
+    for child in run:
+        if child.tag == _TEXT_TAG:
+            has_text = True
+        elif child.tag != _RPR_TAG:
+            return False
+    return has_text
+
+
+def _rpr_key(run) -> bytes:
+    """返回Run格式的序列化形式，用于判断两个Run的格式是否完全一致"""
+    rpr = run.find(_RPR_TAG)
+    if rpr is None:
+        return b""
+    return etree.tostring(rpr)
+
+
+def _set_text(text_element, text: str) -> None:
+    """设置w:t文本，并在首尾有空白时保留空格"""
+    text_element.text = text
+    if text != text.strip():
+        text_element.set(qn("xml:space"), "preserve")
+
+
+def _merge_text_nodes(run) -> None:
+    """把Run中的多个w:t合并为一个"""
+    text_elements = run.findall(_TEXT_TAG)
+    _set_text(text_elements[0], "".join(t.text or "" for t in text_elements))
+    for extra in text_elements[1:]:
+        run.remove(extra)
+
+
+def _append_run_text(target_run, source_run) -> None:
+    """把source_run的文本追加到target_run末尾"""
+    text_elements = target_run.findall(_TEXT_TAG)
+    merged = "".join(t.text or "" for t in text_elements)
+    merged += "".join(t.text or "" for t in source_run.findall(_TEXT_TAG))
+    _set_text(text_elements[0], merged)
+    for extra in text_elements[1:]:
+        target_run.remove(extra)
+
+
+def _extract_shared_styles(
+    doc, body, min_style_usage: int, min_style_properties: int, stats: Dict[str, int]
+) -> None:
+    """
+    把重复出现的行内格式提取为共享字符样式，Run中只保留样式引用和切换型属性
+
+    Args:
+        doc: Word文档对象
+        body: 文档body元素
+        min_style_usage: 最少重复次数
+        min_style_properties: 最少非切换型属性数量
+        stats: 统计信息字典（原地更新）
+    """
+    # 按格式分组统计
+    runs_by_key = {}
+    for run in body.iter(_RUN_TAG):
+        rpr = run.find(_RPR_TAG)
+        if rpr is None:
+            continue
+        # 已经引用样式或带修订记录的格式不做处理
+        if rpr.find(_RSTYLE_TAG) is not None or rpr.find(_RPR_CHANGE_TAG) is not None:
+            continue
+        shared_properties = [
+            child for child in rpr if child.tag not in _TOGGLE_PROPERTY_TAGS
+        ]
+        if len(shared_properties) < min_style_properties:
+            continue
+        key = b"".join(etree.tostring(child) for child in shared_properties)
+        runs_by_key.setdefault(key, []).append(run)
+
+    candidates = [runs for runs in runs_by_key.values() if len(runs) >= min_style_usage]
+    if not candidates:
+        return
+
+    styles = doc.styles
+    existing_names = {style.name for style in styles}
+    style_index = 0
+
+    # 出现次数多的格式优先获得较小的编号
+    for runs in sorted(candidates, key=len, reverse=True):
+        style_index += 1
+        style_name = f"{SHARED_STYLE_PREFIX} {style_index}"
+        while style_name in existing_names:
+            style_index += 1
+            style_name = f"{SHARED_STYLE_PREFIX} {style_index}"
+        existing_names.add(style_name)
+
+        style = styles.add_style(style_name, WD_STYLE_TYPE.CHARACTER)
+        template_rpr = runs[0].find(_RPR_TAG)
+        style_rpr = OxmlElement("w:rPr")
+        for child in template_rpr:
+            if child.tag not in _TOGGLE_PROPERTY_TAGS:
+                style_rpr.append(copy.deepcopy(child))
+        style.element.append(style_rpr)
+        stats["styles_created"] += 1
+
+        for run in runs:
+            rpr = run.find(_RPR_TAG)
+            for child in list(rpr):
+                if child.tag not in _TOGGLE_PROPERTY_TAGS:
+                    rpr.remove(child)
+            rstyle = OxmlElement("w:rStyle")
+            rstyle.set(qn("w:val"), style.style_id)
+            rpr.insert(0, rstyle)
+            stats["runs_restyled"] += 1
@@ -0,0 +1,276 @@
+import struct
+import time
+import zipfile
+import zlib
+from typing import Dict, Iterable, Optional
+
+from docx.opc.packuri import CONTENT_TYPES_URI, PACKAGE_URI
+from docx.opc.part import XmlPart
+from docx.opc.pkgwriter import _ContentTypesItem
+
+from tools.utils.instrumentation import count, stage
+from tools.utils.logger_utils import get_logger
+
+logger = get_logger(__name__)
+
+
+def document_parts(doc, *reltypes) -> list:
+    """
+    返回文档主体部件以及主体部件按关系类型引用的部件（不存在的关系会被忽略）
+
+    用于向save_document说明本次修改涉及哪些部件，例如：
+    document_parts(doc, RT.STYLES, RT.COMMENTS)
+
+    Args:
+        doc: Word文档对象
+        reltypes: 关系类型（docx.opc.constants.RELATIONSHIP_TYPE中的值）
+
+    Returns:
+        list: 部件列表
+    """
+    parts = [doc.part]
+    for reltype in reltypes:
+        try:
+            parts.append(doc.part.part_related_by(reltype))
+        except KeyError:
+            continue
+    return parts
+
+
+def save_document(
+    doc, output_path, source_path, modified_parts: Optional[Iterable] = None
+) -> Dict[str, int]:
+    """
+    保存文档，未修改的二进制部件（图片、字体等）以原始的压缩数据直接复制，不解压也不重新压缩
+
+    python-docx的doc.save()会把所有部件重新序列化并以DEFLATE重新压缩，图片、字体越多越慢。
+    这里自行写出zip文件，按以下规则写出每个部件：
+    - modified_parts中的部件、原始文件中不存在的新部件、所有XML部件：重新序列化并压缩。
+      python-docx打开文档时解析了全部XML部件，未声明的XML部件无法低成本地确认没有被修改，
+      因此也重新序列化，保证任何修改都不会丢失
+    - 其余二进制部件：内容与原始成员一致（大小和CRC相同）时，从原始docx中按字节复制其压缩数据；
+      内容已变化时按新部件写出并记录警告
+    - [Content_Types].xml和所有.rels：始终重新生成（体积很小，且可能因新增部件而变化）
+
+    原始成员的位置和大小取自ZipFile.infolist()，文件头和中央目录按zip格式写出；
+    需要ZIP64（成员或文件超过4 GB、超过65535个成员）时回退为doc.save()
+
+    Args:
+        doc: Word文档对象（从source_path打开）
+        output_path: 输出文件路径
+        source_path: 打开doc时使用的原始docx路径
+        modified_parts: 被修改的部件（Part对象或部件名，如"/word/document.xml"），
+            默认只有文档主体部件
+
+    Returns:
+        dict: 保存统计信息（重新序列化的部件数、直接复制的部件数和复制的压缩字节数），
+            原始文件无法按zip读取时回退为doc.save()，并标记fallback
+    """
+    with stage("save"):
+        try:
+            stats = _save_with_passthrough(doc, output_path, source_path, modified_parts)
+        except (zipfile.BadZipFile, zipfile.LargeZipFile, struct.error, OSError) as e:
+            logger.warning(f"无法直接复制原始部件（{e}），改为完整保存")
+            doc.save(output_path)
+            stats = {"parts_written": 0, "parts_copied": 0, "bytes_copied": 0, "fallback": 1}
+    count("parts_written", stats["parts_written"])
+    count("parts_copied", stats["parts_copied"])
+    return stats
+
+
+def _save_with_passthrough(doc, output_path, source_path, modified_parts) -> Dict[str, int]:
+    """save_document的具体实现"""
+    package = doc.part.package
+    if modified_parts is None:
+        modified_parts = [doc.part]
+    modified = {str(getattr(part, "partname", part)) for part in modified_parts}
+
+    stats = {"parts_written": 0, "parts_copied": 0, "bytes_copied": 0, "fallback": 0}
+    parts = list(package.iter_parts())
+    for part in parts:
+        part.before_marshal()
+
+    with zipfile.ZipFile(source_path) as source:
+        source_members = {info.filename: info for info in source.infolist()}
+
+    with open(source_path, "rb") as source, open(output_path, "wb") as output:
+        target = _ZipWriter(output)
+        target.write(CONTENT_TYPES_URI.membername, _ContentTypesItem.from_parts(parts).blob)
+        target.write(PACKAGE_URI.rels_uri.membername, package.rels.xml)
+
+        for part in parts:
+            membername = part.partname.membername
+            info = source_members.get(membername)
+            blob = part.blob
+            if (
+                info is None
+                or str(part.partname) in modified
+                or isinstance(part, XmlPart)
+                or info.flag_bits & _FLAG_ENCRYPTED
+            ):
+                target.write(membername, blob)
+                stats["parts_written"] += 1
+            elif not _same_content(blob, info):
+                logger.warning(f"部件 {part.partname} 已被修改但未声明，按新部件写出")
+                count("parts_undeclared")
+                target.write(membername, blob)
+                stats["parts_written"] += 1
+            else:
+                target.copy(source, info)
+                stats["parts_copied"] += 1
+                stats["bytes_copied"] += info.compress_size
+            if len(part.rels):
+                target.write(part.partname.rels_uri.membername, part.rels.xml)
+
+        target.close()
+
+    return stats
+
+
+def _same_content(blob: bytes, info: zipfile.ZipInfo) -> bool:
+    """部件内容是否与原始成员一致（按大小和CRC32判断，不需要解压原始成员）"""
+    return len(blob) == info.file_size and zlib.crc32(blob) == info.CRC
+
+
+# zip格式的常量（APPNOTE.TXT 4.3）
+_LOCAL_HEADER = struct.Struct("<IHHHHHIIIHH")
+_CENTRAL_HEADER = struct.Struct("<IHHHHHHIIIHHHHHII")
+_END_OF_CENTRAL_DIR = struct.Struct("<IHHHHIIH")
+_LOCAL_HEADER_SIGNATURE = 0x04034B50
+_CENTRAL_HEADER_SIGNATURE = 0x02014B50
+_END_OF_CENTRAL_DIR_SIGNATURE = 0x06054B50
+_FLAG_ENCRYPTED = 0x01
+_FLAG_UTF8 = 0x800
+_ZIP_LIMIT = 0xFFFFFFFF
+_MAX_MEMBERS = 0xFFFF
+_COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class _ZipWriter:
+    """
+    只支持save_document所需功能的zip写出器：写入新成员（DEFLATE压缩），
+    或把原始zip中的成员按压缩后的字节复制过来；不支持ZIP64，超出限制时抛出LargeZipFile
+    """
+
+    def __init__(self, fp):
+        self.fp = fp
+        self.members = []
+
+    def write(self, name: str, data: bytes) -> None:
+        """以DEFLATE压缩写入新成员（与ZipFile.writestr的默认设置相同）"""
+        compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+        compressed = compressor.compress(data) + compressor.flush()
+        self._add(
+            name,
+            time.localtime(time.time())[:6],
+            method=zipfile.ZIP_DEFLATED,
+            version=20,
+            crc=zlib.crc32(data),
+            compress_size=len(compressed),
+            file_size=len(data),
+            create_system=3,
+            external_attr=0o600 << 16,
+            chunks=[compressed],
+        )
+
+    def copy(self, source, info: zipfile.ZipInfo) -> None:
+        """
+        从原始zip文件复制一个成员的压缩数据
+
+        Args:
+            source: 以二进制方式打开的原始zip文件
+            info: 该成员的ZipInfo（来自ZipFile.infolist()）
+        """
+        # 压缩数据位于本地文件头、文件名和扩展字段之后，后两者的长度以本地文件头为准
+        source.seek(info.header_offset)
+        header = _LOCAL_HEADER.unpack(source.read(_LOCAL_HEADER.size))
+        if header[0] != _LOCAL_HEADER_SIGNATURE:
+            raise zipfile.BadZipFile(f"本地文件头损坏: {info.filename}")
+        source.seek(info.header_offset + _LOCAL_HEADER.size + header[9] + header[10])
+        self._add(
+            info.filename,
+            info.date_time,
+            method=info.compress_type,
+            version=max(info.extract_version, 20),
+            crc=info.CRC,
+            compress_size=info.compress_size,
+            file_size=info.file_size,
+            create_system=info.create_system,
+            external_attr=info.external_attr,
+            chunks=_read_exact(source, info.compress_size, info.filename),
+        )
+
+    def close(self) -> None:
+        """写出中央目录和目录结束记录"""
+        if len(self.members) > _MAX_MEMBERS:
+            raise zipfile.LargeZipFile("成员数超过65535，需要ZIP64")
+        start = self.fp.tell()
+        for member in self.members:
+            self.fp.write(member)
+        size = self.fp.tell() - start
+        if self.fp.tell() > _ZIP_LIMIT:
+            raise zipfile.LargeZipFile("文件超过4 GB，需要ZIP64")
+        total = len(self.members)
+        self.fp.write(
+            _END_OF_CENTRAL_DIR.pack(
+                _END_OF_CENTRAL_DIR_SIGNATURE, 0, 0, total, total, size, start, 0
+            )
+        )
+
+    def _add(
+        self,
+        name,
+        date_time,
+        method,
+        version,
+        crc,
+        compress_size,
+        file_size,
+        create_system,
+        external_attr,
+        chunks,
+    ) -> None:
+        offset = self.fp.tell()
+        if max(offset, compress_size, file_size) >= _ZIP_LIMIT:
+            raise zipfile.LargeZipFile(f"{name} 超过4 GB，需要ZIP64")
+        try:
+            encoded, flags = name.encode("ascii"), 0
+        except UnicodeEncodeError:
+            encoded, flags = name.encode("utf-8"), _FLAG_UTF8
+        year, month, day, hour, minute, second = date_time
+        dos_date = (max(year, 1980) - 1980) << 9 | month << 5 | day
+        dos_time = hour << 11 | minute << 5 | second // 2
+        fields = (method, dos_time, dos_date, crc, compress_size, file_size, len(encoded))
+
+        self.fp.write(
+            _LOCAL_HEADER.pack(_LOCAL_HEADER_SIGNATURE, version, flags, *fields, 0) + encoded
+        )
+        for chunk in chunks:
+            self.fp.write(chunk)
+        self.members.append(
+            _CENTRAL_HEADER.pack(
+                _CENTRAL_HEADER_SIGNATURE,
+                create_system << 8 | version,
+                version,
+                flags,
+                *fields,
+                0,
+                0,
+                0,
+                0,
+                external_attr,
+                offset,
+            )
+            + encoded
+        )
+
+
+def _read_exact(source, size: int, name: str):
+    """按块读取size个字节，数据不完整时抛出BadZipFile"""
+    remaining = size
+    while remaining > 0:
+        chunk = source.read(min(_COPY_CHUNK_SIZE, remaining))
+        if not chunk:
+            raise zipfile.BadZipFile(f"压缩数据不完整: {name}")
+        remaining -= len(chunk)
+        yield chunk
@@ -1,4 +1,7 @@
-from typing import Optional, Dict, Union
+import os
+import tempfile
+from contextlib import contextmanager
+from typing import Iterator, Optional, Dict, Tuple, Union
 
 
 def get_meta_data(
@@ -66,3 +69,33 @@ def sanitize_filename(filename: str) -> str:
         clean_filename = clean_filename[:250]
 
     return clean_filename
+
+
+@contextmanager
+def temporary_io_files(
+    blob: bytes, input_suffix: str, output_suffix: str
+) -> Iterator[Tuple[str, str]]:
+    """
+    把输入内容写入临时文件，并准备一个输出临时文件，退出时删除两个文件（包括出错时）
+
+    Args:
+        blob: 输入文件内容
+        input_suffix: 输入临时文件的扩展名
+        output_suffix: 输出临时文件的扩展名
+
+    Returns:
+        tuple: (输入文件路径, 输出文件路径)
+    """
+    with tempfile.NamedTemporaryFile(delete=False, suffix=input_suffix) as input_file:
+        input_file.write(blob)
+        input_path = input_file.name
+    with tempfile.NamedTemporaryFile(delete=False, suffix=output_suffix) as output_file:
+        output_path = output_file.name
+    try:
+        yield input_path, output_path
+    finally:
+        for path in (input_path, output_path):
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
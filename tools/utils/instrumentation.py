@@ -0,0 +1,134 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+
+class Metrics:
+    """
+    一次请求的阶段耗时和计数
+
+    - stages: 阶段名 -> 累计自身耗时（毫秒），同名阶段多次进入时累加，按首次完成的顺序排列
+    - counters: 计数名 -> 数值（元素数量、命中/未命中次数等）
+    - request_id: 请求ID（Dify会话ID），用于关联剖析结果等按请求输出的数据
+    """
+
+    def __init__(self, request_id: Optional[str] = None):
+        self.request_id = request_id or None
+        self.stages: Dict[str, float] = {}
+        self.counters: Dict[str, Any] = {}
+        self._started = time.perf_counter()
+        # 正在执行的阶段及其子阶段累计耗时，用于计算阶段的自身耗时
+        self._stack: List[List[float]] = []
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        记录一个阶段的耗时。阶段可以嵌套，外层阶段只记录扣除内层阶段之后的自身耗时，
+        因此各阶段耗时之和不会超过总耗时
+        """
+        frame = [time.perf_counter(), 0.0]
+        self._stack.append(frame)
+        try:
+            yield
+        finally:
+            self._stack.pop()
+            elapsed = (time.perf_counter() - frame[0]) * 1000
+            self.stages[name] = self.stages.get(name, 0.0) + elapsed - frame[1]
+            if self._stack:
+                self._stack[-1][1] += elapsed
+
+    def count(self, name: str, value: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def set(self, name: str, value: Any) -> None:
+        self.counters[name] = value
+
+    def merge(self, data: Dict[str, Dict[str, Any]]) -> None:
+        """合并另一份指标（如工作进程返回的as_dict结果）：耗时和数值计数累加，其他值覆盖"""
+        for name, elapsed in data.get("stages_ms", {}).items():
+            self.stages[name] = self.stages.get(name, 0.0) + elapsed
+        for name, value in data.get("counters", {}).items():
+            current = self.counters.get(name)
+            if isinstance(value, (int, float)) and isinstance(current, (int, float)):
+                self.counters[name] = current + value
+            else:
+                self.counters[name] = value
+
+    def as_dict(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            "stages_ms": {name: round(elapsed, 2) for name, elapsed in self.stages.items()},
+            "counters": dict(self.counters),
+        }
+
+    def report(self) -> Dict[str, Any]:
+        """返回给调用方的指标：各阶段耗时、计数、从开始收集到现在的总耗时和请求ID"""
+        result = self.as_dict()
+        result["total_ms"] = round((time.perf_counter() - self._started) * 1000, 2)
+        if self.request_id:
+            result["request_id"] = self.request_id
+        return result
+
+
+# 当前请求（协程/工作进程任务）正在收集的指标；没有收集时各记录函数为空操作
+_current: ContextVar[Optional[Metrics]] = ContextVar("word_tools_metrics", default=None)
+
+
+@contextmanager
+def collect_metrics(metrics: Optional[Metrics] = None) -> Iterator[Metrics]:
+    """
+    在代码块内收集指标，块内（包括深层调用的工具函数）通过stage/count记录
+
+    代码块内不能yield：指标通过上下文变量传递，生成器暂停时会泄漏到调用方。
+    工具的_invoke先创建Metrics，只在不产生消息的处理部分调用collect_metrics(metrics)
+
+    用法:
+        with collect_metrics() as metrics:
+            with stage("parse"):
+                ...
+            count("paragraphs", n)
+        metrics.report()
+    """
+    if metrics is None:
+        metrics = Metrics()
+    token = _current.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current.reset(token)
+
+
+def current_metrics() -> Optional[Metrics]:
+    return _current.get()
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """记录一个阶段的耗时（当前没有收集指标时不做任何事）"""
+    metrics = _current.get()
+    if metrics is None:
+        yield
+        return
+    with metrics.stage(name):
+        yield
+
+
+def count(name: str, value: int = 1) -> None:
+    """累加一个计数（当前没有收集指标时不做任何事）"""
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.count(name, value)
+
+
+def set_value(name: str, value: Any) -> None:
+    """记录一个数值（当前没有收集指标时不做任何事）"""
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.set(name, value)
+
+
+def merge_metrics(data: Optional[Dict[str, Dict[str, Any]]]) -> None:
+    """把其他进程返回的指标合并到当前正在收集的指标中"""
+    metrics = _current.get()
+    if metrics is not None and data:
+        metrics.merge(data)
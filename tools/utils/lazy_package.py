@@ -0,0 +1,179 @@
+import io
+import zipfile
+from typing import Dict, Iterable, Optional, Union
+
+from docx.document import Document as DocxDocument
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.opc.packuri import PACKAGE_URI, PackURI
+from docx.oxml import parse_xml
+from docx.oxml.ns import qn
+from docx.parts.styles import StylesPart
+from docx.styles.styles import Styles
+from lxml import etree
+
+# 关系文件中的Relationship元素
+_RELATIONSHIP_TAG = "{http://schemas.openxmlformats.org/package/2006/relationships}Relationship"
+
+# 工具可以声明需要的部件名称及其对应的关系类型（相对于文档主体部件）
+PART_RELTYPES = {
+    "styles": RT.STYLES,
+    "numbering": RT.NUMBERING,
+}
+
+
+class LazyPackage:
+    """
+    按需读取部件的只读docx包
+
+    python-docx的Document()在打开时会把包中的所有部件（包括图片、字体等）解压进内存，
+    这里只在真正访问某个部件时才解压对应的zip成员
+    """
+
+    def __init__(self, source: Union[str, bytes, io.IOBase]):
+        """
+        Args:
+            source: docx文件路径、文件内容（字节）或可读的文件对象
+        """
+        if isinstance(source, (bytes, bytearray)):
+            source = io.BytesIO(source)
+        self._zip = zipfile.ZipFile(source)
+        self._rels_cache: Dict[str, Dict[str, str]] = {}
+        self.parts_read = []
+
+    def close(self) -> None:
+        self._zip.close()
+
+    def read(self, partname: str) -> Optional[bytes]:
+        """读取并解压一个部件，部件不存在时返回None"""
+        membername = partname.lstrip("/")
+        try:
+            blob = self._zip.read(membername)
+        except KeyError:
+            return None
+        self.parts_read.append(partname)
+        return blob
+
+    def related_partnames(self, source_partname: str) -> Dict[str, str]:
+        """
+        返回部件的关系表：关系类型 -> 目标部件名（每种类型只保留第一个，忽略外部链接）
+
+        Args:
+            source_partname: 源部件名，包级关系使用"/"
+        """
+        if source_partname in self._rels_cache:
+            return self._rels_cache[source_partname]
+
+        source_uri = PackURI(source_partname)
+        rels = {}
+        blob = self.read(source_uri.rels_uri)
+        if blob is not None:
+            for rel in etree.fromstring(blob).iter(_RELATIONSHIP_TAG):
+                if rel.get("TargetMode") == "External":
+                    continue
+                reltype = rel.get("Type")
+                if reltype in rels:
+                    continue
+                rels[reltype] = str(
+                    PackURI.from_rel_ref(source_uri.baseURI, rel.get("Target"))
+                )
+        self._rels_cache[source_partname] = rels
+        return rels
+
+    @property
+    def main_document_partname(self) -> str:
+        """文档主体部件名（通常为/word/document.xml）"""
+        partname = self.related_partnames(PACKAGE_URI).get(RT.OFFICE_DOCUMENT)
+        if partname is None:
+            raise ValueError("文件中没有找到Word文档主体部件")
+        return partname
+
+
+class LazyDocumentPart:
+    """
+    只读场景下DocumentPart的轻量替代，提供Paragraph/Run解析样式所需的接口
+
+    样式、编号等部件在声明需要时随文档一起读取，否则在第一次访问时才读取
+    """
+
+    def __init__(self, package: LazyPackage, partname: str, element):
+        self.package = package
+        self.partname = partname
+        self._element = element
+        self._styles = None
+        self._numbering = None
+        # 只读文档的样式不会变化，按(样式ID, 类型)缓存查找结果，
+        # 避免每次解析默认样式都遍历全部样式定义
+        self._style_cache = {}
+
+    @property
+    def element(self):
+        return self._element
+
+    def related_blob(self, name: str) -> Optional[bytes]:
+        """按部件名称（见PART_RELTYPES）读取主体部件引用的部件内容"""
+        partname = self.package.related_partnames(self.partname).get(PART_RELTYPES[name])
+        if partname is None:
+            return None
+        return self.package.read(partname)
+
+    @property
+    def styles(self) -> Styles:
+        """文档样式，文档没有styles.xml时与python-docx一样使用默认样式"""
+        if self._styles is None:
+            blob = self.related_blob("styles")
+            if blob is None:
+                blob = StylesPart._default_styles_xml()
+            self._styles = Styles(parse_xml(blob))
+        return self._styles
+
+    @property
+    def numbering(self):
+        """编号定义（w:numbering元素），文档没有编号部件时为None"""
+        if self._numbering is None:
+            blob = self.related_blob("numbering")
+            self._numbering = parse_xml(blob) if blob is not None else False
+        return self._numbering or None
+
+    def get_style(self, style_id, style_type):
+        """返回指定ID的样式，与DocumentPart.get_style一致"""
+        key = (style_id, style_type)
+        style = self._style_cache.get(key)
+        if style is None:
+            style = self._style_cache[key] = self.styles.get_by_id(style_id, style_type)
+        return style
+
+    def get_style_id(self, style_or_name, style_type):
+        """返回样式ID，与DocumentPart.get_style_id一致"""
+        return self.styles.get_style_id(style_or_name, style_type)
+
+
+def load_document(
+    source: Union[str, bytes, io.IOBase], parts: Iterable[str] = ("styles",)
+) -> DocxDocument:
+    """
+    以只读方式打开docx，只解压文档主体和声明需要的部件
+
+    返回的是python-docx的Document对象，段落、表格、Run、样式等只读接口可以照常使用；
+    图片、页眉页脚等其他部件不会被解压。不支持保存和修改关系（添加图片、批注等）
+
+    Args:
+        source: docx文件路径、文件内容（字节）或可读的文件对象
+        parts: 需要随文档一起读取的部件名称（见PART_RELTYPES），
+            未声明的部件在第一次访问时才读取
+
+    Returns:
+        Document: python-docx文档对象
+    """
+    package = LazyPackage(source)
+    partname = package.main_document_partname
+    element = parse_xml(package.read(partname))
+    if element.tag != qn("w:document"):
+        raise ValueError(f"文档主体部件格式不正确: {partname}")
+
+    part = LazyDocumentPart(package, partname, element)
+    for name in parts:
+        if name not in PART_RELTYPES:
+            raise ValueError(f"不支持的部件名称: {name}，可选值: {', '.join(PART_RELTYPES)}")
+        # 访问属性即完成读取和解析
+        getattr(part, name)
+    return DocxDocument(element, part)
@@ -1,12 +1,85 @@
+import atexit
 import logging
+import os
+import queue
+import re
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, List, Optional
 
 from dify_plugin.config.logger_format import plugin_logger_handler
 
+# 日志级别配置（环境变量）
+LOG_LEVEL_ENV = "WORD_TOOLS_LOG_LEVEL"  # 所有模块的默认日志级别
+# 按模块设置日志级别：前缀 + 模块名（大写，非字母数字替换为下划线），如 WORD_TOOLS_LOG_LEVEL_WORD_COMMENT
+LOG_LEVEL_ENV_PREFIX = "WORD_TOOLS_LOG_LEVEL_"
+DEFAULT_LOG_LEVEL = logging.INFO
+
+_UNSAFE_NAME = re.compile(r"[^0-9A-Za-z]+")
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """
+    只把日志记录放入队列的处理器
+
+    标准QueueHandler在放入队列前就格式化消息（为了跨进程传递），这里的队列只在进程内使用，
+    消息格式化和输出都留给后台监听线程，记录日志的代码只承担创建LogRecord的开销
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+_queue_handler = _DeferredQueueHandler(_queue)
+_listener: Optional[QueueListener] = None
+_listener_lock = threading.Lock()
+# 设置后新建的日志记录器不再添加处理器，日志通过传播交给根记录器上的该处理器（见route_logs_to）
+_direct_handler: Optional[logging.Handler] = None
+
+
+def _ensure_listener() -> None:
+    """第一次创建日志记录器时启动后台监听线程，进程退出时输出队列中剩余的日志"""
+    global _listener
+    if _listener is not None:
+        return
+    with _listener_lock:
+        if _listener is None:
+            # 级别由各日志记录器控制，插件处理器自身的INFO级别不再起作用
+            _listener = QueueListener(_queue, plugin_logger_handler, respect_handler_level=False)
+            _listener.start()
+            atexit.register(_listener.stop)
+
+
+def _parse_level(value: Optional[str]) -> Optional[int]:
+    """解析日志级别（名称或数字），无效时返回None"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return int(value)
+    level = logging.getLevelName(value.upper())
+    return level if isinstance(level, int) else None
+
+
+def _level_for(name: str) -> int:
+    """按模块名查找日志级别：模块级环境变量优先，其次是全局环境变量"""
+    module = _UNSAFE_NAME.sub("_", name.rsplit(".", 1)[-1]).strip("_").upper()
+    for env in (LOG_LEVEL_ENV_PREFIX + module, LOG_LEVEL_ENV):
+        level = _parse_level(os.environ.get(env))
+        if level is not None:
+            return level
+    return DEFAULT_LOG_LEVEL
+
 
 def get_logger(name: str) -> logging.Logger:
     """
     获取配置好的日志记录器
 
+    日志先放入进程内队列，由后台线程格式化并输出，记录日志不会阻塞在I/O上。
+    级别默认INFO，可通过WORD_TOOLS_LOG_LEVEL和WORD_TOOLS_LOG_LEVEL_<模块名>配置。
+    对同一名称重复调用不会重复添加处理器
+
     Args:
         name: 日志记录器名称，通常使用 __name__
 
@@ -14,6 +87,68 @@ def get_logger(name: str) -> logging.Logger:
         logging.Logger: 配置好的日志记录器
     """
     logger = logging.getLogger(name)
-    logger.setLevel(logging.INFO)
-    logger.addHandler(plugin_logger_handler)
+    logger.setLevel(_level_for(name))
+    if _direct_handler is not None:
+        return logger
+    if _queue_handler not in logger.handlers:
+        _ensure_listener()
+        logger.addHandler(_queue_handler)
     return logger
+
+
+def route_logs_to(handler: logging.Handler) -> None:
+    """
+    把当前进程的所有日志改为交给指定处理器（用于工作进程）
+
+    fork出的子进程中没有后台监听线程，放入队列的日志不会被输出，
+    因此移除所有已有的处理器，之后新建的日志记录器也不再添加处理器，日志统一传播到根记录器
+
+    Args:
+        handler: 接收日志的处理器
+    """
+    global _direct_handler
+    _direct_handler = handler
+    loggers = [logging.getLogger()] + [
+        item for item in logging.Logger.manager.loggerDict.values()
+        if isinstance(item, logging.Logger)
+    ]
+    for item in loggers:
+        for existing in list(item.handlers):
+            item.removeHandler(existing)
+    logging.getLogger().addHandler(handler)
+
+
+class EventSummary:
+    """
+    热点循环中逐次事件的汇总日志
+
+    循环内只累加计数并保留前几个样例，循环结束后输出一行汇总，
+    代替每次事件一行（甚至多行）的日志
+
+    用法:
+        summary = EventSummary("模糊匹配")
+        for ...:
+            summary.add("命中", sample="...")
+        summary.log(logger)
+    """
+
+    def __init__(self, title: str, max_samples: int = 3):
+        self.title = title
+        self.max_samples = max_samples
+        self.counts: Dict[str, int] = {}
+        self.samples: List[str] = []
+
+    def add(self, event: str, sample: Optional[str] = None) -> None:
+        self.counts[event] = self.counts.get(event, 0) + 1
+        if sample is not None and len(self.samples) < self.max_samples:
+            self.samples.append(sample)
+
+    def log(self, logger: logging.Logger, level: int = logging.INFO) -> None:
+        """输出汇总（没有事件或级别未开启时不输出）"""
+        if not self.counts or not logger.isEnabledFor(level):
+            return
+        counts = "，".join(f"{event} {n} 次" for event, n in self.counts.items())
+        if self.samples:
+            logger.log(level, "%s: %s；样例: %s", self.title, counts, "；".join(self.samples))
+        else:
+            logger.log(level, "%s: %s", self.title, counts)
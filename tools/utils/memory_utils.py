@@ -0,0 +1,82 @@
+import tracemalloc
+from typing import Optional
+
+_STATUS_PATH = "/proc/self/status"
+_CLEAR_REFS_PATH = "/proc/self/clear_refs"
+
+
+def _read_status_kb(field: str) -> Optional[int]:
+    """从/proc/self/status读取内存字段（KB），不支持时返回None"""
+    try:
+        with open(_STATUS_PATH) as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def current_rss() -> Optional[int]:
+    """当前进程的常驻内存（字节），不支持时返回None"""
+    kb = _read_status_kb("VmRSS")
+    return kb * 1024 if kb is not None else None
+
+
+def _reset_peak_rss() -> bool:
+    """把进程的峰值常驻内存（VmHWM）重置为当前值（Linux 4.0+），成功返回True"""
+    try:
+        with open(_CLEAR_REFS_PATH, "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+class PeakMemory:
+    """
+    测量一段代码执行期间的峰值内存增量（字节）
+
+    优先使用进程峰值常驻内存（能统计到lxml等C扩展的分配，几乎没有开销）；
+    系统不支持重置峰值时，退回到tracemalloc（只统计Python对象的分配，且会明显拖慢执行，
+    因此只在调用方明确允许时使用）
+
+    两种方式测量的都是整个进程的峰值，只能在同一时间只执行一个任务的进程（工作进程）中使用；
+    有多个协程并发处理请求的插件进程中，各请求会互相重置和读取对方的峰值
+
+    用法:
+        with PeakMemory(allow_tracemalloc=sampled) as meter:
+            ...
+        meter.peak  # 测量不可用时为None
+    """
+
+    def __init__(self, allow_tracemalloc: bool = False):
+        self.allow_tracemalloc = allow_tracemalloc
+        self.peak: Optional[int] = None
+        self.method: Optional[str] = None
+        self._baseline = 0
+        self._started_tracing = False
+
+    def __enter__(self) -> "PeakMemory":
+        rss = current_rss()
+        if rss is not None and _reset_peak_rss():
+            self.method = "rss"
+            self._baseline = rss
+        elif self.allow_tracemalloc:
+            self.method = "tracemalloc"
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+            tracemalloc.reset_peak()
+            self._baseline = tracemalloc.get_traced_memory()[0]
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if self.method == "rss":
+            hwm = _read_status_kb("VmHWM")
+            if hwm is not None:
+                self.peak = max(hwm * 1024 - self._baseline, 0)
+        elif self.method == "tracemalloc":
+            self.peak = max(tracemalloc.get_traced_memory()[1] - self._baseline, 0)
+            if self._started_tracing:
+                tracemalloc.stop()
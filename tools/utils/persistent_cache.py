@@ -0,0 +1,449 @@
+"""
+基于插件持久化存储（session.storage）的跨进程结果缓存
+
+插件的所有进程（包括重启之后、多个副本之间）共享同一份插件存储，manifest.yaml中申请了1 MB。
+这里把体积小、计算量大的结果（分块JSON、批注匹配计划、较小的PDF转换结果）压缩后按内容哈希存入，
+同一份文档再次处理时直接复用。
+
+- 键: 命名空间 + 调用方给出的键（文档内容哈希和影响结果的参数），存储中的键为其SHA-256摘要
+- 值: zlib压缩后的字节，超过单条上限的结果不缓存
+- 淘汰: 存储没有列举接口，另存一个索引条目记录每个条目的大小和最近使用时间，
+  写入新条目时按最近最少使用淘汰，使总大小不超过配额
+- 降级: 存储不可用（本地调试、守护进程不支持、调用出错）时所有操作变为空操作，
+  一段时间后再重试，不影响工具本身的处理
+
+存储只能通过请求的会话访问，因此缓存只在插件进程的_invoke中使用，工作进程不访问存储。
+每个进程在内存中为每个应用保留一份索引（插件存储按租户隔离），锁只保护内存中索引的合并和修改，存储调用都在锁外进行，
+并发请求的存储读写互不阻塞；写入条目前先重新读取存储中的索引并与内存中的合并，
+索引的写回由一个请求合并完成，保证最后写入的总是最新的索引。
+多个副本同时更新索引时可能丢失部分更新，最坏情况只是少量条目不能被淘汰或命中，不影响结果正确性。
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+from typing import Any, Dict, Optional, Sequence
+
+from tools.utils.instrumentation import count, stage
+from tools.utils.logger_utils import get_logger
+
+logger = get_logger(__name__)
+
+# 缓存容量配置（环境变量），设为0表示关闭缓存
+CACHE_MAX_KB_ENV = "WORD_TOOLS_STORAGE_CACHE_KB"  # 缓存条目的总大小上限
+ENTRY_MAX_KB_ENV = "WORD_TOOLS_STORAGE_CACHE_ENTRY_KB"  # 单个条目（压缩后）的大小上限
+# manifest.yaml申请的存储为1024 KB，预留一部分给索引
+DEFAULT_CACHE_MAX_KB = 960
+DEFAULT_ENTRY_MAX_KB = 256
+
+# 索引条目的键，以及缓存条目键的前缀
+INDEX_KEY = "word_tools_cache_index"
+KEY_PREFIX = "wtc"
+INDEX_VERSION = 1
+
+# 存储调用失败后，在该时间（秒）内不再访问存储
+RETRY_INTERVAL = 300
+# 命中时最近使用时间的更新粒度（秒），避免每次命中都回写索引
+TOUCH_INTERVAL = 60
+# 只读取缓存时，内存中的索引超过该时间（秒）才从存储重新读取
+INDEX_REFRESH_INTERVAL = 60
+# 本进程删除的条目在该时间（秒）内记录下来，合并索引时不会被其他副本的旧索引恢复
+REMOVED_TTL = 600
+
+
+def _env_int(name: str, default: int) -> int:
+    """读取整数环境变量，无效时使用默认值"""
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+class InMemoryStorage:
+    """
+    插件存储的本地替身，接口与session.storage相同（set/get/delete/exist），
+    用于在没有Dify守护进程的环境（单元测试、基准测试）中使用持久化缓存
+
+    Args:
+        quota: 存储总大小上限（字节），超出时set抛出异常，与守护进程的配额检查一致
+    """
+
+    def __init__(self, quota: Optional[int] = None):
+        self.quota = quota
+        self._data: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def set(self, key: str, val: bytes) -> None:
+        with self._lock:
+            if self.quota is not None:
+                used = self.used_bytes - len(self._data.get(key, b"")) + len(val)
+                if used > self.quota:
+                    raise RuntimeError(f"storage quota exceeded: {used} > {self.quota}")
+            self._data[key] = bytes(val)
+
+    def get(self, key: str) -> bytes:
+        with self._lock:
+            if key not in self._data:
+                raise KeyError(key)
+            return self._data[key]
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def exist(self, key: str) -> bool:
+        with self._lock:
+            return key in self._data
+
+    @property
+    def used_bytes(self) -> int:
+        return sum(len(value) for value in self._data.values())
+
+
+class _IndexState:
+    """一份插件存储在本进程内存中的索引"""
+
+    def __init__(self):
+        # {存储键: [压缩后大小, 最近使用时间]}，尚未从存储读取时为None
+        self.entries: Optional[Dict[str, list]] = None
+        self.loaded = 0.0
+        # 本进程删除的条目 {存储键: 删除时间}
+        self.removed: Dict[str, float] = {}
+        # 是否有请求正在写回索引，以及写回期间索引是否又被修改
+        self.saving = False
+        self.dirty = False
+
+
+class _SharedState:
+    """进程内所有缓存实例共享的状态：内存中的索引及其锁、存储可用性和统计"""
+
+    def __init__(self):
+        # 只在读取和修改内存中的索引时持有，不跨越存储调用
+        self.lock = threading.Lock()
+        # 插件存储按租户隔离，每个应用（属于唯一的租户）一份索引
+        self.indexes: Dict[str, _IndexState] = {}
+        self.unavailable_until = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.errors = 0
+
+
+_state = _SharedState()
+
+
+class StorageUnavailableError(RuntimeError):
+    """存储调用失败（已记录日志并进入重试等待）"""
+
+
+class PersistentCache:
+    """
+    插件存储上的结果缓存
+
+    用法:
+        cache = get_persistent_cache(self.session)
+        key = (document_key(blob), docx_type, chunk_num)
+        result = cache.get_json("chunk", key)
+        if result is None:
+            result = compute()
+            cache.set_json("chunk", key, result)
+    """
+
+    def __init__(self, storage: Any, max_bytes: int, max_entry_bytes: int, scope: Optional[str] = None):
+        self.storage = storage
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = min(max_entry_bytes, max_bytes)
+        # 同一scope的缓存实例使用同一份存储，共用内存中的索引；没有scope时索引只属于本实例，
+        # 每个请求都从存储重新读取
+        if scope is None:
+            self._index = _IndexState()
+        else:
+            with _state.lock:
+                self._index = _state.indexes.setdefault(scope, _IndexState())
+
+    @property
+    def enabled(self) -> bool:
+        return (
+            self.storage is not None
+            and self.max_bytes > 0
+            and time.monotonic() >= _state.unavailable_until
+        )
+
+    @staticmethod
+    def storage_key(namespace: str, key: Sequence[Any]) -> str:
+        """命名空间和键在存储中的键名（参数序列化后取摘要，长度固定且不包含文档内容）"""
+        raw = json.dumps([namespace, list(key)], ensure_ascii=False, sort_keys=True)
+        return f"{KEY_PREFIX}_{namespace}_{hashlib.sha256(raw.encode('utf-8')).hexdigest()[:40]}"
+
+    def get(self, namespace: str, key: Sequence[Any]) -> Optional[bytes]:
+        """
+        读取缓存条目
+
+        Args:
+            namespace: 结果类型（chunk、match_plan等）
+            key: 决定结果的全部输入，通常是文档内容哈希和相关参数
+
+        Returns:
+            Optional[bytes]: 解压后的内容，未命中或存储不可用时返回None
+        """
+        if not self.enabled:
+            return None
+        name = self.storage_key(namespace, key)
+        try:
+            with stage("storage_cache"):
+                if time.monotonic() - self._index.loaded >= INDEX_REFRESH_INTERVAL:
+                    self._refresh_index()
+                data = None
+                if self._indexed(name):
+                    data = self._get_entry(name)
+                    if data is None:
+                        # 条目已被其他副本淘汰
+                        if self._update_index(lambda index: index.pop(name, None) is not None):
+                            self._flush_index()
+                if data is None:
+                    _state.misses += 1
+                    count("storage_cache_misses")
+                    return None
+                value = zlib.decompress(data)
+                if self._update_index(lambda index: self._touch(index, name)):
+                    self._flush_index()
+        except StorageUnavailableError:
+            return None
+        except zlib.error:
+            logger.warning(f"持久化缓存条目 {name} 已损坏，将重新计算")
+            self.delete(namespace, key)
+            return None
+        _state.hits += 1
+        count("storage_cache_hits")
+        return value
+
+    def set(self, namespace: str, key: Sequence[Any], value: bytes) -> bool:
+        """
+        写入缓存条目，必要时淘汰最久未使用的条目
+
+        Args:
+            namespace: 结果类型
+            key: 决定结果的全部输入
+            value: 结果内容（写入前压缩）
+
+        Returns:
+            bool: 是否写入成功（超过单条上限、存储不可用时返回False）
+        """
+        if not self.enabled:
+            return False
+        name = self.storage_key(namespace, key)
+        data = zlib.compress(value, 6)
+        if len(data) > self.max_entry_bytes:
+            logger.debug(
+                "结果压缩后 %d 字节，超过单条上限 %d 字节，不写入持久化缓存",
+                len(data),
+                self.max_entry_bytes,
+            )
+            return False
+        try:
+            with stage("storage_cache"):
+                # 写入前读取其他副本对索引的更新，淘汰时才能按存储中的实际占用计算
+                self._refresh_index()
+                victims = self._update_index(
+                    lambda index: self._evict(index, name, self.max_bytes - len(data))
+                )
+                for victim in victims:
+                    self._call("delete", victim)
+                self._call("set", name, data)
+                self._update_index(lambda index: index.update({name: [len(data), time.time()]}) or True)
+                self._flush_index()
+        except StorageUnavailableError:
+            return False
+        _state.stores += 1
+        count("storage_cache_stores")
+        return True
+
+    def delete(self, namespace: str, key: Sequence[Any]) -> None:
+        """删除缓存条目"""
+        if not self.enabled:
+            return
+        name = self.storage_key(namespace, key)
+        try:
+            self._call("delete", name)
+            if self._update_index(lambda index: self._remove(index, name) is not None):
+                self._flush_index()
+        except StorageUnavailableError:
+            pass
+
+    def get_json(self, namespace: str, key: Sequence[Any]) -> Any:
+        """读取JSON结果，未命中时返回None"""
+        value = self.get(namespace, key)
+        return None if value is None else json.loads(value.decode("utf-8"))
+
+    def set_json(self, namespace: str, key: Sequence[Any], value: Any) -> bool:
+        """以紧凑JSON写入结果"""
+        data = json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        return self.set(namespace, key, data)
+
+    def _evict(self, index: Dict[str, list], name: str, budget: int) -> list:
+        """
+        从索引中去掉name和需要淘汰的条目（按最近使用时间从旧到新，直到条目总大小不超过budget），
+        返回需要从存储中删除的条目（在持有锁时调用，不访问存储）
+        """
+        index.pop(name, None)
+        total = sum(entry[0] for entry in index.values())
+        victims = []
+        for victim in sorted(index, key=lambda item: index[item][1]):
+            if total <= budget:
+                break
+            total -= self._remove(index, victim)[0]
+            victims.append(victim)
+            _state.evictions += 1
+            count("storage_cache_evictions")
+        return victims
+
+    def _remove(self, index: Dict[str, list], name: str) -> Optional[list]:
+        """从索引中去掉条目并记录删除时间，合并索引时不会再被恢复（在持有锁时调用）"""
+        self._index.removed[name] = time.time()
+        return index.pop(name, None)
+
+    @staticmethod
+    def _touch(index: Dict[str, list], name: str) -> bool:
+        """更新命中条目的最近使用时间，返回是否修改了索引（在持有锁时调用）"""
+        entry = index.get(name)
+        now = time.time()
+        if entry is None or now - entry[1] < TOUCH_INTERVAL:
+            return False
+        entry[1] = now
+        return True
+
+    def _indexed(self, name: str) -> bool:
+        """条目是否在内存中的索引里；不在时不必访问存储即可判定未命中"""
+        with _state.lock:
+            return self._index.entries is not None and name in self._index.entries
+
+    def _update_index(self, change):
+        """
+        在锁内对内存中的索引执行change（不访问存储），返回change的结果；
+        结果为真时视为索引已修改，下次写回时写入存储
+        """
+        state = self._index
+        with _state.lock:
+            if state.entries is None:
+                state.entries = {}
+            result = change(state.entries)
+            if result:
+                state.dirty = True
+            return result
+
+    def _refresh_index(self) -> None:
+        """
+        从存储读取索引，与内存中的索引合并：同一条目取最近使用时间较晚的，
+        本进程删除之后没有再使用过的条目不会被恢复
+        """
+        loaded = self._load_index()
+        now = time.time()
+        state = self._index
+        with _state.lock:
+            merged = loaded
+            for name, entry in (state.entries or {}).items():
+                current = merged.get(name)
+                if current is None or entry[1] > current[1]:
+                    merged[name] = entry
+            for name, removed_at in list(state.removed.items()):
+                if now - removed_at >= REMOVED_TTL:
+                    del state.removed[name]
+                elif name in merged and merged[name][1] <= removed_at:
+                    del merged[name]
+            state.entries = merged
+            state.loaded = time.monotonic()
+
+    def _flush_index(self) -> None:
+        """
+        把内存中的索引写回存储：同一时间只有一个请求在写，写入期间其他请求的修改
+        由它在写完后再写一次，因此最后写入存储的总是最新的索引
+        """
+        state = self._index
+        with _state.lock:
+            if state.saving:
+                return
+            state.saving = True
+        try:
+            while True:
+                with _state.lock:
+                    if not state.dirty:
+                        state.saving = False
+                        return
+                    state.dirty = False
+                    data = json.dumps(
+                        {"version": INDEX_VERSION, "entries": state.entries or {}}, separators=(",", ":")
+                    )
+                self._call("set", INDEX_KEY, zlib.compress(data.encode("utf-8"), 6))
+        except BaseException:
+            with _state.lock:
+                state.saving = False
+            raise
+
+    def _get_entry(self, name: str) -> Optional[bytes]:
+        """读取条目内容；条目不存在时返回None（存储对不存在的键抛出异常，与调用失败区分开）"""
+        try:
+            return self.storage.get(name)
+        except Exception:
+            if not self._call("exist", name):
+                return None
+            return self._call("get", name)
+
+    def _load_index(self) -> Dict[str, list]:
+        """读取索引：{存储键: [压缩后大小, 最近使用时间]}，不存在或格式不对时视为空"""
+        if not self._call("exist", INDEX_KEY):
+            return {}
+        try:
+            data = json.loads(zlib.decompress(self._call("get", INDEX_KEY)).decode("utf-8"))
+        except (zlib.error, ValueError):
+            logger.warning("持久化缓存索引已损坏，重新建立")
+            return {}
+        if not isinstance(data, dict) or data.get("version") != INDEX_VERSION:
+            return {}
+        return data.get("entries", {})
+
+    def _call(self, operation: str, *args):
+        """调用存储接口；失败时记录日志，一段时间内不再访问存储"""
+        try:
+            return getattr(self.storage, operation)(*args)
+        except Exception as e:
+            _state.errors += 1
+            _state.unavailable_until = time.monotonic() + RETRY_INTERVAL
+            count("storage_cache_errors")
+            logger.warning(
+                f"插件存储调用失败（{operation}）: {e}，{RETRY_INTERVAL} 秒内不再使用持久化缓存"
+            )
+            raise StorageUnavailableError(str(e)) from e
+
+
+def get_persistent_cache(session: Any) -> PersistentCache:
+    """
+    返回绑定到请求会话存储的持久化缓存（容量由环境变量配置）
+
+    Args:
+        session: 工具的会话对象（self.session），没有storage属性时缓存不可用
+
+    Returns:
+        PersistentCache: 缓存对象，不可用时所有操作为空操作
+    """
+    return PersistentCache(
+        getattr(session, "storage", None),
+        max_bytes=_env_int(CACHE_MAX_KB_ENV, DEFAULT_CACHE_MAX_KB) * 1024,
+        max_entry_bytes=_env_int(ENTRY_MAX_KB_ENV, DEFAULT_ENTRY_MAX_KB) * 1024,
+        scope=getattr(session, "app_id", None),
+    )
+
+
+def persistent_cache_stats() -> Dict[str, Any]:
+    """返回本进程的命中、未命中、写入、淘汰和出错次数"""
+    return {
+        "hits": _state.hits,
+        "misses": _state.misses,
+        "stores": _state.stores,
+        "evictions": _state.evictions,
+        "errors": _state.errors,
+        "available": time.monotonic() >= _state.unavailable_until,
+    }
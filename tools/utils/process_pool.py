@@ -0,0 +1,512 @@
+import atexit
+import logging
+import multiprocessing
+import os
+import select
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, Generator, List, Optional, Tuple
+
+from tools.utils.instrumentation import (
+    Metrics,
+    collect_metrics,
+    current_metrics,
+    merge_metrics,
+    stage,
+)
+from tools.utils.logger_utils import get_logger, route_logs_to
+from tools.utils.memory_utils import PeakMemory
+from tools.utils.profiling import profile_task
+
+logger = get_logger(__name__)
+
+# 进程池配置（环境变量）
+POOL_SIZE_ENV = "WORD_TOOLS_WORKERS"  # 工作进程数，设为0时在当前进程内直接执行
+POOL_QUEUE_ENV = "WORD_TOOLS_WORKER_QUEUE"  # 等待空闲工作进程的任务数上限
+POOL_TIMEOUT_ENV = "WORD_TOOLS_WORKER_TIMEOUT"  # 单个任务的超时时间（秒），0表示不限制
+POOL_MAX_TASKS_ENV = "WORD_TOOLS_WORKER_MAX_TASKS"  # 工作进程处理多少个任务后重启，释放累积的内存
+DEFAULT_POOL_SIZE = 2
+DEFAULT_POOL_QUEUE = 8
+DEFAULT_POOL_TIMEOUT = 110.0
+DEFAULT_POOL_MAX_TASKS = 50
+
+# 系统不支持按任务测量峰值常驻内存时，每隔多少个任务用tracemalloc采样一次（tracemalloc开销较大）
+TRACEMALLOC_SAMPLE_INTERVAL = 10
+
+# 任务名 -> 任务函数。工具模块在加载时注册，工作进程通过fork继承这张表，
+# 因此提交任务时只需要传递任务名和可pickle的参数（字节内容和普通参数）
+_TASKS: Dict[str, Callable[..., Any]] = {}
+
+try:
+    from gevent.monkey import is_anything_patched
+    from gevent.socket import wait_read as _gevent_wait_read
+except ImportError:  # pragma: no cover - 插件运行时总是安装了gevent
+    is_anything_patched = None
+    _gevent_wait_read = None
+
+
+class PoolFullError(RuntimeError):
+    """等待队列已满，任务被拒绝"""
+
+
+class WorkerTaskError(RuntimeError):
+    """任务在工作进程中执行失败，或工作进程异常退出"""
+
+
+def register_task(name: str, func: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    注册可以提交到进程池的任务函数
+
+    任务函数的参数和返回值都必须可以pickle（字节、字符串、数字、列表、字典等）。
+    通过stream_measured提交时任务函数应返回迭代器，工作进程每产生一项就发回主进程
+
+    Args:
+        name: 任务名，提交任务时使用
+        func: 任务函数
+
+    Returns:
+        Callable: 原函数
+    """
+    _TASKS[name] = func
+    return func
+
+
+class _LogCollector(logging.Handler):
+    """工作进程中收集日志记录，随任务结果一起返回给主进程输出"""
+
+    def __init__(self):
+        super().__init__()
+        self.records: List[tuple] = []
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            message = record.getMessage()
+            if record.exc_info:
+                message = f"{message}\n{logging.Formatter().formatException(record.exc_info)}"
+            self.records.append((record.name, record.levelno, message))
+        except Exception:
+            self.handleError(record)
+
+
+def _worker_main(conn) -> None:
+    """
+    工作进程主循环：接收 (任务名, 参数, 请求ID, 是否流式)，返回 (状态, 结果, 日志记录, 峰值内存, 指标)；
+    流式任务在此之前每产生一项先发送一条 ("partial", 该项)
+    """
+    # 插件通过stdout与Dify守护进程通信，工作进程的任何输出都改写到stderr
+    os.dup2(2, 1)
+    # 日志不能由工作进程直接写出，统一收集后交给主进程
+    collector = _LogCollector()
+    route_logs_to(collector)
+
+    task_count = 0
+    while True:
+        try:
+            task = conn.recv()
+        except (EOFError, OSError, KeyboardInterrupt):
+            break
+        if task is None:
+            break
+
+        name, args, kwargs, request_id, stream = task
+        collector.records = []
+        task_count += 1
+        emit = (lambda item: conn.send(("partial", item))) if stream else None
+        with collect_metrics(Metrics(request_id)) as metrics:
+            status, payload, peak = _execute(name, args, kwargs, task_count, emit)
+
+        try:
+            conn.send((status, payload, collector.records, peak, metrics.as_dict()))
+        except Exception as e:
+            conn.send(
+                ("error", f"任务结果无法返回主进程: {e}", collector.records, peak, metrics.as_dict())
+            )
+
+    # 直接结束进程：multiprocessing正常退出时会调用threading._shutdown，
+    # 在从gevent进程fork出的子进程中这会触发gevent的AssertionError
+    conn.close()
+    sys.stdout.flush()
+    sys.stderr.flush()
+    os._exit(0)
+
+
+def _execute(name: str, args, kwargs, task_count: int, emit: Optional[Callable] = None) -> tuple:
+    """
+    执行任务并测量峰值内存增量，返回 (状态, 结果或错误信息, 峰值内存字节数或None)；
+    提供emit时任务为流式任务，逐项交给emit，结果为None
+    """
+    meter = PeakMemory(allow_tracemalloc=task_count % TRACEMALLOC_SAMPLE_INTERVAL == 1)
+    try:
+        with meter:
+            func = _TASKS.get(name)
+            if func is None:
+                raise LookupError(f"未注册的任务: {name}")
+            with profile_task(name):
+                result = func(*args, **kwargs)
+                if emit is not None:
+                    for item in result:
+                        emit(item)
+                    result = None
+        return "ok", result, meter.peak
+    except Exception as e:
+        # 堆栈只写入日志，返回给调用方的错误信息与在当前进程内执行时一致
+        logger.exception(f"任务 {name} 执行失败")
+        return "error", str(e), meter.peak
+
+
+def _wait_readable(conn, timeout: Optional[float]) -> bool:
+    """等待工作进程返回结果；在gevent环境下让出控制权，不阻塞其他请求"""
+    if _gevent_wait_read is not None and is_anything_patched():
+        try:
+            _gevent_wait_read(conn.fileno(), timeout=timeout, timeout_exc=TimeoutError())
+        except TimeoutError:
+            return False
+        return True
+    return conn.poll(timeout)
+
+
+def _wait_exit(process, timeout: float) -> bool:
+    """
+    等待进程退出并回收，返回是否已退出
+
+    不使用process.join：monkey patch之后join在事件循环中等待，插件退出（atexit）时
+    gevent会报告AssertionError。这里等待进程的sentinel可读（进程退出时关闭），
+    再通过exitcode以非阻塞的waitpid回收
+    """
+    deadline = time.monotonic() + timeout
+    while process.exitcode is None:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        if _gevent_wait_read is not None and is_anything_patched():
+            try:
+                _gevent_wait_read(process.sentinel, timeout=remaining, timeout_exc=TimeoutError())
+            except TimeoutError:
+                continue
+        else:
+            select.select([process.sentinel], [], [], remaining)
+        if process.exitcode is None:
+            # sentinel关闭之后进程可能还没有变成可以回收的状态
+            time.sleep(0.001)
+    return True
+
+
+class _Worker:
+    """一个常驻的工作进程及与之通信的管道"""
+
+    def __init__(self, context):
+        self.conn, child_conn = context.Pipe()
+        # gevent会把socketpair设为非阻塞，这里恢复为阻塞模式：
+        # 工作进程阻塞读取任务，主进程在读取结果前先通过_wait_readable让出控制权
+        for conn in (self.conn, child_conn):
+            os.set_blocking(conn.fileno(), True)
+        self.process = context.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.tasks = 0
+        self.affinity = None
+
+    def close(self) -> None:
+        try:
+            self.conn.send(None)
+        except Exception:
+            pass
+        _wait_exit(self.process, timeout=1)
+        self.kill()
+
+    def kill(self) -> None:
+        if self.process.exitcode is None:
+            self.process.kill()
+            _wait_exit(self.process, timeout=1)
+        self.conn.close()
+
+
+class ProcessPool:
+    """
+    共享的工作进程池，把CPU密集的文档处理从服务请求的进程中移出，
+    避免一个大文档（受GIL限制）拖慢同时进行的其他请求
+
+    - 工作进程在start()时预先fork创建（退出或重启的进程按需补充），数量不超过size；
+      size为0时在当前进程内直接执行
+    - 所有工作进程都在忙时任务排队等待，排队数量超过max_queue时直接拒绝（背压）
+    - 同一文档的任务优先交给上次处理它的工作进程，以命中该进程内的文档缓存
+    - 工作进程处理max_tasks个任务后重启，超时的工作进程会被终止
+    - 流式任务（stream_measured）每产生一项结果就发回主进程，调用方不必等待整个任务完成
+    """
+
+    def __init__(
+        self,
+        size: int,
+        max_queue: int = DEFAULT_POOL_QUEUE,
+        timeout: Optional[float] = DEFAULT_POOL_TIMEOUT,
+        max_tasks: int = DEFAULT_POOL_MAX_TASKS,
+    ):
+        self.size = max(size, 0)
+        self.max_queue = max(max_queue, 0)
+        self.timeout = timeout if timeout and timeout > 0 else None
+        self.max_tasks = max(max_tasks, 1)
+        self._context = multiprocessing.get_context("fork")
+        self._slots = threading.Semaphore(self.size) if self.size else None
+        self._idle: List[_Worker] = []
+        self._lock = threading.Lock()
+        self._closed = False
+
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.running = 0
+        self.queued = 0
+        self.max_queued = 0
+        self.workers_started = 0
+        self._wait_time = 0.0
+
+    def start(self) -> None:
+        """
+        预先创建全部工作进程
+
+        在开始接收请求之前调用：此时工具模块已加载、预热已完成，工作进程可以直接继承这些状态，
+        并且fork发生在还没有请求协程的时候（gevent在有其他协程时fork会输出警告）
+        """
+        with self._lock:
+            missing = self.size - len(self._idle) - self.running
+            self.workers_started += max(missing, 0)
+        workers = [_Worker(self._context) for _ in range(missing)]
+        with self._lock:
+            self._idle.extend(workers)
+        if workers:
+            logger.info(f"已启动 {len(workers)} 个工作进程")
+
+    def run(self, name: str, *args, affinity: Optional[str] = None, **kwargs) -> Any:
+        """执行已注册的任务并返回结果，参数和异常见run_measured"""
+        return self.run_measured(name, *args, affinity=affinity, **kwargs)[0]
+
+    def run_measured(
+        self, name: str, *args, affinity: Optional[str] = None, **kwargs
+    ) -> Tuple[Any, Optional[int]]:
+        """
+        执行已注册的任务，同时测量任务执行期间的峰值内存增量
+
+        Args:
+            name: 任务名（见register_task）
+            *args, **kwargs: 任务参数，必须可以pickle
+            affinity: 可选的亲和键（如文档内容哈希），相同键的任务优先交给同一个工作进程
+
+        Returns:
+            tuple: (任务函数的返回值, 峰值内存增量（字节），无法测量或在当前进程内执行时为None)
+
+        Raises:
+            PoolFullError: 等待队列已满
+            WorkerTaskError: 任务执行失败、超时或工作进程异常退出
+        """
+        runner = self._run(name, args, kwargs, affinity, stream=False)
+        try:
+            while True:
+                next(runner)
+        except StopIteration as stop:
+            return stop.value
+
+    def stream_measured(
+        self, name: str, *args, affinity: Optional[str] = None, **kwargs
+    ) -> Generator[Any, None, Optional[int]]:
+        """
+        执行返回迭代器的任务，任务每产生一项就在主进程中产生该项，不必等待整个任务完成
+
+        用法:
+            peak = yield from pool.stream_measured(name, blob, affinity=key)
+
+        参数和异常见run_measured。任务执行期间占用工作进程；调用方提前停止迭代时，
+        工作进程会被终止（无法确定管道中还有多少未读取的结果）
+
+        Returns:
+            Optional[int]: 迭代结束后的返回值为峰值内存增量（字节），无法测量或在当前进程内执行时为None
+        """
+        _, peak = yield from self._run(name, args, kwargs, affinity, stream=True)
+        return peak
+
+    def _run(
+        self, name: str, args, kwargs, affinity: Optional[str], stream: bool
+    ) -> Generator[Any, None, Tuple[Any, Optional[int]]]:
+        """run_measured和stream_measured的公共部分：排队、取工作进程并执行，流式任务逐项产生结果"""
+        if name not in _TASKS:
+            raise LookupError(f"未注册的任务: {name}")
+        if not self.size:
+            # 在当前进程内执行时不测量峰值内存：VmHWM和tracemalloc都是整个进程共享的，
+            # 同时处理的其他请求（协程）会互相重置和读取对方的峰值
+            with self._lock:
+                self.submitted += 1
+            try:
+                with profile_task(name):
+                    result = _TASKS[name](*args, **kwargs)
+                    if stream:
+                        yield from result
+                        result = None
+            except Exception:
+                with self._lock:
+                    self.failed += 1
+                raise
+            with self._lock:
+                self.completed += 1
+            return result, None
+
+        with self._lock:
+            if self.running >= self.size and self.queued >= self.max_queue:
+                self.rejected += 1
+                raise PoolFullError(
+                    f"当前处理任务过多（{self.running} 个处理中，{self.queued} 个排队），请稍后重试"
+                )
+            self.submitted += 1
+            self.queued += 1
+            self.max_queued = max(self.max_queued, self.queued)
+            must_wait = self.running >= self.size
+            depth = self.queued
+        if must_wait:
+            logger.info(f"工作进程全部繁忙，任务 {name} 排队等待（队列深度: {depth}）")
+
+        wait_start = time.perf_counter()
+        with stage("queue_wait"):
+            self._slots.acquire()
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+            self._wait_time += time.perf_counter() - wait_start
+
+        try:
+            worker = self._checkout(affinity)
+            return (yield from self._call(worker, name, args, kwargs, affinity, stream))
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+        finally:
+            with self._lock:
+                self.running -= 1
+            self._slots.release()
+
+    def _checkout(self, affinity: Optional[str]) -> _Worker:
+        """取一个空闲工作进程（优先亲和键相同的），没有时创建新进程"""
+        with self._lock:
+            for i in range(len(self._idle) - 1, -1, -1):
+                if affinity is not None and self._idle[i].affinity == affinity:
+                    return self._idle.pop(i)
+            if self._idle:
+                return self._idle.pop()
+            self.workers_started += 1
+        return _Worker(self._context)
+
+    def _call(
+        self, worker: _Worker, name: str, args, kwargs, affinity: Optional[str], stream: bool
+    ) -> Generator[Any, None, Tuple[Any, Optional[int]]]:
+        # 超时从提交任务开始计算，流式任务产生的结果不会延长时限
+        deadline = time.monotonic() + self.timeout if self.timeout else None
+        try:
+            current = current_metrics()
+            request_id = current.request_id if current is not None else None
+            worker.conn.send((name, args, kwargs, request_id, stream))
+            while True:
+                remaining = max(deadline - time.monotonic(), 0) if deadline else None
+                finished = _wait_readable(worker.conn, remaining)
+                if not finished:
+                    break
+                message = worker.conn.recv()
+                if message[0] != "partial":
+                    status, payload, records, peak, metrics = message
+                    break
+                yield message[1]
+        except (EOFError, OSError) as e:
+            worker.kill()
+            raise WorkerTaskError(
+                f"工作进程异常退出（退出码: {worker.process.exitcode}）: {str(e) or '连接已断开'}"
+            ) from e
+        except BaseException:
+            # 参数无法pickle、请求被取消、调用方提前停止迭代等情况下无法确定管道状态，直接终止该工作进程
+            worker.kill()
+            raise
+        if not finished:
+            worker.kill()
+            raise WorkerTaskError(f"任务执行超过 {self.timeout:g} 秒，已终止")
+
+        # 输出工作进程中产生的日志，合并工作进程记录的指标
+        for logger_name, level, message in records:
+            logging.getLogger(logger_name).log(level, message)
+        merge_metrics(metrics)
+
+        worker.tasks += 1
+        worker.affinity = affinity
+        if worker.tasks >= self.max_tasks or self._closed:
+            worker.close()
+        else:
+            with self._lock:
+                self._idle.append(worker)
+
+        if status != "ok":
+            raise WorkerTaskError(payload)
+        with self._lock:
+            self.completed += 1
+        return payload, peak
+
+    def stats(self) -> Dict[str, Any]:
+        """返回队列深度、运行中任务数、累计提交/完成/失败/拒绝数和平均等待时间"""
+        with self._lock:
+            started = self.submitted - self.queued
+            return {
+                "size": self.size,
+                "running": self.running,
+                "queued": self.queued,
+                "max_queued": self.max_queued,
+                "max_queue": self.max_queue,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "idle_workers": len(self._idle),
+                "workers_started": self.workers_started,
+                "avg_wait_ms": round(self._wait_time * 1000 / started, 1) if started else 0.0,
+            }
+
+    def shutdown(self) -> None:
+        """关闭所有空闲工作进程，正在执行的任务完成后其进程也会关闭"""
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            worker.close()
+
+
+def _env_number(name: str, default, cast=int):
+    """读取数值环境变量，无效时使用默认值"""
+    try:
+        return cast(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+_pool: Optional[ProcessPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_process_pool() -> ProcessPool:
+    """返回进程内共享的工作进程池（规模由环境变量配置）"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPool(
+                    size=_env_number(POOL_SIZE_ENV, DEFAULT_POOL_SIZE),
+                    max_queue=_env_number(POOL_QUEUE_ENV, DEFAULT_POOL_QUEUE),
+                    timeout=_env_number(POOL_TIMEOUT_ENV, DEFAULT_POOL_TIMEOUT, float),
+                    max_tasks=_env_number(POOL_MAX_TASKS_ENV, DEFAULT_POOL_MAX_TASKS),
+                )
+                atexit.register(_pool.shutdown)
+    return _pool
+
+
+def start_process_pool() -> None:
+    """插件开始接收请求之前启动共享的工作进程池"""
+    get_process_pool().start()
+
+
+def run_task(name: str, *args, affinity: Optional[str] = None, **kwargs) -> Any:
+    """在共享进程池中执行已注册的任务，见ProcessPool.run"""
+    return get_process_pool().run(name, *args, affinity=affinity, **kwargs)
@@ -0,0 +1,169 @@
+import cProfile
+import io
+import os
+import pstats
+import re
+import signal
+import tempfile
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from typing import Iterator, Optional
+
+from tools.utils.instrumentation import current_metrics
+from tools.utils.logger_utils import get_logger
+
+logger = get_logger(__name__)
+
+# 性能剖析配置（环境变量），进程启动时读取一次
+PROFILE_ENV = "WORD_TOOLS_PROFILE"  # 1/all 剖析所有工具，或逗号分隔的工具名；不设置时关闭
+PROFILE_MODE_ENV = "WORD_TOOLS_PROFILE_MODE"  # cprofile（默认，精确调用统计）或 sample（定时采样调用栈）
+PROFILE_DIR_ENV = "WORD_TOOLS_PROFILE_DIR"  # 剖析结果目录
+PROFILE_TOP_ENV = "WORD_TOOLS_PROFILE_TOP"  # 文本摘要中列出的函数数
+DEFAULT_PROFILE_DIR = os.path.join(tempfile.gettempdir(), "word_tools_profiles")
+DEFAULT_PROFILE_TOP = 40
+
+# 采样模式的采样间隔（秒，按CPU时间计）
+SAMPLE_INTERVAL = 0.005
+
+_UNSAFE_NAME = re.compile(r"[^0-9A-Za-z_.-]+")
+
+
+def _parse_tools(value: str) -> Optional[frozenset]:
+    """解析WORD_TOOLS_PROFILE：返回None表示关闭，空集合表示剖析所有工具"""
+    value = value.strip()
+    if not value or value.lower() in ("0", "false", "off", "no"):
+        return None
+    if value.lower() in ("1", "true", "on", "yes", "all"):
+        return frozenset()
+    return frozenset(item.strip() for item in value.split(",") if item.strip())
+
+
+_tools = _parse_tools(os.environ.get(PROFILE_ENV, ""))
+_mode = os.environ.get(PROFILE_MODE_ENV, "cprofile").strip().lower()
+_directory = os.environ.get(PROFILE_DIR_ENV) or DEFAULT_PROFILE_DIR
+try:
+    _top = int(os.environ.get(PROFILE_TOP_ENV, DEFAULT_PROFILE_TOP))
+except ValueError:
+    _top = DEFAULT_PROFILE_TOP
+
+
+def is_profiling_enabled(task: str) -> bool:
+    """任务是否需要剖析（任务名的前缀为工具名，如 word-chunk.chunk）"""
+    if _tools is None:
+        return False
+    return not _tools or task.split(".", 1)[0] in _tools
+
+
+def profile_task(task: str):
+    """
+    返回包裹一次任务执行的剖析上下文
+
+    开关关闭时返回空上下文，不产生任何额外开销。剖析结果按请求ID写入本地目录，
+    只包含函数名、源码位置、调用次数和耗时，不包含任何文档内容
+
+    Args:
+        task: 任务名
+
+    用法:
+        with profile_task(name):
+            result = func(*args, **kwargs)
+    """
+    if not is_profiling_enabled(task):
+        return nullcontext()
+    return _profiled(task)
+
+
+@contextmanager
+def _profiled(task: str) -> Iterator[None]:
+    metrics = current_metrics()
+    request_id = metrics.request_id if metrics is not None else None
+    base = _profile_path(task, request_id)
+    started = time.perf_counter()
+
+    sampler = _StackSampler() if _mode == "sample" else None
+    if sampler is not None and not sampler.start():
+        # 只有主线程可以设置信号处理函数，其他线程中退回到cProfile
+        sampler = None
+    profiler = None
+    if sampler is None:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        try:
+            if sampler is not None:
+                sampler.stop()
+                path = sampler.dump(base)
+            else:
+                profiler.disable()
+                path = _dump_cprofile(profiler, base, task, request_id, elapsed)
+            logger.info(f"任务 {task} 剖析结果已写入 {path}（耗时 {elapsed * 1000:.0f} ms）")
+        except Exception as e:
+            # 剖析结果写入失败不能影响请求本身
+            logger.warning(f"任务 {task} 剖析结果写入失败: {e}")
+
+
+def _profile_path(task: str, request_id: Optional[str]) -> str:
+    """剖析结果文件的路径前缀：<目录>/<请求ID>-<任务名>"""
+    request_id = _UNSAFE_NAME.sub("_", request_id or "") or f"pid{os.getpid()}-{time.time_ns()}"
+    os.makedirs(_directory, exist_ok=True)
+    return os.path.join(_directory, f"{request_id}-{_UNSAFE_NAME.sub('_', task)}")
+
+
+def _dump_cprofile(
+    profiler: cProfile.Profile, base: str, task: str, request_id: Optional[str], elapsed: float
+) -> str:
+    """写出pstats原始数据（.prof，可用pstats/snakeviz查看）和按累计耗时排序的文本摘要（.txt）"""
+    profiler.dump_stats(base + ".prof")
+    buffer = io.StringIO()
+    stats = pstats.Stats(profiler, stream=buffer)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(_top)
+    with open(base + ".txt", "w", encoding="utf-8") as f:
+        f.write(f"task: {task}\nrequest_id: {request_id or '-'}\nelapsed_ms: {elapsed * 1000:.1f}\n")
+        f.write(buffer.getvalue())
+    return base + ".prof"
+
+
+class _StackSampler:
+    """
+    定时采样调用栈的轻量剖析器
+
+    通过SIGPROF按CPU时间定时中断，记录当前调用栈（文件名:函数名），
+    结束后按collapsed stack格式写出，可直接用flamegraph.pl或speedscope生成火焰图。
+    开销与采样频率有关，与被剖析代码的函数调用次数无关
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._previous = None
+
+    def start(self) -> bool:
+        try:
+            self._previous = signal.signal(signal.SIGPROF, self._sample)
+        except (ValueError, AttributeError):
+            return False
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        return True
+
+    def stop(self) -> None:
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, self._previous or signal.SIG_DFL)
+
+    def _sample(self, signum, frame) -> None:
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        self.samples[";".join(reversed(stack))] += 1
+
+    def dump(self, base: str) -> str:
+        path = base + ".folded"
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, hits in self.samples.most_common():
+                f.write(f"{stack} {hits}\n")
+        return path
@@ -0,0 +1,331 @@
+"""
+近似重复文档索引：用MinHash/LSH在本地磁盘上登记处理过的文档，找出与新文档高度相似的文档
+
+很多上传的文档出自同一个模板（合同只改了当事人、日期和金额），内容哈希不同，精确缓存无法命中。
+这里以段落为特征单位（每个非空段落或表格文本的哈希），两份文档的Jaccard相似度就是相同段落的比例，
+也就是能够复用的段落比例。工具按段落摘要复用相似文档的标题识别结果和批注匹配结果，
+只有不同的段落重新处理，结果与完整处理一致。
+
+- 签名: 单次哈希的MinHash（one permutation hashing），每个段落只计算一次哈希，
+  按哈希值分到SIGNATURE_SIZE个桶中取最小值
+- LSH: 签名按BAND_ROWS个值一段分段，任意一段完全相同的文档成为候选，再用完整签名估计相似度
+- 存储: 索引和每个文档的可复用状态保存在本地目录中，工作进程直接读写，不占用插件存储的配额；
+  每个应用（属于唯一的租户）使用单独的子目录，不同应用之间不会互相复用结果
+- 内容: 只保存签名、段落和摘要的哈希以及匹配位置等，不保存文档文本和批注摘要的原文
+- 容量: 登记的文档超过上限时按最近使用时间淘汰
+- 并发: 工作进程之间用文件锁串行更新index.json（没有fcntl的平台上退化为只在进程内加锁）
+"""
+
+import glob
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - 插件只在Linux上运行
+    fcntl = None
+
+from tools.utils.instrumentation import count
+from tools.utils.logger_utils import get_logger
+
+logger = get_logger(__name__)
+
+# 索引配置（环境变量），条目上限设为0表示关闭
+SIMILARITY_DIR_ENV = "WORD_TOOLS_SIMILARITY_DIR"  # 索引目录
+SIMILARITY_ENTRIES_ENV = "WORD_TOOLS_SIMILARITY_ENTRIES"  # 登记的文档数上限
+DEFAULT_SIMILARITY_DIR = os.path.join(tempfile.gettempdir(), "word_tools_similarity")
+DEFAULT_SIMILARITY_ENTRIES = 200
+
+# 签名长度和LSH分段：16段×4个值，相似度0.6的文档约90%成为候选，0.3的约12%
+SIGNATURE_SIZE = 64
+BAND_ROWS = 4
+EMPTY_BIN = (1 << 64) - 1
+# 估计相似度不低于该值时才复用（低于一半的段落相同时复用的收益很小）
+SIMILARITY_THRESHOLD = 0.5
+# 段落太少的文档相似度估计误差大，处理本身也很快，不登记也不查找
+MIN_PARAGRAPHS = 16
+
+INDEX_FILE = "index.json"
+LOCK_FILE = "index.lock"
+INDEX_VERSION = 1
+
+
+def text_digest(text: str) -> str:
+    """文本的短摘要，索引中的状态用它代替段落文本和批注摘要"""
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def similarity_scope(session: Any) -> str:
+    """
+    索引的隔离范围：应用ID的摘要（插件存储以外的本地数据同样按租户隔离，应用只属于一个租户）
+
+    Args:
+        session: 工具的会话对象（self.session）
+
+    Returns:
+        str: 作为子目录名的范围标识
+    """
+    app_id = getattr(session, "app_id", None) or ""
+    return hashlib.sha256(app_id.encode("utf-8")).hexdigest()[:24]
+
+
+def document_signature(texts: Iterable[str]) -> Optional[List[int]]:
+    """
+    计算文档的MinHash签名
+
+    Args:
+        texts: 正文各元素（段落、表格）的文本
+
+    Returns:
+        Optional[List[int]]: 长度为SIGNATURE_SIZE的签名，不同的非空段落少于MIN_PARAGRAPHS时返回None
+    """
+    hashes = {
+        int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "big")
+        for text in (text.strip() for text in texts)
+        if text
+    }
+    if len(hashes) < MIN_PARAGRAPHS:
+        return None
+    signature = [EMPTY_BIN] * SIGNATURE_SIZE
+    for value in hashes:
+        slot, rank = value % SIGNATURE_SIZE, value // SIGNATURE_SIZE
+        if rank < signature[slot]:
+            signature[slot] = rank
+    return signature
+
+
+def estimate_similarity(a: List[int], b: List[int]) -> float:
+    """用两个签名估计Jaccard相似度（两边都为空的桶不参与比较）"""
+    compared = equal = 0
+    for x, y in zip(a, b):
+        if x == EMPTY_BIN and y == EMPTY_BIN:
+            continue
+        compared += 1
+        equal += x == y
+    return equal / compared if compared else 0.0
+
+
+def _bands(signature: List[int]) -> List[str]:
+    """签名各段的桶键（全部为空桶的段不参与，避免段落很少的文档互相成为候选）"""
+    keys = []
+    for band, start in enumerate(range(0, SIGNATURE_SIZE, BAND_ROWS)):
+        values = signature[start : start + BAND_ROWS]
+        if all(value == EMPTY_BIN for value in values):
+            continue
+        raw = ",".join(str(value) for value in values).encode("ascii")
+        keys.append(f"{band}:{hashlib.blake2b(raw, digest_size=8).hexdigest()}")
+    return keys
+
+
+class SimilarityIndex:
+    """
+    本地磁盘上的近似重复文档索引
+
+    目录中的index.json记录每个文档的签名和最近使用时间，以及LSH桶 {桶键: [文档ID]}；
+    每个文档的可复用状态（标题识别结果、匹配计划等）各自保存为一个JSON文件
+
+    用法:
+        index = get_similarity_index(scope)
+        signature = document_signature(parsed.texts)
+        found = index.find(signature, "titles:contract")
+        state = index.load_state(found[0], "titles:contract") if found else None
+        ...
+        index.save_state(document_id, signature, "titles:contract", new_state)
+    """
+
+    def __init__(self, directory: str, max_entries: int):
+        self.directory = directory
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def find(self, signature: Optional[List[int]], name: str) -> Optional[Tuple[str, float]]:
+        """
+        查找与签名最相似、并且保存了指定状态的已登记文档
+
+        Args:
+            signature: document_signature返回的签名，为None时不查找
+            name: 需要复用的状态名称
+
+        Returns:
+            Optional[Tuple[str, float]]: (文档ID, 估计相似度)，没有相似度不低于SIMILARITY_THRESHOLD的文档时返回None
+        """
+        if not self.enabled or signature is None:
+            return None
+        with self._lock:
+            index = self._load_index()
+        candidates = {
+            doc_id
+            for key in _bands(signature)
+            for doc_id in index["buckets"].get(key, [])
+            if doc_id in index["entries"] and os.path.exists(self._state_path(doc_id, name))
+        }
+        best = None
+        for doc_id in candidates:
+            score = estimate_similarity(signature, index["entries"][doc_id]["signature"])
+            if score >= SIMILARITY_THRESHOLD and (best is None or score > best[1]):
+                best = (doc_id, score)
+        count("similar_candidates", len(candidates))
+        count("similar_hits" if best else "similar_misses")
+        return best
+
+    def load_state(self, doc_id: str, name: str) -> Optional[Any]:
+        """读取文档的可复用状态，不存在或已损坏时返回None"""
+        try:
+            with open(self._state_path(doc_id, name), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save_state(self, doc_id: str, signature: Optional[List[int]], name: str, state: Any) -> None:
+        """
+        保存文档的可复用状态并登记（或刷新）文档的签名，超过条目上限时淘汰最久未使用的文档
+
+        Args:
+            doc_id: 文档ID（内容哈希）
+            signature: 文档签名，为None时不保存
+            name: 状态名称（如"titles:contract"），同一文档可以保存多个状态
+            state: 可以序列化为JSON的状态
+        """
+        if not self.enabled or signature is None:
+            return
+        try:
+            os.makedirs(self.directory, mode=0o700, exist_ok=True)
+            self._write(
+                self._state_path(doc_id, name),
+                json.dumps(state, ensure_ascii=False, separators=(",", ":")).encode("utf-8"),
+            )
+            with self._lock, self._index_lock():
+                index = self._load_index()
+                entry = index["entries"].get(doc_id)
+                if entry is None:
+                    index["entries"][doc_id] = {"signature": signature, "used": time.time()}
+                    for key in _bands(signature):
+                        index["buckets"].setdefault(key, []).append(doc_id)
+                else:
+                    entry["used"] = time.time()
+                self._evict(index, keep=doc_id)
+                self._save_index(index)
+        except OSError as e:
+            logger.warning(f"近似重复文档索引写入失败: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        """返回登记的文档数和条目上限"""
+        with self._lock:
+            index = self._load_index()
+        return {"documents": len(index["entries"]), "max_entries": self.max_entries}
+
+    @contextmanager
+    def _index_lock(self):
+        """在读取、修改和写回index.json期间持有的文件锁，多个工作进程的更新不会互相覆盖"""
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.directory, LOCK_FILE), "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _state_path(self, doc_id: str, name: str) -> str:
+        # 状态名称可能包含用户传入的参数，取摘要作为文件名的一部分
+        suffix = hashlib.blake2b(name.encode("utf-8"), digest_size=6).hexdigest()
+        return os.path.join(self.directory, f"{doc_id}_{suffix}.json")
+
+    def _evict(self, index: Dict[str, dict], keep: str) -> None:
+        """按最近使用时间从旧到新删除文档及其状态，直到不超过条目上限"""
+        entries = index["entries"]
+        excess = len(entries) - self.max_entries
+        if excess <= 0:
+            return
+        for doc_id in sorted(entries, key=lambda item: entries[item]["used"]):
+            if excess <= 0:
+                break
+            if doc_id == keep:
+                continue
+            for key in _bands(entries.pop(doc_id)["signature"]):
+                bucket = index["buckets"].get(key, [])
+                if doc_id in bucket:
+                    bucket.remove(doc_id)
+                if not bucket:
+                    index["buckets"].pop(key, None)
+            for path in glob.glob(os.path.join(self.directory, f"{doc_id}_*.json")):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            excess -= 1
+            count("similar_evictions")
+
+    def _load_index(self) -> Dict[str, dict]:
+        """读取索引，不存在或格式不对时视为空"""
+        try:
+            with open(os.path.join(self.directory, INDEX_FILE), encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            data = None
+        except (OSError, ValueError):
+            logger.warning("近似重复文档索引已损坏，重新建立")
+            data = None
+        if not isinstance(data, dict) or data.get("version") != INDEX_VERSION:
+            return {"entries": {}, "buckets": {}}
+        return {"entries": data.get("entries", {}), "buckets": data.get("buckets", {})}
+
+    def _save_index(self, index: Dict[str, dict]) -> None:
+        data = json.dumps({"version": INDEX_VERSION, **index}, separators=(",", ":"))
+        self._write(os.path.join(self.directory, INDEX_FILE), data.encode("utf-8"))
+
+    @staticmethod
+    def _write(path: str, data: bytes) -> None:
+        """先写临时文件再替换，其他进程不会读到写了一半的文件"""
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+def _env_int(name: str, default: int) -> int:
+    """读取整数环境变量，无效时使用默认值"""
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+_indexes: Dict[str, SimilarityIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_similarity_index(scope: str) -> SimilarityIndex:
+    """
+    返回进程内共享的、指定范围的近似重复文档索引（目录和条目上限由环境变量配置）
+
+    Args:
+        scope: similarity_scope返回的范围标识，每个范围使用单独的子目录和条目上限
+    """
+    index = _indexes.get(scope)
+    if index is None:
+        with _indexes_lock:
+            index = _indexes.get(scope)
+            if index is None:
+                base = os.environ.get(SIMILARITY_DIR_ENV) or DEFAULT_SIMILARITY_DIR
+                index = _indexes[scope] = SimilarityIndex(
+                    directory=os.path.join(base, scope),
+                    max_entries=_env_int(SIMILARITY_ENTRIES_ENV, DEFAULT_SIMILARITY_ENTRIES),
+                )
+    return index
@@ -0,0 +1,191 @@
+"""
+按token预算分块：估算文本的token数，把超过上限的文本在自然边界处切开，把相邻的小块合并到目标大小
+
+下游模型的分词器未知，这里用一个快速、偏保守（通常高估）的估算代替真实分词:
+- 中日韩文字: 每个字1个token
+- 拉丁字母: 每个连续单词按4个字母1个token，不足4个也算1个
+- 数字: 每3位1个token
+- 其他非空白字符（标点、符号）: 每个1个token
+- 空白: 不计
+
+估算对以空白分隔的拼接是可加的，在其他位置拼接时不超过各部分之和，
+因此按各部分估算值求和控制的块，整体估算值一定不超过上限。
+"""
+
+import re
+from typing import Any, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# 中日韩文字（含假名、谚文、兼容汉字）
+_CJK_RE = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]")
+_WORD_RE = re.compile(r"[A-Za-z]+")
+_DIGIT_RE = re.compile(r"\d+")
+_SYMBOL_RE = re.compile(r"[^\sA-Za-z\d\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff]")
+
+# 超过上限的文本依次尝试的切分边界：换行（元素之间、表格行之间）、句末标点、分句标点、空白。
+# 换行本身不属于任何一块（分块以换行连接时恢复），其余边界的标点和其后的一个空白留在前一块末尾
+SPLIT_BOUNDARIES = (
+    re.compile(r"\n"),
+    re.compile(r"(?<=[。！？；!?;])(?=\S)|(?<=[。！？；!?;]\s)(?=\S)"),
+    re.compile(r"(?<=[，,、：:])(?=\S)|(?<=[，,、：:]\s)(?=\S)"),
+    re.compile(r"(?<=\s)"),
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    估算文本的token数
+
+    Args:
+        text: 文本
+
+    Returns:
+        int: 估算的token数
+    """
+    return (
+        len(_CJK_RE.findall(text))
+        + sum((len(word) + 3) // 4 for word in _WORD_RE.findall(text))
+        + sum((len(digits) + 2) // 3 for digits in _DIGIT_RE.findall(text))
+        + len(_SYMBOL_RE.findall(text))
+    )
+
+
+def pack(sizes: Sequence[int], capacity: int) -> List[List[int]]:
+    """
+    按顺序贪心分组：组内大小之和不超过capacity（单个超过capacity的项单独成组）
+
+    Args:
+        sizes: 各项的大小
+        capacity: 每组的容量
+
+    Returns:
+        List[List[int]]: 每组包含的项下标
+    """
+    groups: List[List[int]] = []
+    current: List[int] = []
+    total = 0
+    for i, size in enumerate(sizes):
+        if current and total + size > capacity:
+            groups.append(current)
+            current = []
+            total = 0
+        current.append(i)
+        total += size
+    if current:
+        groups.append(current)
+    return groups
+
+
+def balanced_pack(sizes: Sequence[int], max_groups: int, low: int, high: int) -> List[List[int]]:
+    """
+    在[low, high]内二分查找能把各项分成不超过max_groups组的最小容量，使各组大小尽量均匀
+
+    Args:
+        sizes: 各项的大小
+        max_groups: 最多分成的组数
+        low: 容量下限
+        high: 容量上限
+
+    Returns:
+        List[List[int]]: 每组包含的项下标；容量为high时仍超过max_groups组则返回按high分组的结果
+    """
+    groups = pack(sizes, high)
+    if len(groups) > max_groups:
+        return groups
+    low = max(low, max(sizes, default=0))
+    while low < high:
+        middle = (low + high) // 2
+        candidate = pack(sizes, middle)
+        if len(candidate) <= max_groups:
+            groups, high = candidate, middle
+        else:
+            low = middle + 1
+    return groups
+
+
+def stream_pack(
+    items: Iterable[Tuple[Any, int]],
+    total: int,
+    max_groups: int,
+    low: int = 0,
+    high: Optional[int] = None,
+) -> Iterator[List[Tuple[Any, int]]]:
+    """
+    按顺序流式分组：事先只知道（估算的）总大小，每组一结束就产生该组，不必等到所有项都到达
+
+    每组的容量为尚未分组的大小平均分到剩余组数上（限制在[low, high]内），加入下一项会超过容量时结束当前组。
+    不提供high时最后一组不再结束，组数一定不超过max_groups；提供high时每组都不超过high
+    （单项超过high的除外），high太小时组数会超过max_groups
+
+    Args:
+        items: (项, 大小) 的可迭代对象
+        total: 所有项的大小之和（第一遍估算）
+        max_groups: 最多分成的组数
+        low: 容量下限
+        high: 容量上限，None表示不限制
+
+    Returns:
+        Iterator[List[Tuple[Any, int]]]: 逐个产生每组的 (项, 大小) 列表
+    """
+    group: List[Tuple[Any, int]] = []
+    size = 0
+    remaining = total
+    groups_left = max_groups
+    for item, item_size in items:
+        if group:
+            capacity = max(remaining / groups_left, low) if groups_left > 1 else float("inf")
+            if high is not None:
+                capacity = min(capacity, high)
+            if size + item_size > capacity:
+                yield group
+                remaining -= size
+                groups_left -= 1
+                group = []
+                size = 0
+        group.append((item, item_size))
+        size += item_size
+    if group:
+        yield group
+
+
+def split_to_budget(text: str, max_tokens: int) -> List[str]:
+    """
+    把估算超过max_tokens的文本切成若干不超过上限、大小均匀的片段
+
+    优先在换行处切分（以换行连接各片段即得到原文），其次在句末标点、分句标点、空白处切分
+    （各片段直接拼接即得到原文），都无法满足时按字符数硬切（每个字符最多估算为1个token）
+
+    Args:
+        text: 文本
+        max_tokens: 每个片段的token上限
+
+    Returns:
+        List[str]: 片段列表，不超过上限的文本原样返回
+    """
+    spans = _split_spans(text, 0, len(text), 0, max_tokens)
+    if len(spans) == 1:
+        return [text]
+    sizes = [size for _, _, size in spans]
+    groups = balanced_pack(sizes, len(pack(sizes, max_tokens)), 0, max_tokens)
+    return [text[spans[group[0]][0] : spans[group[-1]][1]] for group in groups]
+
+
+def _split_spans(
+    text: str, start: int, end: int, level: int, max_tokens: int
+) -> List[Tuple[int, int, int]]:
+    """把text[start:end]逐级切分为不超过上限的区间 [(起点, 终点, 估算token数)]"""
+    size = estimate_tokens(text[start:end])
+    if size <= max_tokens:
+        return [(start, end, size)]
+    if level == len(SPLIT_BOUNDARIES):
+        return [
+            (i, min(i + max_tokens, end), estimate_tokens(text[i : min(i + max_tokens, end)]))
+            for i in range(start, end, max_tokens)
+        ]
+    spans = []
+    position = start
+    for match in SPLIT_BOUNDARIES[level].finditer(text, start, end):
+        if match.start() > position or match.end() > match.start():
+            spans.extend(_split_spans(text, position, match.start(), level + 1, max_tokens))
+            position = match.end()
+    spans.extend(_split_spans(text, position, end, level + 1, max_tokens))
+    return spans
@@ -0,0 +1,212 @@
+import io
+import os
+import shutil
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+from tools.utils.logger_utils import get_logger
+
+logger = get_logger(__name__)
+
+# 预热配置（环境变量）
+WARMUP_ENV = "WORD_TOOLS_WARMUP"  # 设为1/true开启预热，默认关闭
+WARMUP_TOOLS_ENV = "WORD_TOOLS_WARMUP_TOOLS"  # 逗号分隔的工具名，默认全部
+WARMUP_TIME_LIMIT_ENV = "WORD_TOOLS_WARMUP_TIME_LIMIT"  # 预热总时长上限（秒）
+DEFAULT_TIME_LIMIT = 30.0
+
+# 预热用的合同样例文本
+SAMPLE_TITLE = "技术服务合同"
+SAMPLE_CLAUSES = [
+    ("第一条 服务内容", "乙方应按照甲方要求提供系统运维服务，并按月提交服务报告。"),
+    ("第二条 付款方式", "甲方应在收到发票后三十日内支付当期服务费用。"),
+    ("第三条 争议解决", "双方协商不成的，任何一方可向甲方所在地人民法院提起诉讼。"),
+]
+
+
+def is_warmup_enabled() -> bool:
+    """是否通过环境变量开启了预热"""
+    return os.environ.get(WARMUP_ENV, "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def registered_tool_classes(registration) -> Dict[str, type]:
+    """
+    取出插件运行时已经加载的工具类（工具名 -> 类）
+
+    工具模块只能由运行时加载一次：再次从源码加载会得到另一份类，
+    并重新执行模块中的register_task，用另一份模块的函数替换工作进程池的任务
+    """
+    return {
+        name: tool_cls
+        for _, _, tools in registration.tools_mapping.values()
+        for name, (_, tool_cls) in tools.items()
+    }
+
+
+def run_warmup_if_enabled(registration) -> Optional[Dict[str, float]]:
+    """环境变量开启预热时执行预热，否则直接返回None"""
+    if not is_warmup_enabled():
+        return None
+
+    tool_classes = registered_tool_classes(registration)
+    tools = [
+        name.strip()
+        for name in os.environ.get(WARMUP_TOOLS_ENV, "").split(",")
+        if name.strip()
+    ] or list(tool_classes)
+    try:
+        time_limit = float(os.environ.get(WARMUP_TIME_LIMIT_ENV, DEFAULT_TIME_LIMIT))
+    except ValueError:
+        time_limit = DEFAULT_TIME_LIMIT
+    return run_warmup(tool_classes, tools, time_limit)
+
+
+def run_warmup(
+    tool_classes: Dict[str, type], tools: List[str], time_limit: float = DEFAULT_TIME_LIMIT
+) -> Dict[str, float]:
+    """
+    在开始接收请求之前预热插件进程：导入依赖、创建工具实例，
+    并用一份很小的合成文档把每个工具完整运行一遍
+
+    每一步都会记录耗时；超过时间上限后跳过剩余步骤（正在执行的步骤不会被中断）。
+    预热中的任何错误都只记录日志，不影响插件启动
+
+    Args:
+        tool_classes: 插件运行时已加载的工具类（见registered_tool_classes）
+        tools: 需要预热的工具名
+        time_limit: 预热总时长上限（秒）
+
+    Returns:
+        dict: 每个步骤的耗时（秒），跳过或失败的步骤不包含在内
+    """
+    unknown = [name for name in tools if name not in tool_classes]
+    if unknown:
+        logger.warning(f"预热: 忽略未知的工具 {', '.join(unknown)}")
+    tools = [name for name in tools if name in tool_classes]
+
+    started = time.perf_counter()
+    deadline = started + time_limit
+    timings: Dict[str, float] = {}
+    instances = {}
+    work_dir = tempfile.mkdtemp(prefix="word_tools_warmup_")
+
+    def step(name: str, func: Callable[[], object]) -> None:
+        if time.perf_counter() >= deadline:
+            logger.warning(f"预热: 已超过时间上限 {time_limit} 秒，跳过 {name}")
+            return
+        step_start = time.perf_counter()
+        try:
+            func()
+        except Exception as e:
+            logger.warning(f"预热: {name} 失败: {str(e)}")
+            return
+        timings[name] = time.perf_counter() - step_start
+        logger.info(f"预热: {name} 完成，耗时 {timings[name] * 1000:.1f} ms")
+
+    logger.info(f"开始预热，工具: {', '.join(tools)}，时间上限: {time_limit} 秒")
+    try:
+        # 1. 创建工具实例（工具模块已由插件运行时加载）并导入重量级依赖
+        for name in tools:
+            step(
+                f"创建 {name}",
+                lambda name=name: instances.update({name: tool_classes[name].from_credentials({})}),
+            )
+        if "pdf_to_word" in tools:
+            step("导入 pdf2docx", lambda: __import__("pdf2docx"))
+        if "word_insert_text" in tools:
+            step("导入 markdown", _import_markdown)
+
+        # 2. 用合成文档运行每个工具
+        sample = {}
+        step("生成样例文档", lambda: sample.update(docx=_build_sample_docx()))
+        if "docx" in sample:
+            sample_path = os.path.join(work_dir, "sample.docx")
+            with open(sample_path, "wb") as f:
+                f.write(sample["docx"])
+            output_path = os.path.join(work_dir, "output.docx")
+
+            if "word-chunk" in instances:
+                step("运行 word-chunk", lambda: _warm_chunk(instances["word-chunk"], sample["docx"]))
+            if "word_comment" in instances:
+                step(
+                    "运行 word_comment",
+                    lambda: _warm_comment(instances["word_comment"], sample_path, output_path),
+                )
+            if "word_insert_text" in instances:
+                step(
+                    "运行 word_insert_text",
+                    lambda: _warm_insert(instances["word_insert_text"], sample_path, output_path),
+                )
+        if "pdf_to_word" in instances:
+            step("运行 pdf_to_word", lambda: _warm_pdf(instances["pdf_to_word"], work_dir))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        # 样例文档不应占用共享的文档缓存
+        from tools.utils.document_cache import get_document_cache
+
+        get_document_cache().clear()
+
+    logger.info(f"预热结束，总耗时 {(time.perf_counter() - started) * 1000:.1f} ms")
+    return timings
+
+
+def _import_markdown() -> None:
+    """导入markdown及插入工具使用的扩展"""
+    import markdown
+
+    markdown.Markdown(extensions=["tables", "fenced_code", "sane_lists"]).convert("| a |\n|---|\n| b |")
+
+
+def _build_sample_docx() -> bytes:
+    """生成一份包含标题、条款和表格的小型合同文档"""
+    from docx import Document
+
+    doc = Document()
+    doc.add_heading(SAMPLE_TITLE, level=1)
+    for title, body in SAMPLE_CLAUSES:
+        doc.add_paragraph(title)
+        doc.add_paragraph(body)
+    table = doc.add_table(rows=2, cols=2)
+    table.cell(0, 0).text = "服务期限"
+    table.cell(0, 1).text = "一年"
+    table.cell(1, 0).text = "服务费用"
+    table.cell(1, 1).text = "十万元"
+    buffer = io.BytesIO()
+    doc.save(buffer)
+    return buffer.getvalue()
+
+
+def _warm_chunk(tool, blob: bytes) -> None:
+    chunks = tool.smart_chunk_paragraphs(blob, doc_type="contract")
+    tool.limit_chunks_to_max(chunks, max_chunks=2)
+
+
+def _warm_comment(tool, input_path: str, output_path: str) -> None:
+    # 一条可以精确匹配，一条需要模糊匹配
+    comments = {
+        SAMPLE_CLAUSES[1][1]: "预热批注",
+        "双方协商不成的任何一方可以起诉": "预热批注",
+    }
+    tool.add_native_comments_to_document(input_path, output_path, comments)
+
+
+def _warm_insert(tool, input_path: str, output_path: str) -> None:
+    text = "## 补充条款\n\n- **保密**：双方应对合同内容保密\n\n| 项目 | 金额 |\n|---|---|\n| 服务费 | 10万元 |"
+    tool.insert_text_to_document(
+        input_path, output_path, text, "end", "宋体", 12, "#000000", is_markdown=True
+    )
+
+
+def _warm_pdf(tool, work_dir: str) -> None:
+    import fitz
+
+    pdf_path = os.path.join(work_dir, "sample.pdf")
+    docx_path = os.path.join(work_dir, "sample_pdf.docx")
+    pdf = fitz.open()
+    page = pdf.new_page()
+    page.insert_text((72, 72), "Service Agreement", fontsize=16)
+    page.insert_text((72, 110), "Article 1. The supplier shall provide maintenance services.")
+    pdf.save(pdf_path)
+    pdf.close()
+    tool.pdf_to_docx(pdf_path, docx_path)
+    tool.optimize_docx(docx_path)
@@ -1,81 +1,341 @@
-from collections.abc import Generator
-from typing import Any
-import tempfile
-import os
+from collections.abc import Generator, Iterator
+from typing import Any, Optional
+import itertools
 import re
 import json
+import hashlib
 from dify_plugin.file.file import File
 from dify_plugin import Tool
 from dify_plugin.entities.tool import ToolInvokeMessage
-from docx import Document
 from docx.enum.text import WD_ALIGN_PARAGRAPH
+from lxml import etree
 from tools.utils.logger_utils import get_logger
+from tools.utils.document_store import DocumentHandleError, StoredDocument, document_owner, get_document_store
+from tools.utils.document_cache import document_key, get_document_cache, get_parsed_document
+from tools.utils.admission import run_admitted_task, stream_admitted_task
+from tools.utils.instrumentation import Metrics, collect_metrics, count, set_value, stage
+from tools.utils.persistent_cache import get_persistent_cache
+from tools.utils.process_pool import register_task
+from tools.utils.similarity_index import document_signature, get_similarity_index, similarity_scope
+from tools.utils.token_budget import balanced_pack, estimate_tokens, pack, split_to_budget, stream_pack
+
+# 提交到工作进程池的任务名
+CHUNK_TASK = "word-chunk.chunk"
+INCREMENTAL_CHUNK_TASK = "word-chunk.chunk_incremental"
+CHUNK_STREAM_TASK = "word-chunk.chunk_stream"
+# 流式输出时逐块追加分块结果的变量名
+STREAM_VARIABLE = "chunks"
+# 分块结果在持久化缓存中的版本，分块规则变化时递增，使旧结果失效
+CHUNK_CACHE_VERSION = 2
 
 
 class WordChunkTool(Tool):
     # 获取当前模块的日志记录器
     logger = get_logger(__name__)
 
+    # 标题识别规则（类加载时编译一次，避免每个段落重复解析正则）
+    # 以特殊符号开头的段落（这些通常不是标题）
+    TITLE_EXCLUDE_RE = re.compile(r"^《|^》|^\"|^'|^【|^】|^〔|^〕|^〖|^〗|^•|^·|^◇|^○|^□|^■|^▷|^▶|^※|^§|^№|^★|^☆|^[（(][^）)]*[）)]|^--+|^—+|^==+|^__+")
+    # 合同特有模式
+    CONTRACT_TITLE_PATTERNS = [
+        re.compile(r"^第[一二三四五六七八九十百千万\d]+条[：: ]"),  # 第X条
+        re.compile(r"^(甲方|乙方|丙方|丁方)[：: ]"),              # 合同方
+        re.compile(r"^合同编号[：: ]"),                          # 合同编号
+        re.compile(r"^签订日期[：: ]"),                          # 签订日期
+        re.compile(r"^签订地点[：: ]"),                          # 签订地点
+        re.compile(r"^鉴于[：: ]"),                              # 鉴于条款
+        re.compile(r"^附件[一二三四五六七八九十百千万\d]*[：: ]"),  # 附件
+    ]
+    # 制度文件特有模式
+    POLICY_TITLE_PATTERNS = [
+        re.compile(r"^第[一二三四五六七八九十百千万\d]+章[：: ]"),   # 第X章
+        re.compile(r"^第[一二三四五六七八九十百千万\d]+节[：: ]"),   # 第X节
+        re.compile(r"^第[一二三四五六七八九十百千万\d]+款[：: ]"),   # 第X款
+        re.compile(r"^第[一二三四五六七八九十百千万\d]+项[：: ]"),   # 第X项
+        re.compile(r"^[（(][一二三四五六七八九十百千万\d]+[）)][：: ]"),  # (X)
+        re.compile(r"^总则[：: ]"),                               # 总则
+        re.compile(r"^附则[：: ]"),                               # 附则
+    ]
+    # 通用编号标题（不将1.1.1这样的小级标题识别为标题）
+    GENERAL_TITLE_PATTERNS = [
+        re.compile(r"^\d+\.\d*\s*"),              # 一级或二级标题 1. 或 1.1
+        re.compile(r"^[IVXLCDM]+\.\s"),            # 罗马数字 I.
+        re.compile(r"^第[\u4e00-\u9fa5\d]+[章节条]"), # 第X章/节/条
+        re.compile(r"^[一二三四五六七八九十百千万]+[、.]\s?"), # 中文序号
+        re.compile(r"^[A-Z]{2,}[A-Z\s]*\b"),       # 全大写短语（至少2字母）
+        re.compile(r"^附 ?录\s?[A-Z]：?"),           # 附录类标题
+    ]
+    DEEP_NUMBERED_TITLE_RE = re.compile(r"^\d+(\.\d+){2,}\s*")
+    # 分段时使用的条款号、数字标题规则
+    CLAUSE_NUMBER_RE = re.compile(r"第([一二三四五六七八九十百千万\d]+)条")
+    NUMBERED_HEADING_RE = re.compile(r"^\d+(\.\d+)?\s*")
+    NUMBERED_LINE_RE = re.compile(r"^(\d+(\.\d+)?)\s*")
+
+    # 上一版本（增量分块）或近似重复文档的标题识别结果 {段落XML摘要: 是否标题}，以及本次的识别结果
+    _title_memo: Optional[dict] = None
+    _title_record: Optional[dict] = None
+
     def _invoke(self, tool_parameters: dict[str, Any]) -> Generator[ToolInvokeMessage]:
         # 获取上传的word文件
         word_content: File = tool_parameters.get("word_content")
         chunk_num: int = tool_parameters.get("chunk_num")
         docx_type: str = tool_parameters.get("docx_type")
+        # anchors模式下每个分块还返回所在段落范围（锚点）和字符区间，供word_comment按块批注
+        with_anchors = tool_parameters.get("output_mode", "text") == "anchors"
+        # 增量分块：返回本版本的指纹，传入上一版本的指纹时只重新识别变化的段落并报告变化的分块
+        previous_fingerprint = (tool_parameters.get("previous_fingerprint") or "").strip()
+        incremental = tool_parameters.get("incremental", False) or bool(previous_fingerprint)
+        # token预算模式：每块不超过max_tokens个（估算的）token，尽量接近target_tokens
+        max_tokens = tool_parameters.get("max_tokens")
+        target_tokens = tool_parameters.get("target_tokens")
+        # 流式输出：每确定一个分块就追加到流式变量，下游不必等待整个文档分段完成
+        stream = tool_parameters.get("stream", False)
+        return_metrics = tool_parameters.get("return_metrics", False)
+        metrics = Metrics(request_id=self.session.session_id)
+
+        # 没有上传文件时，从本地文档存储中取回register_document登记的文档
+        document_handle = (tool_parameters.get("document_handle") or "").strip()
+        if not word_content and document_handle:
+            try:
+                word_content = get_document_store().get(document_handle, document_owner(self))
+            except DocumentHandleError as e:
+                self.logger.error(str(e))
+                yield self.create_text_message(str(e))
+                return
 
         if not word_content:
             self.logger.error("未提供Word文件")
-            yield self.create_text_message("请提供word文件")
+            yield self.create_text_message("请提供word文件或文档句柄")
             return
         # 检查文件类型
-        if not isinstance(word_content, File):
+        if not isinstance(word_content, (File, StoredDocument)):
             self.logger.error("无效的文件格式，期望File对象")
             yield self.create_text_message("无效的文件格式，期望File对象")
             return
 
+        # 验证token预算
+        try:
+            max_tokens = int(max_tokens or 0)
+            target_tokens = int(target_tokens or 0)
+        except (ValueError, TypeError):
+            self.logger.error(f"无效的token预算: max_tokens={max_tokens}，target_tokens={target_tokens}")
+            yield self.create_text_message("max_tokens和target_tokens必须是整数")
+            return
+        token_budget = None
+        if max_tokens > 0:
+            if not 0 < target_tokens <= max_tokens:
+                target_tokens = max_tokens // 2 or 1
+            token_budget = (target_tokens, max_tokens)
+
         self.logger.info(
             f"开始处理Word分块，文件名: {word_content.filename if word_content.filename else '未知'}，目标分块数: {chunk_num}"
         )
 
         try:
-            # 创建临时文件保存上传的word文件
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".docx") as temp_file:
-                # 获取文件内容（字节）并写入临时文件
-                temp_file.write(word_content.blob)
-                temp_file_path = temp_file.name
-
-            # 调用分段函数
-            self.logger.info("开始执行智能分段")
-            chunks = self.smart_chunk_paragraphs(temp_file_path, doc_type=docx_type)
-            self.logger.info(f"初始分段完成，共生成 {len(chunks)} 个段落")
-
-            # 限制分段个数不超过30个
-            chunks = self.limit_chunks_to_max(chunks, max_chunks=chunk_num)
-            self.logger.info(f"分段数量限制完成，最终段落数: {len(chunks)}")
-
-            # 清理临时文件
-            os.unlink(temp_file_path)
-
-            # 返回分段结果
-            result = {str(i + 1): chunk for i, chunk in enumerate(chunks)}
+            with metrics.stage("decode"):
+                blob = word_content.blob
+                affinity = document_key(blob)
+
+            cache = get_persistent_cache(self.session)
+            if incremental:
+                with collect_metrics(metrics):
+                    result, revision = self._chunk_incrementally(
+                        cache,
+                        blob,
+                        affinity,
+                        docx_type,
+                        chunk_num,
+                        with_anchors,
+                        token_budget,
+                        previous_fingerprint,
+                    )
+                self.logger.info(
+                    f"增量分块完成，共 {len(result)} 个分块，其中 {len(revision['changed_chunks'])} 个有变化"
+                )
+                yield self.create_json_message(result)
+                yield self.create_json_message({"revision": revision})
+                if return_metrics:
+                    yield self.create_json_message({"metrics": metrics.report()})
+                return
+
+            # 同一文档以相同参数分块过时直接复用插件存储中的结果
+            cache_key = (affinity, docx_type, chunk_num, with_anchors, token_budget, CHUNK_CACHE_VERSION)
+            if stream:
+                result = {}
+                for chunk_id, chunk in self._chunk_streaming(
+                    cache, cache_key, blob, affinity, docx_type, chunk_num, with_anchors, token_budget, metrics
+                ):
+                    result[chunk_id] = chunk
+                    # 逐块结果通过流式变量返回（每块一行JSON），JSON消息只保留最后的完整结果，
+                    # 工作流中json[0]仍是完整的分块结果
+                    line = json.dumps({"chunk_id": chunk_id, "chunk": chunk}, ensure_ascii=False)
+                    yield self.create_stream_variable_message(STREAM_VARIABLE, line + "\n")
+                self.logger.info(f"Word流式分块处理完成，成功生成 {len(result)} 个分块")
+                yield self.create_json_message(result)
+                if return_metrics:
+                    yield self.create_json_message({"metrics": metrics.report()})
+                return
+
+            with collect_metrics(metrics):
+                result = cache.get_json("chunk", cache_key)
+            if result is not None:
+                self.logger.info("命中持久化缓存，直接返回之前的分块结果")
+            else:
+                # 解析和标题识别是CPU密集的工作，交给工作进程池执行，不阻塞其他请求
+                self.logger.info("开始执行智能分段")
+                with collect_metrics(metrics):
+                    result = run_admitted_task(
+                        "word-chunk",
+                        CHUNK_TASK,
+                        blob,
+                        docx_type,
+                        chunk_num,
+                        with_anchors,
+                        token_budget,
+                        affinity=affinity,
+                        scope=similarity_scope(self.session),
+                    )
+                    cache.set_json("chunk", cache_key, result)
             self.logger.info(f"Word分块处理完成，成功生成 {len(result)} 个分块")
             yield self.create_json_message(result)
+            if return_metrics:
+                yield self.create_json_message({"metrics": metrics.report()})
 
         except Exception as e:
             self.logger.exception("处理Word文件时发生异常")
             yield self.create_text_message(f"处理word文件时出错: {str(e)}")
 
-    def smart_chunk_paragraphs(self, doc_path, min_length=1000, doc_type=None):
+    def _chunk_streaming(
+        self, cache, cache_key, blob, affinity, docx_type, chunk_num, with_anchors, token_budget, metrics
+    ):
+        """
+        流式分块：工作进程每确定一个分块就发回，这里立即产生该块；全部完成后把结果写入持久化缓存
+
+        流式分段按大小平均合并分块（见stream_limit_chunks），结果可能与非流式分段不同，因此单独缓存
+
+        Args:
+            cache: 持久化缓存
+            cache_key: 分块结果的缓存键
+            blob: Word文档内容
+            affinity: 文档内容哈希
+            docx_type: 文档类型
+            chunk_num: 最大分块数
+            with_anchors: 是否返回锚点
+            token_budget: (目标token数, 最大token数)，按字符数分块时为None
+            metrics: 本次请求的指标
+
+        Returns:
+            Generator: 逐个产生 (分块编号, 分块)
+        """
+        # 指标通过上下文变量传递，只能在不产生结果的部分收集（见collect_metrics）
+        with collect_metrics(metrics):
+            result = cache.get_json("chunk_stream", cache_key)
+        if result is not None:
+            self.logger.info("命中持久化缓存，直接返回之前的分块结果")
+            yield from result.items()
+            return
+
+        self.logger.info("开始执行流式分段")
+        result = {}
+        chunks = stream_admitted_task(
+            "word-chunk",
+            CHUNK_STREAM_TASK,
+            blob,
+            docx_type,
+            chunk_num,
+            with_anchors,
+            token_budget,
+            affinity=affinity,
+            scope=similarity_scope(self.session),
+        )
+        while True:
+            with collect_metrics(metrics):
+                item = next(chunks, None)
+            if item is None:
+                break
+            chunk_id, chunk = item
+            result[chunk_id] = chunk
+            yield chunk_id, chunk
+        with collect_metrics(metrics):
+            cache.set_json("chunk_stream", cache_key, result)
+
+    def _chunk_incrementally(
+        self, cache, blob, affinity, docx_type, chunk_num, with_anchors, token_budget, previous_fingerprint
+    ):
+        """
+        增量分块：取回上一版本的分块状态交给工作进程，保存本版本的状态
+
+        Args:
+            cache: 持久化缓存
+            blob: Word文档内容
+            affinity: 文档内容哈希
+            docx_type: 文档类型
+            chunk_num: 最大分块数
+            with_anchors: 是否返回锚点
+            token_budget: (目标token数, 最大token数)，按字符数分块时为None
+            previous_fingerprint: 上一版本的指纹，没有时为空字符串
+
+        Returns:
+            tuple: (分块结果, 版本信息 {"fingerprint", "previous_found", "changed_chunks", ...})
+        """
+        fingerprint = f"fp_{affinity[:24]}"
+        previous_state = None
+        if previous_fingerprint:
+            previous_state = cache.get_json(
+                "chunk_state", (previous_fingerprint, docx_type, CHUNK_CACHE_VERSION)
+            )
+            if previous_state is None:
+                self.logger.warning(f"未找到上一版本 {previous_fingerprint} 的分块状态，将完整分块")
+
+        self.logger.info("开始执行增量分段")
+        output = run_admitted_task(
+            "word-chunk",
+            INCREMENTAL_CHUNK_TASK,
+            blob,
+            docx_type,
+            chunk_num,
+            with_anchors,
+            token_budget,
+            previous_state,
+            affinity=affinity,
+            scope=similarity_scope(self.session),
+        )
+        if not cache.set_json("chunk_state", (fingerprint, docx_type, CHUNK_CACHE_VERSION), output["state"]):
+            self.logger.warning("分块状态未能保存到持久化缓存，下一版本将无法增量分块")
+
+        revision = {
+            "fingerprint": fingerprint,
+            "previous_fingerprint": previous_fingerprint or None,
+            "previous_found": previous_state is not None,
+            "changed_chunks": output["changed"],
+            "unchanged_chunks": len(output["chunks"]) - len(output["changed"]),
+        }
+        return output["chunks"], revision
+
+    def smart_chunk_paragraphs(self, doc_path, min_length=1000, doc_type=None, token_budget=None):
         """
         智能合并短段落，生成有意义的文本块，特别优化了合同和制度文件的处理。
         参数:
-            doc_path: Word文档路径
+            doc_path: Word文档路径或文档内容（字节）
             min_length: 被认为是有独立意义的最小段落长度（字符数）
             doc_type: 文档类型，可选"general"（通用）、"contract"（合同）、"policy"（制度文件）
+            token_budget: (目标token数, 最大token数)，提供时按估算的token数代替字符数衡量段落，
+                目标token数代替min_length，并把超过最大token数的块在元素、表格行或句子边界处切开
         返回:
             一个包含合并后文本块的列表
         """
-        doc = Document(doc_path)
+        return list(self.iter_smart_chunks(doc_path, min_length, doc_type, token_budget))
+
+    def iter_smart_chunks(self, doc_path, min_length=1000, doc_type=None, token_budget=None):
+        """
+        逐个产生smart_chunk_paragraphs的分块：一个块在下一个块开始之后就不会再变化
+        （表格只会追加到最后一个块），此时立即产生，不必等待整个文档处理完成。
+        参数同smart_chunk_paragraphs
+        """
+        # 从进程内共享缓存获取解析结果，同一文档多次分段时无需重复解析
+        parsed = get_parsed_document(doc_path)
         chunks = []  # 最终返回的块列表
+        emitted = 0  # 已产生的块数
         current_chunk = []  # 当前正在构建的块（由多个段落组成）
         consecutive_title_count = 0  # 连续标题计数器
         current_section_level = 0  # 当前章节层级（用于制度文件）
@@ -95,10 +355,21 @@ class WordChunkTool(Tool):
         else:
             special_markers = []
 
+        # 段落大小默认按字符数衡量；token预算模式下按估算的token数，以目标token数代替按文档类型调整的min_length
+        measure = len
+        if token_budget:
+            measure = estimate_tokens
+            min_length = token_budget[0]
+
         # 处理所有段落和表格
-        elements = self._get_document_elements(doc)
+        elements = self._get_document_elements(parsed)
         
         for element in elements:
+            # 除最后一个以外的块都已确定
+            while emitted < len(chunks) - 1:
+                yield from self._finish_chunk(chunks[emitted], token_budget)
+                emitted += 1
+
             element_type = element["type"]
             text = element["text"].strip()
             paragraph = element.get("paragraph")
@@ -106,11 +377,12 @@ class WordChunkTool(Tool):
             # 跳过完全空的段落（通常是格式性的换行）
             if not text:
                 continue
+            size = measure(text)
 
             # 使用增强的标题判断函数，传入文档类型
             is_heading = False
             if element_type == "paragraph" and paragraph:
-                is_heading = self.is_title(paragraph, doc_type=doc_type)
+                is_heading = self._classify_title(paragraph, doc_type)
             
 
             
@@ -126,6 +398,7 @@ class WordChunkTool(Tool):
 
             # 情况1：遇到一个标题
             if is_heading:
+                count("titles")
                 
                 consecutive_title_count += 1  # 增加连续标题计数
                 
@@ -144,12 +417,12 @@ class WordChunkTool(Tool):
                 elif doc_type == "contract":
                     if "条" in text:
                         # 提取条款号
-                        match = re.search(r"第([一二三四五六七八九十百千万\d]+)条", text)
+                        match = self.CLAUSE_NUMBER_RE.search(text)
                         if match:
                             current_clause_level = int(match.group(1)) if match.group(1).isdigit() else len(match.group(1))
                 
                 # 检查是否为数字标题（如1.1）
-                is_numbered_heading = re.match(r"^\d+(\.\d+)?\s*", text)
+                is_numbered_heading = self.NUMBERED_HEADING_RE.match(text)
                 
                 # 如果当前块不为空，且不是连续标题的情况，则保存当前块
                 if current_chunk and consecutive_title_count == 1:
@@ -157,7 +430,7 @@ class WordChunkTool(Tool):
                     if current_chunk and is_numbered_heading:
                         first_line = current_chunk[0].strip()
                         # 检查第一行是否为数字标题（如1.1）
-                        first_is_numbered = re.match(r"^(\d+(\.\d+)?)\s*", first_line)
+                        first_is_numbered = self.NUMBERED_LINE_RE.match(first_line)
                         if first_is_numbered:
                             # 获取当前标题的数字部分
                             current_num = text.split('.')[0]
@@ -198,13 +471,13 @@ class WordChunkTool(Tool):
                     current_chunk.append(text)
                     consecutive_title_count = 0  # 重置计数器
                 # 情况3：当前段落很短，且当前块不为空 -> 合并到当前块
-                elif len(text) < min_length and current_chunk:
+                elif size < min_length and current_chunk:
                     current_chunk.append(text)
                 # 情况4：当前段落很长 -> 它自己可以成为一个有意义的块
-                elif len(text) >= min_length and not current_chunk:
+                elif size >= min_length and not current_chunk:
                     chunks.append(text)
                 # 情况5：当前段落很长，但当前块已有内容 -> 结束当前块，并以此段落开始新块
-                elif len(text) >= min_length and current_chunk:
+                elif size >= min_length and current_chunk:
                     chunks.append("\n".join(current_chunk))
                     current_chunk = [text]
                 # 情况6：当前段落很短，且当前块为空 -> 开始一个新块（希望后续段落能合并进来）
@@ -214,11 +487,16 @@ class WordChunkTool(Tool):
         # 循环结束后，处理剩余的块
         if current_chunk:
             chunks.append("\n".join(current_chunk))
-            
+        for chunk in chunks[emitted:]:
+            yield from self._finish_chunk(chunk, token_budget)
 
+    @staticmethod
+    def _finish_chunk(chunk, token_budget):
+        """token预算模式：超过上限的块（多个短条款合并而成，或单个很长的段落、表格）切成不超过上限的片段"""
+        if token_budget:
+            return split_to_budget(chunk, token_budget[1])
+        return [chunk]
 
-        return chunks
-    
     def limit_chunks_to_max(self, chunks, max_chunks=30):
         """
         限制分段个数不超过指定数量，如果超过则按数学方法合并相邻段落。
@@ -286,67 +564,203 @@ class WordChunkTool(Tool):
 
         return result_chunks
 
-    def _get_document_elements(self, doc):
+    def limit_chunks_to_budget(self, chunks, max_chunks, target_tokens, max_tokens):
+        """
+        token预算模式下的分块数量控制：先把相邻的小块合并到不超过目标大小，
+        分块数仍超过max_chunks时在[目标大小, 最大大小]内寻找最小的容量重新合并，任何块都不超过最大大小
+
+        参数:
+            chunks: smart_chunk_paragraphs返回的分块（每块都不超过max_tokens）
+            max_chunks: 最大分段个数
+            target_tokens: 每块的目标token数
+            max_tokens: 每块的最大token数
+        返回:
+            合并后的分段列表
+        异常:
+            ValueError: 不超过最大大小时无法合并到max_chunks个以内
+        """
+        sizes = [estimate_tokens(chunk) for chunk in chunks]
+        groups = pack(sizes, target_tokens)
+        if len(groups) > max_chunks:
+            groups = balanced_pack(sizes, max_chunks, target_tokens, max_tokens)
+        if len(groups) > max_chunks:
+            self.reject_budget(len(groups), max_chunks, max_tokens)
+        merged = ["\n".join(chunks[i] for i in group) for group in groups]
+        set_value("chunk_tokens_max", max((sum(sizes[i] for i in group) for group in groups), default=0))
+        return merged
+
+    def reject_budget(self, needed, max_chunks, max_tokens):
+        """
+        token预算与分段数量冲突时拒绝本次分块：chunk_num是迭代节点能处理的上限，
+        返回更多的分块会让工作流无法迭代，因此不返回任何分块，由调用方调整参数
+
+        参数:
+            needed: 满足最大token数至少需要的分块数
+            max_chunks: 最大分段个数
+            max_tokens: 每块的最大token数
+        异常:
+            ValueError: 总是抛出，说明冲突和调整方法
+        """
+        count("chunk_num_exceeded")
+        message = (
+            f"每块不超过 {max_tokens} 个token时至少需要 {needed} 个分块，超过了分段数量 {max_chunks}，"
+            f"请增大max_tokens或chunk_num"
+        )
+        self.logger.warning(message)
+        raise ValueError(message)
+
+    def stream_limit_chunks(self, chunks, total, max_chunks, token_budget=None):
+        """
+        流式分段的数量控制：分块逐个到达，事先只知道第一遍估算的全部分块大小之和，
+        每个合并后的块确定后立即产生。每块的容量为剩余大小平均分到剩余块数上，最后一块容纳剩余的全部内容，
+        因此分块数不超过max_chunks
+
+        与limit_chunks_to_max（按块数平均合并）不同，这里按大小平均合并，
+        初始分块数不超过max_chunks时两者的结果通常相同。
+        token预算模式下能否合并到max_chunks个以内取决于每个初始分块的大小（分块边界由标题识别决定，
+        第一遍估算无法得到），为了不在产生部分分块之后才失败，先得到全部初始分块，
+        确定可行后再逐个产生，结果与非流式分段相同（见limit_chunks_to_budget）
+
+        参数:
+            chunks: iter_smart_chunks产生的分块
+            total: 全部分块的大小之和（字符数），token预算模式下不使用
+            max_chunks: 最大分段个数
+            token_budget: (目标token数, 最大token数)，按字符数分块时为None
+        返回:
+            逐个产生合并后的分块
+        异常:
+            ValueError: token预算模式下不超过最大token数时无法合并到max_chunks个以内，在产生第一块之前抛出
+        """
+        if token_budget:
+            chunks = list(chunks)
+            set_value("chunks_initial", len(chunks))
+            yield from self.limit_chunks_to_budget(chunks, max_chunks, *token_budget)
+            return
+
+        initial = 0
+        for group in stream_pack(((chunk, len(chunk)) for chunk in chunks), total, max_chunks):
+            initial += len(group)
+            yield "\n".join(chunk for chunk, _ in group)
+        set_value("chunks_initial", initial)
+
+    def chunk_anchors(self, parsed, chunks):
+        """
+        计算每个分块对应的正文元素范围和字符区间
+
+        分块由非空元素去掉首尾空白后的文本按顺序以换行连接而成（合并分块时同样以换行连接），
+        token预算模式下的片段是元素文本在换行、句子等边界处切开的连续部分，
+        因此按分块中以换行分隔的各段依次与元素文本对齐即可，不需要在分段过程中额外记录。
+
+        参数:
+            parsed: 共享缓存中的ParsedDocument对象
+            chunks: smart_chunk_paragraphs（以及limit_chunks_to_max）返回的分块文本
+        返回:
+            与chunks一一对应的列表，每项为
+            {"anchor": "起始元素序号-结束元素序号", "char_range": [起始偏移, 结束偏移]}。
+            元素序号是段落或表格在正文中的位置，同一文档不变；字符区间是该块在全文
+            （所有元素文本以换行连接）中的位置
+        """
+        return list(self.iter_chunk_anchors(parsed, chunks))
+
+    def iter_chunk_anchors(self, parsed, chunks):
+        """逐个产生chunk_anchors的结果，chunks可以是逐个到达的分块（流式分段时使用）"""
+        starts = []
+        offset = 0
+        for text in parsed.texts:
+            starts.append(offset)
+            offset += len(text) + 1
+
+        # (元素位置, 去掉首尾空白的文本, 开头空白的长度)
+        items = [
+            (i, text.strip(), len(text) - len(text.lstrip()))
+            for i, text in enumerate(parsed.texts)
+            if text.strip()
+        ]
+        position = 0  # 当前元素
+        offset = 0  # 当前元素中已对齐的字符数
+        for chunk in chunks:
+            # 上一块在元素末尾或换行处结束时，从下一个元素或下一行开始
+            while position < len(items) and (
+                offset == len(items[position][1]) or items[position][1][offset] == "\n"
+            ):
+                if offset == len(items[position][1]):
+                    position, offset = position + 1, 0
+                else:
+                    offset += 1
+            first, first_offset = position, offset
+            for k, segment in enumerate(chunk.split("\n")):
+                if k and position < len(items):
+                    # 块内的换行：元素之间、元素内部的换行，或合并时连接同一元素的两个片段（原文中没有换行）
+                    if offset == len(items[position][1]):
+                        position, offset = position + 1, 0
+                    elif items[position][1][offset] == "\n":
+                        offset += 1
+                if position >= len(items) or not items[position][1].startswith(segment, offset):
+                    raise ValueError("分块文本与文档元素无法对齐")
+                offset += len(segment)
+
+            first_pos, first_lead = items[first][0], items[first][2]
+            last_pos, last_lead = items[position][0], items[position][2]
+            yield {
+                "anchor": f"{parsed.elements[first_pos].index}-{parsed.elements[last_pos].index}",
+                "char_range": [
+                    starts[first_pos] + first_lead + first_offset,
+                    starts[last_pos] + last_lead + offset,
+                ],
+            }
+
+    def _get_document_elements(self, parsed):
         """
         提取文档中的所有段落和表格，按照它们在文档中出现的顺序返回。
         
         参数:
-            doc: Document对象
+            parsed: 共享缓存中的ParsedDocument对象
             
         返回:
             一个包含所有段落和表格的列表，每个元素是一个字典，包含type和text字段
             type可以是"paragraph"或"table"，text是段落或表格的文本内容
         """
         elements = []
-        
-        # 获取文档中的所有段落和表格，按照它们在文档中出现的顺序
-        # 使用document.element.body来获取正确的元素顺序
-        for element in doc.element.body:
-            if element.tag.endswith('p'):  # 段落元素
-                # 获取段落对象
-                paragraph = None
-                for p in doc.paragraphs:
-                    if p._element == element:
-                        paragraph = p
-                        break
-                
-                if paragraph:
-                    elements.append({
-                        "type": "paragraph",
-                        "text": paragraph.text,
-                        "paragraph": paragraph
-                    })
-            elif element.tag.endswith('tbl'):  # 表格元素
-                # 获取表格对象
-                table = None
-                for t in doc.tables:
-                    if t._element == element:
-                        table = t
-                        break
-                
-                if table:
-                    table_text = ""
-                    # 处理表格中的每一行
-                    for row in table.rows:
-                        row_text = []
-                        # 处理行中的每个单元格
-                        for cell in row.cells:
-                            # 处理单元格中的每个段落
-                            cell_text = []
-                            for paragraph in cell.paragraphs:
-                                cell_text.append(paragraph.text.strip())
-                            # 将单元格中的所有段落文本合并
-                            row_text.append(" | ".join(cell_text))
-                        # 将行中的所有单元格文本合并，并用换行符分隔
-                        table_text += "\t".join(row_text) + "\n"
-                    
-                    elements.append({
-                        "type": "table",
-                        "text": table_text.strip()
-                    })
-        
+        for element in parsed.elements:
+            if element.type == "paragraph":
+                elements.append({
+                    "type": "paragraph",
+                    "text": element.text,
+                    "paragraph": element.block
+                })
+            else:
+                elements.append({
+                    "type": "table",
+                    "text": element.text
+                })
+        set_value("paragraphs", sum(1 for e in elements if e["type"] == "paragraph"))
+        set_value("tables", sum(1 for e in elements if e["type"] == "table"))
         return elements
 
+    def _classify_title(self, paragraph, doc_type=None):
+        """
+        标题识别：按段落XML（文本、样式和直接格式）的摘要复用上一版本或近似重复文档的识别结果，
+        只有新增或修改过的段落才调用is_title
+
+        参数:
+            paragraph: Word文档段落对象
+            doc_type: 文档类型
+        返回:
+            bool: 是否为标题
+        """
+        if self._title_record is None:
+            return self.is_title(paragraph, doc_type=doc_type)
+
+        digest = hashlib.blake2b(etree.tostring(paragraph._p), digest_size=8).hexdigest()
+        is_heading = (self._title_memo or {}).get(digest)
+        if is_heading is None:
+            is_heading = self.is_title(paragraph, doc_type=doc_type)
+            count("titles_classified")
+        else:
+            count("titles_reused")
+        self._title_record[digest] = is_heading
+        return is_heading
+
     def is_title(self, paragraph, median_size=10, doc_type=None):
         """
         增强版标题识别函数，特别优化了合同和制度文件的标题识别
@@ -365,7 +779,7 @@ class WordChunkTool(Tool):
             return False
             
         # 排除以特殊符号开头的段落（这些通常不是标题）
-        if re.match(r"^《|^》|^\"|^'|^【|^】|^〔|^〕|^〖|^〗|^•|^·|^◇|^○|^□|^■|^▷|^▶|^※|^§|^№|^★|^☆|^[（(][^）)]*[）)]|^--+|^—+|^==+|^__+", text):
+        if self.TITLE_EXCLUDE_RE.match(text):
             return False
 
         # 1. 增强样式检测（增加常见样式别名）
@@ -377,31 +791,9 @@ class WordChunkTool(Tool):
 
         # 2. 合同/制度文件特有的标题模式
         if doc_type in ["contract", "policy"]:
-            # 合同特有模式
-            contract_patterns = [
-                r"^第[一二三四五六七八九十百千万\d]+条[：: ]",  # 第X条
-                r"^(甲方|乙方|丙方|丁方)[：: ]",              # 合同方
-                r"^合同编号[：: ]",                          # 合同编号
-                r"^签订日期[：: ]",                          # 签订日期
-                r"^签订地点[：: ]",                          # 签订地点
-                r"^鉴于[：: ]",                              # 鉴于条款
-                r"^附件[一二三四五六七八九十百千万\d]*[：: ]",  # 附件
-            ]
-            
-            # 制度文件特有模式
-            policy_patterns = [
-                r"^第[一二三四五六七八九十百千万\d]+章[：: ]",   # 第X章
-                r"^第[一二三四五六七八九十百千万\d]+节[：: ]",   # 第X节
-                r"^第[一二三四五六七八九十百千万\d]+款[：: ]",   # 第X款
-                r"^第[一二三四五六七八九十百千万\d]+项[：: ]",   # 第X项
-                r"^[（(][一二三四五六七八九十百千万\d]+[）)][：: ]",  # (X)
-                r"^总则[：: ]",                               # 总则
-                r"^附则[：: ]",                               # 附则
-            ]
-            
             # 根据文档类型选择模式
-            patterns = contract_patterns if doc_type == "contract" else policy_patterns
-            if any(re.match(p, text) for p in patterns):
+            patterns = self.CONTRACT_TITLE_PATTERNS if doc_type == "contract" else self.POLICY_TITLE_PATTERNS
+            if any(p.match(text) for p in patterns):
                 return True
         
         # 3. 居中对齐检测（新增）
@@ -412,17 +804,9 @@ class WordChunkTool(Tool):
                     return True
 
         # 4. 重构正则表达式（修改：不将1.1.1这样的小级标题识别为标题）
-        patterns = [
-            r"^\d+\.\d*\s*",              # 一级或二级标题 1. 或 1.1
-            r"^[IVXLCDM]+\.\s",            # 罗马数字 I.
-            r"^第[\u4e00-\u9fa5\d]+[章节条]", # 第X章/节/条
-            r"^[一二三四五六七八九十百千万]+[、.]\s?", # 中文序号
-            r"^[A-Z]{2,}[A-Z\s]*\b",       # 全大写短语（至少2字母）
-            r"^附 ?录\s?[A-Z]：?"            # 附录类标题
-        ]
-        if any(re.match(p, text) for p in patterns):
+        if any(p.match(text) for p in self.GENERAL_TITLE_PATTERNS):
             # 检查是否为三级及以上数字标题（如1.1.1），如果是则不视为标题
-            if re.match(r"^\d+(\.\d+){2,}\s*", text):
+            if self.DEEP_NUMBERED_TITLE_RE.match(text):
                 return False
             return True
 
@@ -439,13 +823,21 @@ class WordChunkTool(Tool):
             for run in paragraph.runs:
                 font = run.font
                 if not font: continue
+
+                # 直接格式中没有字体信息时，使用Run引用的字符样式（如pdf转换后提取的共享样式）
+                font_name = font.name
+                font_size = font.size
+                if (font_name is None or font_size is None) and run.style is not None:
+                    style_font = run.style.font
+                    font_name = font_name or style_font.name
+                    font_size = font_size or style_font.size
                 
                 # 黑体检测增强
-                if font.name and any(k in font.name for k in ["黑体", "Hei", "Heiti", "SimHei"]):
+                if font_name and any(k in font_name for k in ["黑体", "Hei", "Heiti", "SimHei"]):
                     hei_font_count += 1
                     
                 # 动态字体检测（增加中位数检测）
-                if font.size and font.size.pt > median_size * 1.6:
+                if font_size and font_size.pt > median_size * 1.6:
                     large_font_count += 1
             
             # 阈值优化（50%以上run符合特征）
@@ -473,3 +865,291 @@ class WordChunkTool(Tool):
 
 
         return False
+
+
+def _chunk_task(
+    blob: bytes,
+    doc_type: str,
+    chunk_num: int,
+    with_anchors: bool = False,
+    token_budget: Optional[tuple] = None,
+    scope: str = "",
+) -> dict:
+    """
+    分块任务（在工作进程中执行）：智能分段并把分段数量限制在chunk_num以内，
+    近似重复文档索引中有相似文档时复用其标题识别结果
+
+    Args:
+        blob: Word文档内容
+        doc_type: 文档类型（general/contract/policy）
+        chunk_num: 最大分块数
+        with_anchors: 是否同时返回每个分块的锚点和字符区间
+        token_budget: (目标token数, 最大token数)，提供时按token预算分块
+        scope: 近似重复文档索引的范围（见similarity_scope）
+
+    Returns:
+        dict: {"1": 第一块文本, "2": ...}；with_anchors时为
+            {"1": {"text": 第一块文本, "anchor": "3-17", "char_range": [120, 980]}, ...}
+    """
+    tool = WordChunkTool.from_credentials({})
+    chunks, _ = _chunk_with_title_memo(
+        tool, blob, doc_type, chunk_num, with_anchors, token_budget, scope=scope
+    )
+    return chunks
+
+
+def _chunk_document(
+    tool,
+    blob: bytes,
+    doc_type: str,
+    chunk_num: int,
+    with_anchors: bool,
+    token_budget: Optional[tuple] = None,
+) -> dict:
+    """分块任务的公共部分：智能分段、限制分块数量并按需计算锚点"""
+    # 直接从文档内容中按需读取所需部件，无需写入临时文件
+    with stage("classify"):
+        chunks = tool.smart_chunk_paragraphs(blob, doc_type=doc_type, token_budget=token_budget)
+    tool.logger.info(f"初始分段完成，共生成 {len(chunks)} 个段落")
+    set_value("chunks_initial", len(chunks))
+
+    # 限制分段个数不超过30个（token预算模式下同时保证每块不超过最大token数）
+    with stage("merge"):
+        if token_budget:
+            chunks = tool.limit_chunks_to_budget(chunks, chunk_num, *token_budget)
+        else:
+            chunks = tool.limit_chunks_to_max(chunks, max_chunks=chunk_num)
+    tool.logger.info(f"分段数量限制完成，最终段落数: {len(chunks)}")
+    set_value("chunks", len(chunks))
+
+    cache_stats = get_document_cache().stats()
+    tool.logger.info(
+        f"文档缓存: 命中 {cache_stats['hits']} 次，未命中 {cache_stats['misses']} 次，"
+        f"淘汰 {cache_stats['evictions']} 次，当前 {cache_stats['entries']} 个文档"
+        f"（约 {cache_stats['bytes'] // 1024} KB）"
+    )
+    if with_anchors:
+        anchors = tool.chunk_anchors(get_parsed_document(blob), chunks)
+        return {
+            str(i + 1): dict(text=chunk, **anchor)
+            for i, (chunk, anchor) in enumerate(zip(chunks, anchors))
+        }
+    return {str(i + 1): chunk for i, chunk in enumerate(chunks)}
+
+
+def _chunk_with_title_memo(
+    tool,
+    blob: bytes,
+    doc_type: str,
+    chunk_num: int,
+    with_anchors: bool,
+    token_budget: Optional[tuple] = None,
+    previous_state: Optional[dict] = None,
+    record: bool = False,
+    scope: str = "",
+) -> tuple:
+    """
+    复用已有的标题识别结果分块：优先使用上一版本的分块状态，没有（或样式已变化）时
+    从近似重复文档索引中查找相似文档的识别结果；分块后把本文档的识别结果登记到索引
+
+    Args:
+        tool: WordChunkTool实例
+        blob: Word文档内容
+        doc_type: 文档类型
+        chunk_num: 最大分块数
+        with_anchors: 是否同时返回锚点
+        token_budget: (目标token数, 最大token数)，按字符数分块时为None
+        previous_state: 上一版本的分块状态，没有时为None
+        record: 索引关闭时是否仍然记录本次的标题识别结果（增量分块需要保存状态）
+        scope: 近似重复文档索引的范围（见similarity_scope）
+
+    Returns:
+        tuple: (分块结果, 标题识别状态 {"styles", "titles", "others"}；没有记录时为None)
+    """
+    styles, signature = _use_title_memo(tool, blob, doc_type, scope, previous_state, record)
+    chunks = _chunk_document(tool, blob, doc_type, chunk_num, with_anchors, token_budget)
+    return chunks, _save_title_memo(tool, blob, doc_type, scope, styles, signature)
+
+
+def _use_title_memo(
+    tool,
+    blob: bytes,
+    doc_type: str,
+    scope: str,
+    previous_state: Optional[dict] = None,
+    record: bool = False,
+) -> tuple:
+    """分块前设置tool的标题识别结果复用和记录（参数见_chunk_with_title_memo），返回 (样式摘要, 文档签名)"""
+    styles = _styles_digest(blob)
+    memo = None
+    if previous_state and previous_state.get("styles") == styles:
+        memo = _title_memo(previous_state)
+
+    index = get_similarity_index(scope)
+    signature = None
+    if index.enabled:
+        with stage("similarity"):
+            signature = document_signature(get_parsed_document(blob).texts)
+            if memo is None:
+                memo = _similar_title_memo(index, signature, doc_type, styles)
+
+    if record or signature is not None:
+        tool._title_record = {}
+    tool._title_memo = memo
+    return styles, signature
+
+
+def _save_title_memo(
+    tool, blob: bytes, doc_type: str, scope: str, styles: str, signature
+) -> Optional[dict]:
+    """分块后把本文档的标题识别结果登记到近似重复文档索引，返回标题识别状态（没有记录时为None）"""
+    if tool._title_record is None:
+        return None
+
+    titles = tool._title_record
+    state = {
+        "styles": styles,
+        "titles": [digest for digest, is_heading in titles.items() if is_heading],
+        "others": [digest for digest, is_heading in titles.items() if not is_heading],
+    }
+    with stage("similarity"):
+        get_similarity_index(scope).save_state(
+            document_key(blob)[:24], signature, f"titles:{doc_type}", state
+        )
+    return state
+
+
+def _chunk_stream_task(
+    blob: bytes,
+    doc_type: str,
+    chunk_num: int,
+    with_anchors: bool = False,
+    token_budget: Optional[tuple] = None,
+    scope: str = "",
+) -> Iterator[tuple]:
+    """
+    流式分块任务（在工作进程中执行）：每确定一个分块就产生该块，主进程不必等待整个文档分段完成
+
+    分两遍：第一遍只用元素文本估算全部分块的大小之和（不识别标题，很快），
+    第二遍在识别标题、组装分块的同时按剩余大小和剩余块数决定每块的大小（见stream_limit_chunks），
+    不需要先得到全部分块就能保证分块数不超过chunk_num。
+    token预算模式下不做第一遍，先得到全部初始分块、确定能满足chunk_num后再逐个产生
+
+    Args:
+        blob: Word文档内容
+        doc_type: 文档类型（general/contract/policy）
+        chunk_num: 最大分块数
+        with_anchors: 是否同时返回每个分块的锚点和字符区间
+        token_budget: (目标token数, 最大token数)，提供时按token预算分块
+        scope: 近似重复文档索引的范围（见similarity_scope）
+
+    Returns:
+        Iterator[tuple]: 逐个产生 (分块编号, 分块文本)；with_anchors时分块为
+            {"text": 分块文本, "anchor": "3-17", "char_range": [120, 980]}
+    """
+    tool = WordChunkTool.from_credentials({})
+    styles, signature = _use_title_memo(tool, blob, doc_type, scope)
+    parsed = get_parsed_document(blob)
+    total = 0
+    if not token_budget:
+        with stage("estimate"):
+            total = len("\n".join(text.strip() for text in parsed.texts if text.strip()))
+
+    chunks = tool.stream_limit_chunks(
+        tool.iter_smart_chunks(blob, doc_type=doc_type, token_budget=token_budget),
+        total,
+        chunk_num,
+        token_budget,
+    )
+    if with_anchors:
+        chunks, located = itertools.tee(chunks)
+        chunks = (
+            dict(text=chunk, **anchor)
+            for chunk, anchor in zip(chunks, tool.iter_chunk_anchors(parsed, located))
+        )
+    produced = 0
+    with stage("classify"):
+        for produced, chunk in enumerate(chunks, 1):
+            yield str(produced), chunk
+    tool.logger.info(f"流式分段完成，共生成 {produced} 个段落")
+    set_value("chunks", produced)
+    _save_title_memo(tool, blob, doc_type, scope, styles, signature)
+
+
+def _title_memo(state: dict) -> dict:
+    """由标题识别状态构造 {段落XML摘要: 是否标题}"""
+    memo = dict.fromkeys(state.get("others", []), False)
+    memo.update(dict.fromkeys(state.get("titles", []), True))
+    return memo
+
+
+def _similar_title_memo(index, signature, doc_type: str, styles: str) -> Optional[dict]:
+    """近似重复文档索引中相似文档（文档类型和样式都相同）的标题识别结果，没有时返回None"""
+    name = f"titles:{doc_type}"
+    found = index.find(signature, name)
+    if found is None:
+        return None
+    doc_id, similarity = found
+    state = index.load_state(doc_id, name)
+    if not state or state.get("styles") != styles:
+        return None
+    set_value("similarity", round(similarity, 3))
+    return _title_memo(state)
+
+
+def _chunk_digest(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def _styles_digest(blob: bytes) -> str:
+    """样式定义的摘要：样式变化时其他版本或其他文档的标题识别结果不再可信"""
+    styles = get_parsed_document(blob).document.styles.element
+    return hashlib.blake2b(etree.tostring(styles), digest_size=8).hexdigest()
+
+
+def _incremental_chunk_task(
+    blob: bytes,
+    doc_type: str,
+    chunk_num: int,
+    with_anchors: bool,
+    token_budget: Optional[tuple] = None,
+    previous_state: Optional[dict] = None,
+    scope: str = "",
+) -> dict:
+    """
+    增量分块任务（在工作进程中执行）：复用上一版本未变化段落的标题识别结果，
+    分块的组装仍完整执行（只是字符串操作），保证结果与完整分块一致
+
+    Args:
+        blob: Word文档内容
+        doc_type: 文档类型
+        chunk_num: 最大分块数
+        with_anchors: 是否同时返回锚点
+        token_budget: (目标token数, 最大token数)，按字符数分块时为None
+        previous_state: 上一版本的分块状态，没有时为None
+        scope: 近似重复文档索引的范围（见similarity_scope）
+
+    Returns:
+        dict: {"chunks": 分块结果, "changed": 有变化的分块编号列表, "state": 本版本的分块状态}。
+            状态为 {"styles": 样式摘要, "titles": [标题段落摘要], "others": [非标题段落摘要],
+            "chunks": [分块文本摘要]}
+    """
+    tool = WordChunkTool.from_credentials({})
+    chunks, state = _chunk_with_title_memo(
+        tool, blob, doc_type, chunk_num, with_anchors, token_budget, previous_state, record=True, scope=scope
+    )
+
+    digests = [
+        _chunk_digest(chunk["text"] if with_anchors else chunk) for chunk in chunks.values()
+    ]
+    previous_chunks = set((previous_state or {}).get("chunks", []))
+    changed = [
+        chunk_id for chunk_id, digest in zip(chunks, digests) if digest not in previous_chunks
+    ]
+    set_value("chunks_changed", len(changed))
+    return {"chunks": chunks, "changed": changed, "state": dict(state, chunks=digests)}
+
+
+register_task(CHUNK_TASK, _chunk_task)
+register_task(CHUNK_STREAM_TASK, _chunk_stream_task)
+register_task(INCREMENTAL_CHUNK_TASK, _incremental_chunk_task)
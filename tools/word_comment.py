@@ -1,6 +1,5 @@
 from collections.abc import Generator
-from typing import Any
-import tempfile
+from typing import Any, Optional
 import os
 import json
 import re
@@ -9,17 +8,61 @@ from difflib import SequenceMatcher
 from dify_plugin.file.file import File
 from dify_plugin import Tool
 from dify_plugin.entities.tool import ToolInvokeMessage
-from docx import Document
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.oxml.ns import qn
+from docx.table import Table
+from docx.text.paragraph import Paragraph
 import docx
 
-from tools.utils.logger_utils import get_logger
-from tools.utils.file_utils import get_meta_data, sanitize_filename
+from tools.utils.logger_utils import EventSummary, get_logger
+from tools.utils.document_store import DocumentHandleError, StoredDocument, document_owner, get_document_store
+from tools.utils.file_utils import get_meta_data, sanitize_filename, temporary_io_files
+from tools.utils.docx_save_utils import document_parts, save_document
+from tools.utils.document_cache import document_key, document_texts, open_document
+from tools.utils.admission import run_admitted_task
+from tools.utils.instrumentation import Metrics, collect_metrics, count, set_value, stage
+from tools.utils.persistent_cache import get_persistent_cache
+from tools.utils.process_pool import register_task
+from tools.utils.similarity_index import (
+    document_signature,
+    get_similarity_index,
+    similarity_scope,
+    text_digest,
+)
+
+# 提交到工作进程池的任务名
+ADD_COMMENTS_TASK = "word_comment.add_comments"
+# 匹配计划在持久化缓存中的版本，匹配算法变化时递增，使旧计划失效
+MATCH_PLAN_VERSION = 1
 
 
 class WordCommentTool(Tool):
     # 获取当前模块的日志记录器
     logger = get_logger(__name__)
 
+    # 匹配规则（类加载时编译一次）
+    WHITESPACE_RE = re.compile(r"\s+")
+    SENTENCE_SPLIT_RE = re.compile(r"[。！？.!?；;,、]+")
+    WORD_RE = re.compile(r"\b\w+\b")
+    # word-chunk返回的锚点："起始元素序号-结束元素序号"
+    ANCHOR_RE = re.compile(r"^(\d+)-(\d+)$")
+
+    # 单段落批注逐次匹配的汇总日志，只在add_native_comments_to_document执行期间存在
+    _match_log: Optional[EventSummary] = None
+    # 单段落批注的匹配计划 {"hits": {摘要: {段落文本摘要: [匹配文本或None, 相似度]}}}，
+    # 重放时直接使用计划中的结果，否则记录本次的匹配结果
+    _match_plan: Optional[dict] = None
+    _match_plan_replay = False
+    # 最近一次计算的 (段落文本, 文本摘要)，同一段落的多个摘要共用
+    _plan_digest: Optional[tuple] = None
+    # 近似重复文档的匹配计划 {"keys": {摘要的摘要}, "paragraphs": {段落文本摘要}, "hits": ...}，
+    # 其中评估过的摘要和段落直接复用结果；以及本次评估过的段落文本摘要和匹配位置
+    # {摘要的摘要: {段落文本摘要: [起始, 结束, 相似度]}}（见_planned_fuzzy_match），索引中不保存任何原文
+    _reference_plan: Optional[dict] = None
+    _plan_paragraphs: Optional[set] = None
+    _plan_spans: Optional[dict] = None
+    _key_digests: Optional[dict] = None
+
     def _invoke(self, tool_parameters: dict[str, Any]) -> Generator[ToolInvokeMessage]:
         # 检查python-docx版本
         self.logger.info(f"当前python-docx版本: {docx.__version__}")
@@ -27,21 +70,36 @@ class WordCommentTool(Tool):
         # 获取上传的Word文件
         word_content = tool_parameters.get("word_content")
         comments_json: str = tool_parameters.get("comments_json", "{}")
+        return_metrics = tool_parameters.get("return_metrics", False)
+        metrics = Metrics(request_id=self.session.session_id)
+
+        # 没有上传文件时，从本地文档存储中取回register_document登记的文档
+        document_handle = (tool_parameters.get("document_handle") or "").strip()
+        if not word_content and document_handle:
+            try:
+                word_content = get_document_store().get(document_handle, document_owner(self))
+            except DocumentHandleError as e:
+                self.logger.error(str(e))
+                yield self.create_text_message(str(e))
+                return
 
         if not word_content:
             self.logger.error("未提供Word文件")
-            yield self.create_text_message("请提供Word文件")
+            yield self.create_text_message("请提供Word文件或文档句柄")
             return
 
         # 检查文件类型
-        if not isinstance(word_content, File):
+        if not isinstance(word_content, (File, StoredDocument)):
             self.logger.error("无效的文件格式，期望File对象")
             yield self.create_text_message("无效的文件格式，期望File对象")
             return
 
         # 解析批注JSON
+        # 锚定批注 (锚点, 原文, 批注)：锚点是word-chunk在anchors模式下返回的段落范围
+        anchored_comments = []
         try:
-            comments_data = json.loads(comments_json)
+            with metrics.stage("decode"):
+                comments_data = json.loads(comments_json)
 
             # 支持新的数组格式：[{"原文1":"批注1","原文2":"批注2"},{...}]
             if isinstance(comments_data, list):
@@ -51,6 +109,19 @@ class WordCommentTool(Tool):
                 total_comments = 0
 
                 for i, comment_group in enumerate(comments_data):
+                    if isinstance(comment_group, dict) and "anchor" in comment_group:
+                        # 锚定批注：{"anchor": "3-17", "quote": "原文", "comment": "批注"}
+                        anchor = str(comment_group.get("anchor") or "").strip()
+                        quote = str(comment_group.get("quote") or "").strip()
+                        comment = str(comment_group.get("comment") or "").strip()
+                        if anchor and quote and comment:
+                            anchored_comments.append((anchor, quote, comment))
+                        else:
+                            self.logger.warning(
+                                f"批注JSON数组中第{i+1}个锚定批注缺少anchor、quote或comment，已跳过"
+                            )
+                        continue
+
                     if isinstance(comment_group, dict):
                         # 过滤掉空对象和无效的批注对
                         valid_comments = {}
@@ -83,10 +154,11 @@ class WordCommentTool(Tool):
                         )
 
                 self.logger.info(
-                    f"解析数组格式批注JSON成功，处理了 {processed_groups} 个有效对象组，共合并 {len(comments_dict)} 个批注对"
+                    f"解析数组格式批注JSON成功，处理了 {processed_groups} 个有效对象组，共合并 {len(comments_dict)} 个批注对，"
+                    f"锚定批注 {len(anchored_comments)} 个"
                 )
 
-                if len(comments_dict) == 0:
+                if len(comments_dict) == 0 and not anchored_comments:
                     self.logger.warning("JSON数组中未找到有效的批注对")
                     yield self.create_text_message(
                         "JSON数组中未找到有效的批注对，请检查数据格式"
@@ -147,35 +219,38 @@ class WordCommentTool(Tool):
         )
 
         try:
-            # 创建临时文件保存上传的Word文件
-            with tempfile.NamedTemporaryFile(
-                delete=False, suffix=".docx"
-            ) as temp_input_file:
-                # 获取文件内容（字节）并写入临时文件
-                temp_input_file.write(word_content.blob)
-                temp_input_path = temp_input_file.name
-
-            # 创建临时文件保存处理后的Word文件
-            with tempfile.NamedTemporaryFile(
-                delete=False, suffix=".docx"
-            ) as temp_output_file:
-                temp_output_path = temp_output_file.name
-
-            # 调用批注添加函数
+            with metrics.stage("decode"):
+                blob = word_content.blob
+                affinity = document_key(blob)
+
+            # 匹配结果只取决于文档、批注原文和阈值（与批注内容无关），
+            # 同一文档再次批注时从插件存储取回匹配计划，跳过单段落批注的模糊匹配
+            cache = get_persistent_cache(self.session)
+            plan_key = (affinity, sorted(comments_dict), similarity_threshold, MATCH_PLAN_VERSION)
+            with collect_metrics(metrics):
+                match_plan = cache.get_json("match_plan", plan_key)
+            if match_plan is not None:
+                self.logger.info("命中持久化缓存，按之前的匹配计划添加批注")
+
+            # 批注匹配是CPU密集的工作，交给工作进程池执行，不阻塞其他请求
             self.logger.info("开始添加批注到Word文档")
-            comment_count = self.add_native_comments_to_document(
-                temp_input_path,
-                temp_output_path,
-                comments_dict,
-                author,
-                similarity_threshold,
-            )
+            with collect_metrics(metrics):
+                docx_blob, comment_count, new_plan = run_admitted_task(
+                    "word_comment",
+                    ADD_COMMENTS_TASK,
+                    blob,
+                    comments_dict,
+                    author,
+                    similarity_threshold,
+                    match_plan,
+                    anchored_comments,
+                    affinity=affinity,
+                    scope=similarity_scope(self.session),
+                )
+                if new_plan is not None:
+                    cache.set_json("match_plan", plan_key, new_plan)
             self.logger.info(f"成功添加了 {comment_count} 个批注")
 
-            # 读取处理后的Word文件内容
-            with open(temp_output_path, "rb") as docx_file:
-                docx_blob = docx_file.read()
-
             # 处理自定义文件名
             processed_filename = None
             if custom_filename:
@@ -200,10 +275,9 @@ class WordCommentTool(Tool):
                 ),
             )
 
-            # 清理临时文件
-            os.unlink(temp_input_path)
-            os.unlink(temp_output_path)
-            self.logger.info("Word批注处理完成，临时文件已清理")
+            if return_metrics:
+                yield self.create_json_message({"metrics": metrics.report()})
+            self.logger.info("Word批注处理完成")
 
         except Exception as e:
             self.logger.exception("处理Word文档批注时发生异常")
@@ -221,8 +295,8 @@ class WordCommentTool(Tool):
             float: 相似度，范围0-1
         """
         # 清理文本，去除多余空格和标点符号对比
-        clean_text1 = re.sub(r"\s+", "", text1.strip())
-        clean_text2 = re.sub(r"\s+", "", text2.strip())
+        clean_text1 = self.WHITESPACE_RE.sub("", text1.strip())
+        clean_text2 = self.WHITESPACE_RE.sub("", text2.strip())
 
         # 使用SequenceMatcher计算相似度
         similarity = SequenceMatcher(None, clean_text1, clean_text2).ratio()
@@ -276,8 +350,8 @@ class WordCommentTool(Tool):
         best_similarity = 0.0
 
         # 1. 尝试标准化后的精确匹配（去除多余空格和标点）
-        normalized_target = re.sub(r"\s+", " ", target_text.strip())
-        normalized_paragraph = re.sub(r"\s+", " ", paragraph_text.strip())
+        normalized_target = self.WHITESPACE_RE.sub(" ", target_text.strip())
+        normalized_paragraph = self.WHITESPACE_RE.sub(" ", paragraph_text.strip())
 
         if normalized_target in normalized_paragraph:
             # 找到标准化后的匹配，简化位置映射
@@ -291,7 +365,7 @@ class WordCommentTool(Tool):
             return True, matched_text, 1.0
 
         # 2. 改进的句子分割策略，支持更多标点符号
-        sentences = re.split(r"[。！？.!?；;,、]+", paragraph_text)
+        sentences = self.SENTENCE_SPLIT_RE.split(paragraph_text)
 
         # 3. 尝试单个句子匹配
         for sentence in sentences:
@@ -358,7 +432,7 @@ class WordCommentTool(Tool):
         # 6. 如果仍然没有找到匹配，尝试关键词匹配
         if not best_match:
             # 提取目标文本中的关键词（去除常见停用词）
-            target_words = re.findall(r"\b\w+\b", target_text.lower())
+            target_words = self.WORD_RE.findall(target_text.lower())
             # 简单过滤掉一些常见词
             stop_words = {
                 "的",
@@ -422,7 +496,7 @@ class WordCommentTool(Tool):
 
             if key_words:
                 # 计算段落中包含的关键词比例
-                paragraph_words = re.findall(r"\b\w+\b", paragraph_text.lower())
+                paragraph_words = self.WORD_RE.findall(paragraph_text.lower())
                 matched_words = [word for word in key_words if word in paragraph_words]
 
                 if matched_words:
@@ -714,7 +788,13 @@ class WordCommentTool(Tool):
         return False, [], [], 0.0
 
     def _process_multi_paragraph_comments(
-        self, doc, multi_paragraph_comments, author, initials, similarity_threshold=0.7
+        self,
+        doc,
+        multi_paragraph_comments,
+        author,
+        initials,
+        similarity_threshold=0.7,
+        paragraphs=None,
     ):
         """
         处理多段落批注（新增功能）
@@ -725,6 +805,7 @@ class WordCommentTool(Tool):
             author: 批注者
             initials: 批注者缩写
             similarity_threshold: 相似度阈值
+            paragraphs: 只在这些段落中查找（锚定批注），默认为文档的全部段落
 
         Returns:
             int: 成功添加的批注数量
@@ -733,7 +814,9 @@ class WordCommentTool(Tool):
 
         # 准备所有段落的列表（不包括表格）
         all_paragraphs = [
-            (para, para.text.strip()) for para in doc.paragraphs if para.text.strip()
+            (para, para.text.strip())
+            for para in (doc.paragraphs if paragraphs is None else paragraphs)
+            if para.text.strip()
         ]
 
         self.logger.info(
@@ -809,8 +892,10 @@ class WordCommentTool(Tool):
                 continue
 
             # 如果多段落匹配都失败，记录日志
+            count("multi_paragraph_misses")
             self.logger.warning(f"多段落批注未找到匹配: '{summary[:50]}...'")
 
+        set_value("multi_paragraph_added", comment_count)
         self.logger.info(f"多段落批注处理完成，成功添加 {comment_count} 个批注")
         return comment_count
 
@@ -1110,10 +1195,11 @@ class WordCommentTool(Tool):
         if not paragraph_text.strip():
             return comment_count
 
-        self.logger.debug(f"正在处理段落：{paragraph_text[:100]}...")
+        self.logger.debug("正在处理段落：%.100s...", paragraph_text)
 
         # 统计在当前段落中找到的批注数量
-        found_comments = []
+        found_comments = 0
+        match_log = self._match_log
 
         for summary, comment_text in comments_dict.items():
             # 跳过空的或无效的批注
@@ -1121,21 +1207,24 @@ class WordCommentTool(Tool):
                 continue
 
             # 使用模糊匹配查找相似的文本
-            found, matched_text, similarity = self._find_fuzzy_match(
-                summary, paragraph_text, threshold=similarity_threshold
+            found, matched_text, similarity = self._planned_fuzzy_match(
+                summary, paragraph_text, similarity_threshold
             )
 
             if found:
-                found_comments.append((summary, comment_text, matched_text, similarity))
+                count("match_hits")
+                found_comments += 1
 
+                # 逐次匹配只记录DEBUG日志（参数延迟格式化），INFO级别只在处理结束后输出汇总
                 if similarity == 1.0:
-                    self.logger.debug(f"在段落中精确匹配到摘要: '{summary[:50]}...'")
+                    self.logger.debug("在段落中精确匹配到摘要: '%.50s...'", summary)
                 else:
-                    self.logger.info(
-                        f"在段落中模糊匹配到摘要 (相似度: {similarity:.2%}):"
+                    self.logger.debug(
+                        "在段落中模糊匹配到摘要 (相似度: %.2f%%): '%.50s...' -> '%.50s...'",
+                        similarity * 100,
+                        summary,
+                        matched_text,
                     )
-                    self.logger.info(f"  原摘要: '{summary[:50]}...'")
-                    self.logger.info(f"  匹配文本: '{matched_text[:50]}...'")
 
                 try:
                     # 使用匹配到的文本添加批注
@@ -1144,27 +1233,161 @@ class WordCommentTool(Tool):
                     )
                     if success:
                         comment_count += 1
-                        self.logger.info(
-                            f"成功为摘要 '{summary[:30]}...' 添加批注 (相似度: {similarity:.2%})"
-                        )
+                        if match_log is not None:
+                            match_log.add(
+                                "精确匹配" if similarity == 1.0 else "模糊匹配",
+                                None
+                                if similarity == 1.0
+                                else f"'{summary[:30]}...' ({similarity:.2%})",
+                            )
                     else:
-                        self.logger.warning(f"为摘要 '{summary[:30]}...' 添加批注失败")
+                        if match_log is not None:
+                            match_log.add("添加失败")
+                        self.logger.warning("为摘要 '%.30s...' 添加批注失败", summary)
                 except Exception as e:
-                    self.logger.warning(
-                        f"为摘要 '{summary[:30]}...' 添加批注时出错: {str(e)}"
-                    )
+                    if match_log is not None:
+                        match_log.add("添加出错")
+                    self.logger.warning("为摘要 '%.30s...' 添加批注时出错: %s", summary, e)
                     continue
             else:
                 # 记录未找到匹配的情况
-                self.logger.debug(f"未找到匹配 (相似度 < 80%): '{summary[:50]}...'")
+                count("match_misses")
+                self.logger.debug("未找到匹配 (相似度 < 80%%): '%.50s...'", summary)
 
         if found_comments:
             self.logger.debug(
-                f"在当前段落中找到 {len(found_comments)} 个匹配的批注，成功添加 {comment_count} 个"
+                "在当前段落中找到 %d 个匹配的批注，成功添加 %d 个", found_comments, comment_count
             )
 
         return comment_count
 
+    def _process_anchored_comments(
+        self, doc, anchored_comments, author, initials, similarity_threshold=0.8
+    ):
+        """
+        处理锚定批注：只在锚点范围内的段落和表格中查找原文，耗时与分块大小成正比而不是整个文档
+
+        Args:
+            doc: Word文档对象
+            anchored_comments: [(锚点, 原文, 批注)]，锚点为"起始元素序号-结束元素序号"
+            author: 批注者
+            initials: 批注者缩写
+            similarity_threshold: 相似度阈值
+
+        Returns:
+            int: 成功添加的批注数量
+        """
+        comment_count = 0
+        body = doc.element.body
+        blocks = list(body)
+
+        for anchor, quote, comment_text in anchored_comments:
+            match = self.ANCHOR_RE.match(anchor)
+            start, end = (int(match.group(1)), int(match.group(2))) if match else (0, -1)
+            if not match or start > end or end >= len(blocks):
+                count("anchor_invalid")
+                self.logger.warning(f"无效的批注锚点 '{anchor[:30]}'，已跳过: '{quote[:30]}...'")
+                continue
+
+            paragraphs = []
+            tables = []
+            for element in blocks[start : end + 1]:
+                if element.tag == qn("w:p"):
+                    paragraphs.append(Paragraph(element, doc))
+                elif element.tag == qn("w:tbl"):
+                    tables.append(Table(element, doc))
+
+            if "\n" in quote:
+                added = self._process_multi_paragraph_comments(
+                    doc, {quote: comment_text}, author, initials, similarity_threshold, paragraphs
+                )
+            else:
+                added = 0
+                for paragraph in paragraphs:
+                    if paragraph.text.strip():
+                        added += self._process_paragraph_comments(
+                            doc, paragraph, {quote: comment_text}, author, initials, similarity_threshold
+                        )
+                for table in tables:
+                    added += self._process_table_comments(
+                        doc, table, {quote: comment_text}, author, initials, similarity_threshold
+                    )
+
+            if added:
+                count("anchored_hits")
+            else:
+                count("anchored_misses")
+                self.logger.warning(f"锚点 {anchor} 范围内未找到匹配: '{quote[:50]}...'")
+            comment_count += added
+
+        return comment_count
+
+    def _planned_fuzzy_match(
+        self, target_text: str, paragraph_text: str, threshold: float
+    ) -> tuple:
+        """
+        按匹配计划执行_find_fuzzy_match：重放计划时直接查表，否则正常匹配（近似重复文档匹配过的
+        段落复用其结果）并把命中结果记入计划
+
+        Args:
+            target_text: 目标文本（批注的key）
+            paragraph_text: 段落文本
+            threshold: 相似度阈值
+
+        Returns:
+            tuple: (是否找到匹配, 匹配的文本, 相似度)
+        """
+        plan = self._match_plan
+        if plan is None:
+            return self._find_fuzzy_match(target_text, paragraph_text, threshold=threshold)
+
+        if self._plan_digest is not None and self._plan_digest[0] is paragraph_text:
+            digest = self._plan_digest[1]
+        else:
+            digest = text_digest(paragraph_text)
+            self._plan_digest = (paragraph_text, digest)
+        if self._match_plan_replay:
+            hit = plan["hits"].get(target_text, {}).get(digest)
+            if hit is None:
+                return False, None, 0.0
+            return True, target_text if hit[0] is None else hit[0], hit[1]
+
+        key_digest = self._key_digests.get(target_text)
+        if key_digest is None:
+            key_digest = self._key_digests[target_text] = text_digest(target_text)
+        reference = self._reference_plan
+        hit = ()
+        if (
+            reference is not None
+            and digest in reference["paragraphs"]
+            and key_digest in reference["keys"]
+        ):
+            # 近似重复文档中的相同段落已经用同一摘要匹配过
+            count("match_reused")
+            hit = reference["hits"].get(key_digest, {}).get(digest)
+        if hit is None:
+            found, matched_text, similarity = False, None, 0.0
+        elif hit:
+            # 段落文本相同，按记录的位置取出匹配文本
+            found, matched_text, similarity = True, paragraph_text[hit[0] : hit[1]], hit[2]
+        else:
+            # 没有可复用的结果，或匹配文本不是段落中的连续片段（没有记录位置）
+            found, matched_text, similarity = self._find_fuzzy_match(
+                target_text, paragraph_text, threshold=threshold
+            )
+        self._plan_paragraphs.add(digest)
+        if found:
+            # 精确匹配时匹配文本就是摘要本身，不重复保存
+            plan["hits"].setdefault(target_text, {})[digest] = [
+                None if matched_text == target_text else matched_text,
+                similarity,
+            ]
+            start = paragraph_text.find(matched_text)
+            self._plan_spans.setdefault(key_digest, {})[digest] = (
+                [start, start + len(matched_text), similarity] if start >= 0 else []
+            )
+        return found, matched_text, similarity
+
     def _process_table_comments(
         self, doc, table, comments_dict, author, initials, similarity_threshold=0.8
     ):
@@ -1350,7 +1573,7 @@ class WordCommentTool(Tool):
             str: 包含最多关键词的文本片段
         """
         # 将段落按句子分割（不包含换行符，因为这是在单个段落内匹配）
-        sentences = re.split(r"[。！？.!?；;,、]+", paragraph_text)
+        sentences = self.SENTENCE_SPLIT_RE.split(paragraph_text)
 
         best_match = ""
         best_score = 0
@@ -1365,7 +1588,7 @@ class WordCommentTool(Tool):
 
             # 计算关键词得分
             sentence_lower = sentence.lower()
-            sentence_words = re.findall(r"\b\w+\b", sentence_lower)
+            sentence_words = self.WORD_RE.findall(sentence_lower)
 
             # 1. 关键词密度得分
             matched_count = sum(1 for word in key_words if word in sentence_words)
@@ -1435,7 +1658,7 @@ class WordCommentTool(Tool):
                     continue
 
                 # 计算组合句子的得分
-                combined_words = re.findall(r"\b\w+\b", combined.lower())
+                combined_words = self.WORD_RE.findall(combined.lower())
                 matched_count = sum(1 for word in key_words if word in combined_words)
                 density_score = (
                     matched_count / len(combined_words) if combined_words else 0
@@ -1486,6 +1709,10 @@ class WordCommentTool(Tool):
         comments_dict: dict,
         author: str = "批注者",
         similarity_threshold: float = 0.8,
+        match_plan: Optional[dict] = None,
+        anchored_comments: Optional[list] = None,
+        reference_plan: Optional[dict] = None,
+        document=None,
     ) -> int:
         """
         向Word文档添加真正的批注（使用python-docx原生批注API，支持模糊匹配和跨段落匹配）
@@ -1496,11 +1723,17 @@ class WordCommentTool(Tool):
             comments_dict: 批注字典，key为摘要文本，value为批注内容
             author: 批注者姓名
             similarity_threshold: 模糊匹配的相似度阈值（0.1-1.0）
+            match_plan: 之前对同一文档、同一组摘要和阈值记录的匹配计划，传入时跳过单段落批注的模糊匹配；
+                不传时本次的匹配计划记录在self._match_plan中
+            anchored_comments: 锚定批注 [(锚点, 原文, 批注)]，只在锚点范围内查找
+            reference_plan: 近似重复文档的匹配计划（见_similar_match_plan），没有match_plan时
+                对其中评估过的摘要和段落复用匹配结果
+            document: 已从input_path打开的文档对象，提供时不再重复解析
 
         Returns:
             int: 成功添加的批注数量
         """
-        doc = Document(input_path)
+        doc = document if document is not None else open_document(input_path)
         comment_count = 0
 
         # 获取作者缩写（取前两个字符）
@@ -1511,6 +1744,13 @@ class WordCommentTool(Tool):
             f"开始处理批注，共有 {len(comments_dict)} 个批注对，相似度阈值: {similarity_threshold:.2%}:"
         )
 
+        # 锚定批注只在对应分块的范围内查找，先于全文匹配处理（不使用匹配计划）
+        if anchored_comments:
+            self.logger.info(f"开始处理 {len(anchored_comments)} 个锚定批注")
+            comment_count += self._process_anchored_comments(
+                doc, anchored_comments, author, initials, similarity_threshold
+            )
+
         # 分离单段落和多段落批注
         single_paragraph_comments = {}
         multi_paragraph_comments = {}
@@ -1536,6 +1776,13 @@ class WordCommentTool(Tool):
         total_tables = 0
 
         if single_paragraph_comments:
+            self._match_log = EventSummary("单段落批注匹配")
+            self._match_plan_replay = match_plan is not None
+            self._match_plan = match_plan if match_plan is not None else {"hits": {}}
+            self._reference_plan = reference_plan
+            self._plan_paragraphs = set()
+            self._plan_spans = {}
+            self._key_digests = {}
             # 遍历文档中的所有段落
             total_paragraphs = len(doc.paragraphs)
 
@@ -1578,10 +1825,142 @@ class WordCommentTool(Tool):
                     if table_comments > 0:
                         self.logger.debug(f"表格 {i+1} 添加了 {table_comments} 个批注")
 
+            self._match_log.log(self.logger)
+            self._match_log = None
+
         self.logger.info(
             f"文档处理完成：处理了 {processed_paragraphs} 个段落和 {total_tables} 个表格，成功添加 {comment_count} 个批注"
         )
-
-        # 保存文档
-        doc.save(output_path)
+        set_value("paragraphs", processed_paragraphs)
+        set_value("tables", total_tables)
+        set_value("comments_requested", len(comments_dict) + len(anchored_comments or []))
+        set_value("comments_added", comment_count)
+
+        # 保存文档：XML部件重新序列化，未修改的图片等二进制部件直接复制原始文件中的压缩数据
+        save_stats = save_document(
+            doc, output_path, input_path, document_parts(doc, RT.COMMENTS)
+        )
+        self.logger.info(
+            f"文档保存完成，重新序列化 {save_stats['parts_written']} 个部件，"
+            f"直接复制 {save_stats['parts_copied']} 个未修改的二进制部件（{save_stats['bytes_copied']} 压缩字节）"
+        )
         return comment_count
+
+
+def _add_comments_task(
+    blob: bytes,
+    comments: dict,
+    author: str,
+    similarity_threshold: float,
+    match_plan: Optional[dict] = None,
+    anchored_comments: Optional[list] = None,
+    scope: str = "",
+) -> tuple:
+    """
+    批注任务（在工作进程中执行）：向文档内容添加批注
+
+    Args:
+        blob: 原始Word文档内容
+        comments: 批注字典 {原文: 批注内容}
+        author: 批注者
+        similarity_threshold: 模糊匹配相似度阈值
+        match_plan: 缓存中的匹配计划，没有时为None
+        anchored_comments: 锚定批注 [(锚点, 原文, 批注)]
+        scope: 近似重复文档索引的范围（见similarity_scope）
+
+    Returns:
+        tuple: (批注后的文档内容, 成功添加的批注数量, 新记录的匹配计划；重放计划或没有单段落批注时为None)
+    """
+    tool = WordCommentTool.from_credentials({})
+    # 逐段落模糊匹配的摘要（与_process_paragraph_comments跳过的条件一致）
+    keys = sorted(key for key, value in comments.items() if key and value and "\n" not in key)
+
+    # 没有同一文档的匹配计划时，复用近似重复文档（同一模板的其他文档）的匹配结果
+    index = get_similarity_index(scope)
+    signature = reference_plan = document = None
+    if match_plan is None and keys and index.enabled:
+        # 签名需要正文文本，先打开文档，批注时直接使用
+        document = open_document(blob)
+        with stage("similarity"):
+            signature = document_signature(document_texts(document))
+            reference_plan = _similar_match_plan(index, signature, similarity_threshold)
+
+    with temporary_io_files(blob, ".docx", ".docx") as (input_path, output_path):
+        # 解析和保存在内部分别计时，match只包含匹配和写入批注的耗时
+        with stage("match"):
+            comment_count = tool.add_native_comments_to_document(
+                input_path,
+                output_path,
+                comments,
+                author,
+                similarity_threshold,
+                match_plan,
+                anchored_comments,
+                reference_plan,
+                document,
+            )
+        new_plan = None if match_plan is not None else tool._match_plan
+        if signature is not None and new_plan is not None:
+            with stage("similarity"):
+                _save_match_plan(
+                    index,
+                    blob,
+                    signature,
+                    similarity_threshold,
+                    keys,
+                    tool._plan_spans,
+                    tool._plan_paragraphs,
+                )
+        with open(output_path, "rb") as f:
+            return f.read(), comment_count, new_plan
+
+
+def _similar_match_plan(index, signature, similarity_threshold: float) -> Optional[dict]:
+    """近似重复文档索引中相似文档以同一阈值记录的匹配计划，没有时返回None"""
+    name = f"match_plan:{similarity_threshold}"
+    found = index.find(signature, name)
+    if found is None:
+        return None
+    doc_id, similarity = found
+    state = index.load_state(doc_id, name)
+    if not state:
+        return None
+    set_value("similarity", round(similarity, 3))
+    return {
+        "keys": set(state["keys"]),
+        "paragraphs": set(state["paragraphs"]),
+        "hits": state["hits"],
+    }
+
+
+def _save_match_plan(
+    index, blob: bytes, signature, similarity_threshold: float, keys: list, spans: dict, paragraphs: set
+) -> None:
+    """
+    把本次的匹配结果登记到近似重复文档索引，同一文档之前用其他摘要批注过时合并；
+    摘要只保存摘要，匹配结果只保存匹配文本在段落中的位置
+
+    Args:
+        index: 近似重复文档索引
+        blob: Word文档内容
+        signature: 文档签名
+        similarity_threshold: 相似度阈值
+        keys: 本次逐段落匹配的摘要
+        spans: 本次的匹配位置 {摘要的摘要: {段落文本摘要: [起始, 结束, 相似度]}}
+        paragraphs: 本次评估过的段落文本摘要
+    """
+    doc_id = document_key(blob)[:24]
+    name = f"match_plan:{similarity_threshold}"
+    paragraphs = sorted(paragraphs or ())
+    if not paragraphs:
+        return
+    keys = sorted(text_digest(key) for key in keys)
+    hits = spans or {}
+    previous = index.load_state(doc_id, name)
+    if previous and previous.get("paragraphs") == paragraphs:
+        hits = dict(previous["hits"], **hits)
+        keys = sorted(set(previous["keys"]) | set(keys))
+    index.save_state(doc_id, signature, name, {"keys": keys, "paragraphs": paragraphs, "hits": hits})
+
+
+register_task(ADD_COMMENTS_TASK, _add_comments_task)
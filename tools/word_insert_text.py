@@ -1,24 +1,75 @@
 from collections.abc import Generator
 from typing import Any
-import tempfile
 import os
 import json
+import html
+import re
 from dify_plugin.file.file import File
 from dify_plugin import Tool
 from dify_plugin.entities.tool import ToolInvokeMessage
-from docx import Document
 from docx.shared import Pt, RGBColor
+from docx.enum.style import WD_STYLE_TYPE
 from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
+from docx.oxml import OxmlElement
+from docx.opc.constants import RELATIONSHIP_TYPE as RT
+from docx.oxml.ns import qn
+from docx.text.paragraph import Paragraph
 from tools.utils.logger_utils import get_logger
-from tools.utils.file_utils import get_meta_data, sanitize_filename
-import markdown
-from bs4 import BeautifulSoup
+from tools.utils.document_store import DocumentHandleError, StoredDocument, document_owner, get_document_store
+from tools.utils.file_utils import get_meta_data, sanitize_filename, temporary_io_files
+from tools.utils.docx_save_utils import document_parts, save_document
+from tools.utils.document_cache import document_key, open_document
+from tools.utils.admission import run_admitted_task
+from tools.utils.instrumentation import Metrics, collect_metrics, set_value, stage
+from tools.utils.process_pool import register_task
+
+# 提交到工作进程池的任务名
+INSERT_TEXT_TASK = "word_insert_text.insert_text"
+
+
+def _markdown():
+    """返回markdown模块：只在插入Markdown文本时才需要，首次使用时再导入以加快插件启动"""
+    import markdown
+
+    return markdown
 
 
 class WordInsertTextTool(Tool):
     # 获取当前模块的日志记录器
     logger = get_logger(__name__)
 
+    # 各级标题相对正文的字号倍数
+    HEADING_SIZE_FACTORS = {1: 1.5, 2: 1.3, 3: 1.2, 4: 1.1, 5: 1.1, 6: 1.1}
+
+    # Markdown解析树中的块级元素
+    MARKDOWN_BLOCK_TAGS = {
+        "p", "h1", "h2", "h3", "h4", "h5", "h6", "ul", "ol", "li",
+        "blockquote", "pre", "hr", "table", "div",
+    }
+    # 原始HTML片段的处理规则（围栏代码块、换行、其他标签）
+    MARKDOWN_PRE_RE = re.compile(r"<pre[^>]*><code[^>]*>(.*?)</code></pre>", re.S)
+    MARKDOWN_BR_RE = re.compile(r"<br\s*/?>", re.I)
+    MARKDOWN_TAG_RE = re.compile(r"<[^>]+>")
+
+    # 批量插入支持的位置：锚点之前、锚点之后、锚点所在章节末尾、文档开头、文档结尾
+    OPERATION_POSITIONS = ("before", "after", "section_end", "start", "end")
+    # 锚点索引识别的编号形式：第X章/节/条/款/项、多级数字编号（1.2.3）、中文序号（一、）
+    ANCHOR_CLAUSE_RE = re.compile(r"^第([一二三四五六七八九十百千万零〇两\d]+)([章节条款项])")
+    # 正文里“30 日内”“3.5万元”这类数字开头的句子不算编号，数字编号必须以 . ． 、 结尾；
+    # 已由标题样式/大纲级别确认的标题（以及锚点本身）才接受“1.2 付款”“3.2”这类空格或无分隔写法
+    ANCHOR_NUMBER_RE = re.compile(r"^(\d+(?:\.\d+)*)[.．、](?!\d)")
+    ANCHOR_HEADING_NUMBER_RE = re.compile(r"^(\d+(?:\.\d+)*)(?:[.．、](?!\d)|\s|$)")
+    ANCHOR_CHINESE_ORDINAL_RE = re.compile(r"^([一二三四五六七八九十百千万零〇两]+)[、.．]")
+    ANCHOR_HEADING_STYLE_RE = re.compile(r"^(?:heading|标题)\s*(\d)$", re.I)
+    ANCHOR_SPACE_RE = re.compile(r"\s+")
+    # 条款单位对应的层级，用于确定章节末尾的范围
+    CLAUSE_UNIT_LEVELS = {"章": 1, "节": 2, "条": 3, "款": 4, "项": 5}
+    CHINESE_DIGITS = {
+        "零": 0, "〇": 0, "一": 1, "二": 2, "两": 2, "三": 3, "四": 4,
+        "五": 5, "六": 6, "七": 7, "八": 8, "九": 9,
+    }
+    CHINESE_UNITS = {"十": 10, "百": 100, "千": 1000, "万": 10000}
+
     def _invoke(self, tool_parameters: dict[str, Any]) -> Generator[ToolInvokeMessage]:
         # 获取上传的Word文件
         word_content = tool_parameters.get("word_content")
@@ -31,20 +82,50 @@ class WordInsertTextTool(Tool):
         font_color = tool_parameters.get("font_color", "#000000")  # 默认黑色
         custom_filename = tool_parameters.get("output_filename", "").strip()
         is_markdown = tool_parameters.get("is_markdown", False)  # 是否为Markdown文本
+        insert_operations = tool_parameters.get("insert_operations", "")  # 批量插入操作
+        return_metrics = tool_parameters.get("return_metrics", False)
+        metrics = Metrics(request_id=self.session.session_id)
+
+        # 没有上传文件时，从本地文档存储中取回register_document登记的文档
+        document_handle = (tool_parameters.get("document_handle") or "").strip()
+        if not word_content and document_handle:
+            try:
+                word_content = get_document_store().get(document_handle, document_owner(self))
+            except DocumentHandleError as e:
+                self.logger.error(str(e))
+                yield self.create_text_message(str(e))
+                return
 
         # 验证必需参数
         if not word_content:
             self.logger.error("未提供Word文件")
-            yield self.create_text_message("请提供Word文件")
+            yield self.create_text_message("请提供Word文件或文档句柄")
             return
 
-        if not text_to_insert:
+        # 解析批量插入操作；与单段文本同时提供时无法确定以哪个为准，直接报错而不是静默丢弃一方
+        operations = None
+        if insert_operations and str(insert_operations).strip():
+            if text_to_insert and str(text_to_insert).strip():
+                self.logger.error("同时提供了要插入的文本和批量插入操作")
+                yield self.create_text_message(
+                    "不能同时提供“要插入的文本”和“批量插入操作”，请将文本写入批量插入操作的content中，或只保留其中一个"
+                )
+                return
+            try:
+                with metrics.stage("decode"):
+                    operations = self._parse_insert_operations(insert_operations, is_markdown)
+            except (json.JSONDecodeError, ValueError) as e:
+                self.logger.error(f"批量插入操作解析失败: {str(e)}")
+                yield self.create_text_message(f"批量插入操作解析失败: {str(e)}")
+                return
+
+        if not text_to_insert and not operations:
             self.logger.error("未提供要插入的文本")
             yield self.create_text_message("请提供要插入的文本")
             return
 
         # 检查文件类型
-        if not isinstance(word_content, File):
+        if not isinstance(word_content, (File, StoredDocument)):
             self.logger.error("无效的文件格式，期望File对象")
             yield self.create_text_message("无效的文件格式，期望File对象")
             return
@@ -79,37 +160,45 @@ class WordInsertTextTool(Tool):
         )
 
         try:
-            # 创建临时文件保存上传的Word文件
-            with tempfile.NamedTemporaryFile(
-                delete=False, suffix=".docx"
-            ) as temp_input_file:
-                # 获取文件内容（字节）并写入临时文件
-                temp_input_file.write(word_content.blob)
-                temp_input_path = temp_input_file.name
-
-            # 创建临时文件保存处理后的Word文件
-            with tempfile.NamedTemporaryFile(
-                delete=False, suffix=".docx"
-            ) as temp_output_file:
-                temp_output_path = temp_output_file.name
-
-            # 调用文本插入函数
-            self.logger.info("开始插入文本到Word文档")
-            self.insert_text_to_document(
-                temp_input_path,
-                temp_output_path,
-                text_to_insert,
-                insert_position,
-                font_name,
-                font_size,
-                font_color_hex,
-                is_markdown,
-            )
-            self.logger.info("成功插入文本到Word文档")
-
-            # 读取处理后的Word文件内容
-            with open(temp_output_path, "rb") as docx_file:
-                docx_blob = docx_file.read()
+            # 文档解析、Markdown渲染和保存交给工作进程池执行，不阻塞其他请求
+            skipped_operations = []
+            if operations:
+                # 批量模式：一次解析、一次定位所有锚点、一次保存
+                self.logger.info(f"开始批量插入文本到Word文档，共 {len(operations)} 个操作")
+            else:
+                self.logger.info("开始插入文本到Word文档")
+            with metrics.stage("decode"):
+                blob = word_content.blob
+                affinity = document_key(blob)
+            with collect_metrics(metrics):
+                docx_blob, results = run_admitted_task(
+                    "word_insert_text",
+                    INSERT_TEXT_TASK,
+                    blob,
+                    operations,
+                    text_to_insert,
+                    insert_position,
+                    font_name,
+                    font_size,
+                    font_color_hex,
+                    is_markdown,
+                    affinity=affinity,
+                )
+            if operations:
+                skipped_operations = [r for r in results if not r["applied"]]
+                if len(skipped_operations) == len(results):
+                    self.logger.error("所有批量插入操作的锚点均未找到")
+                    yield self.create_text_message(
+                        "所有插入操作的锚点均未在文档中找到: "
+                        + "、".join(r["anchor"] for r in skipped_operations)
+                    )
+                    return
+                self.logger.info(
+                    f"成功批量插入文本到Word文档，应用 {len(results) - len(skipped_operations)} 个，"
+                    f"跳过 {len(skipped_operations)} 个"
+                )
+            else:
+                self.logger.info("成功插入文本到Word文档")
 
             # 处理自定义文件名
             processed_filename = None
@@ -135,9 +224,14 @@ class WordInsertTextTool(Tool):
                 ),
             )
 
-            # 清理临时文件
-            os.unlink(temp_input_path)
-            os.unlink(temp_output_path)
+            # 部分锚点未找到时，告知调用方被跳过的操作
+            if skipped_operations:
+                yield self.create_text_message(
+                    "以下插入操作的锚点未在文档中找到，已跳过: "
+                    + "、".join(r["anchor"] for r in skipped_operations)
+                )
+            if return_metrics:
+                yield self.create_json_message({"metrics": metrics.report()})
 
         except Exception as e:
             self.logger.exception(f"处理Word文档时发生异常: {str(e)}")
@@ -223,156 +317,385 @@ class WordInsertTextTool(Tool):
         hex_color = hex_color.lstrip("#")
         return tuple(int(hex_color[i : i + 2], 16) for i in (0, 2, 4))
 
-    def _markdown_to_docx(
-        self, markdown_text, doc, paragraph, font_name, font_size, font_color
+    def _style_name(self, role, font_name, font_size, font_color):
+        """生成插入文本所用样式的名称，字体参数不同的插入使用不同的样式，互不影响"""
+        return f"WordTools {role} ({font_name}, {font_size}pt, {font_color.lstrip('#').upper()})"
+
+    def _get_or_create_style(self, doc, name, style_type, base_style=None):
+        """
+        按名称获取文档中的样式，不存在时创建
+
+        Returns:
+            tuple: (样式对象, 是否为新创建的样式)
+        """
+        styles = doc.styles
+        try:
+            return styles[name], False
+        except KeyError:
+            style = styles.add_style(name, style_type)
+            if base_style is not None:
+                style.base_style = base_style
+            return style, True
+
+    def _set_style_font(self, style, font_name=None, font_size=None, font_color=None):
+        """设置样式的字体格式（包括东亚字体，保证中文也使用指定字体）"""
+        font = style.font
+        if font_name:
+            font.name = font_name
+            style.element.get_or_add_rPr().get_or_add_rFonts().set(
+                qn("w:eastAsia"), font_name
+            )
+        if font_size:
+            font.size = Pt(font_size)
+        if font_color:
+            r, g, b = self._hex_to_rgb(font_color)
+            font.color.rgb = RGBColor(r, g, b)
+
+    def _ensure_styles(self, doc, font_name, font_size, font_color):
+        """
+        为本次插入准备命名样式（正文、标题1-6、行内代码、链接），每个文档只创建一次，
+        生成的段落和Run只引用样式，不再逐个写入行内格式
+
+        Args:
+            doc: Word文档对象
+            font_name: 字体名称
+            font_size: 字体大小
+            font_color: 十六进制字体颜色
+
+        Returns:
+            dict: 角色名到样式ID的映射
+        """
+        styles = {}
+
+        try:
+            normal_style = doc.styles["Normal"]
+        except KeyError:
+            normal_style = None
+
+        # 正文段落样式
+        body_style, created = self._get_or_create_style(
+            doc,
+            self._style_name("Body", font_name, font_size, font_color),
+            WD_STYLE_TYPE.PARAGRAPH,
+            normal_style,
+        )
+        if created:
+            self._set_style_font(body_style, font_name, font_size, font_color)
+        styles["body"] = body_style.style_id
+
+        # 标题段落样式（加粗并按级别放大字号）
+        for level in range(1, 7):
+            heading_style, created = self._get_or_create_style(
+                doc,
+                self._style_name(f"Heading {level}", font_name, font_size, font_color),
+                WD_STYLE_TYPE.PARAGRAPH,
+                body_style,
+            )
+            if created:
+                heading_style.font.bold = True
+                self._set_style_font(
+                    heading_style,
+                    font_size=int(font_size * self.HEADING_SIZE_FACTORS[level]),
+                )
+            styles[f"h{level}"] = heading_style.style_id
+
+        # 行内代码字符样式（字号和颜色继承段落样式）
+        code_style, created = self._get_or_create_style(
+            doc,
+            self._style_name("Code", font_name, font_size, font_color),
+            WD_STYLE_TYPE.CHARACTER,
+        )
+        if created:
+            self._set_style_font(code_style, font_name="Consolas")
+        styles["code"] = code_style.style_id
+
+        # 链接字符样式（蓝色下划线）
+        link_style, created = self._get_or_create_style(
+            doc,
+            self._style_name("Link", font_name, font_size, font_color),
+            WD_STYLE_TYPE.CHARACTER,
+        )
+        if created:
+            link_style.font.underline = True
+            self._set_style_font(link_style, font_color="#0000FF")
+        styles["link"] = link_style.style_id
+
+        return styles
+
+    def _add_run(self, paragraph, text, style_id=None):
+        """向段落添加Run，可选引用字符样式"""
+        run = paragraph.add_run(text)
+        if style_id:
+            run._r.style = style_id
+        return run
+
+    def _new_block_paragraph(self, ctx, style_id, indent_level=0):
+        """创建一个游离的段落元素（尚未挂到文档body上），并记录到输出块列表"""
+        paragraph = Paragraph(OxmlElement("w:p"), ctx["doc"])
+        paragraph._p.style = style_id
+        if indent_level > 0:
+            paragraph.paragraph_format.left_indent = Pt(18 * indent_level)
+        ctx["blocks"].append(paragraph._p)
+        return paragraph
+
+    def _resolve_markdown_text(self, ctx, text):
+        """还原Markdown解析树文本中的占位符（内联HTML、实体、&符号）"""
+        if not text:
+            return ""
+        markdown = _markdown()
+        if markdown.util.STX in text:
+            stash = ctx["md"].htmlStash.rawHtmlBlocks
+
+            def replace_placeholder(match):
+                raw = str(stash[int(match.group(1))])
+                raw = self.MARKDOWN_BR_RE.sub("\n", raw)
+                return html.unescape(self.MARKDOWN_TAG_RE.sub("", raw))
+
+            text = markdown.util.HTML_PLACEHOLDER_RE.sub(replace_placeholder, text)
+            text = text.replace(markdown.util.AMP_SUBSTITUTE, "&")
+        return text
+
+    def _add_inline_text(self, paragraph, text, bold, italic, style_id):
+        """按当前的行内格式向段落添加一段文本"""
+        if not text:
+            return
+        run = self._add_run(paragraph, text, style_id)
+        if bold:
+            run.bold = True
+        if italic:
+            run.italic = True
+
+    def _render_inline(
+        self, paragraph, element, ctx, bold=False, italic=False, style_id=None
     ):
-        """将Markdown文本转换为Word格式并插入到文档中"""
+        """
+        把元素的行内内容（文本、粗体、斜体、行内代码、链接、换行）写入段落，
+        遇到块级子元素时跳过，由调用方负责处理
+        """
+        self._add_inline_text(
+            paragraph,
+            self._resolve_markdown_text(ctx, element.text),
+            bold,
+            italic,
+            style_id,
+        )
+        for child in element:
+            tag = child.tag
+            if tag in self.MARKDOWN_BLOCK_TAGS:
+                continue
+            if tag in ("strong", "b"):
+                self._render_inline(paragraph, child, ctx, True, italic, style_id)
+            elif tag in ("em", "i"):
+                self._render_inline(paragraph, child, ctx, bold, True, style_id)
+            elif tag == "code":
+                # 代码文本在解析时已做HTML转义，需要还原
+                self._add_inline_text(
+                    paragraph,
+                    html.unescape(child.text or ""),
+                    bold,
+                    italic,
+                    ctx["styles"]["code"],
+                )
+            elif tag == "a":
+                self._render_inline(
+                    paragraph, child, ctx, bold, italic, ctx["styles"]["link"]
+                )
+            elif tag == "br":
+                paragraph.add_run().add_break()
+            elif tag == "img":
+                self._add_inline_text(
+                    paragraph, child.get("alt", ""), bold, italic, style_id
+                )
+            else:
+                self._render_inline(paragraph, child, ctx, bold, italic, style_id)
+            self._add_inline_text(
+                paragraph,
+                self._resolve_markdown_text(ctx, child.tail),
+                bold,
+                italic,
+                style_id,
+            )
+
+    def _render_code_block(self, ctx, code_text, indent_level):
+        """渲染代码块"""
+        paragraph = self._new_block_paragraph(ctx, ctx["styles"]["body"], indent_level)
+        self._add_run(paragraph, code_text.rstrip("\n"), ctx["styles"]["code"])
+
+    def _render_list(self, list_element, ctx, level):
+        """渲染（可嵌套的）有序/无序列表，嵌套层级通过左缩进体现"""
+        ordered = list_element.tag == "ol"
         try:
-            # 如果paragraph为None，表示在文档末尾插入，创建第一个段落
-            if paragraph is None:
-                paragraph = doc.add_paragraph()
-                
-            # 将Markdown转换为HTML
-            html = markdown.markdown(markdown_text)
-
-            # 使用BeautifulSoup解析HTML
-            soup = BeautifulSoup(html, "html.parser")
-
-            # 处理不同的HTML元素
-            for element in soup.children:
-                if element.name is None:  # 文本节点
-                    if element.strip():  # 忽略空白文本
-                        # 创建新段落
-                        paragraph = doc.add_paragraph()
-                        run = paragraph.add_run(element.strip())
-                        self._apply_font_format(run, font_name, font_size, font_color)
-                elif element.name == "p":
-                    # 段落 - 创建新段落
-                    paragraph = doc.add_paragraph()
-                    for child in element.children:
-                        if child.name is None:  # 文本节点
-                            if child.strip():  # 忽略空白文本
-                                run = paragraph.add_run(child.strip())
-                                self._apply_font_format(
-                                    run, font_name, font_size, font_color
-                                )
-                        elif child.name == "strong" or child.name == "b":
-                            # 粗体
-                            run = paragraph.add_run(child.get_text())
-                            run.bold = True
-                            self._apply_font_format(
-                                run, font_name, font_size, font_color
-                            )
-                        elif child.name == "em" or child.name == "i":
-                            # 斜体
-                            run = paragraph.add_run(child.get_text())
-                            run.italic = True
-                            self._apply_font_format(
-                                run, font_name, font_size, font_color
-                            )
-                        elif child.name == "code":
-                            # 行内代码
-                            run = paragraph.add_run(child.get_text())
-                            self._apply_font_format(
-                                run, "Consolas", font_size, font_color
-                            )
-                        elif child.name == "a":
-                            # 链接
-                            run = paragraph.add_run(child.get_text())
-                            run.underline = True
-                            self._apply_font_format(
-                                run, font_name, font_size, "#0000FF"
-                            )  # 链接默认蓝色
-                        else:
-                            # 其他标签，直接添加文本
-                            run = paragraph.add_run(child.get_text())
-                            self._apply_font_format(
-                                run, font_name, font_size, font_color
-                            )
-                elif element.name == "h1":
-                    # 标题1 - 创建新段落
-                    paragraph = doc.add_paragraph()
-                    run = paragraph.add_run(element.get_text())
-                    run.bold = True
-                    self._apply_font_format(
-                        run, font_name, int(font_size * 1.5), font_color
-                    )
-                elif element.name == "h2":
-                    # 标题2 - 创建新段落
-                    paragraph = doc.add_paragraph()
-                    run = paragraph.add_run(element.get_text())
-                    run.bold = True
-                    self._apply_font_format(
-                        run, font_name, int(font_size * 1.3), font_color
-                    )
-                elif element.name == "h3":
-                    # 标题3 - 创建新段落
-                    paragraph = doc.add_paragraph()
-                    run = paragraph.add_run(element.get_text())
-                    run.bold = True
-                    self._apply_font_format(
-                        run, font_name, int(font_size * 1.2), font_color
-                    )
-                elif (
-                    element.name == "h4" or element.name == "h5" or element.name == "h6"
-                ):
-                    # 标题4-6 - 创建新段落
-                    paragraph = doc.add_paragraph()
-                    run = paragraph.add_run(element.get_text())
-                    run.bold = True
-                    self._apply_font_format(
-                        run, font_name, int(font_size * 1.1), font_color
+            start = int(list_element.get("start", 1))
+        except ValueError:
+            start = 1
+
+        for index, item in enumerate(list_element.findall("li")):
+            paragraph = self._new_block_paragraph(ctx, ctx["styles"]["body"], level)
+            self._add_run(paragraph, f"{start + index}. " if ordered else "• ")
+            self._render_inline(paragraph, item, ctx)
+
+            # 松散列表中列表项的内容包在<p>里：第一个<p>并入列表项段落，其余作为缩进段落
+            first_paragraph = True
+            for child in item:
+                if child.tag == "p" and first_paragraph:
+                    self._render_inline(paragraph, child, ctx)
+                    first_paragraph = False
+                elif child.tag in ("ul", "ol"):
+                    self._render_list(child, ctx, level + 1)
+                elif child.tag in self.MARKDOWN_BLOCK_TAGS:
+                    self._render_block(child, ctx, level + 1)
+
+    def _render_table(self, table_element, ctx, indent_level):
+        """渲染表格，保留行列结构，表头单元格加粗"""
+        rows = list(table_element.iter("tr"))
+        if not rows:
+            return
+        col_count = max(len(row) for row in rows)
+        if col_count == 0:
+            return
+
+        # add_table按页面宽度减去页边距设置列宽，创建后从body上取下，与段落一样作为游离元素
+        doc = ctx["doc"]
+        table = doc.add_table(rows=len(rows), cols=col_count, style=ctx["table_style"])
+        doc.element.body.remove(table._element)
+
+        for row_element, row in zip(rows, table.rows):
+            for cell_element, cell in zip(row_element, row.cells):
+                paragraph = cell.paragraphs[0]
+                paragraph._p.style = ctx["styles"]["body"]
+                align = (cell_element.get("align") or cell_element.get("style") or "")
+                if "center" in align:
+                    paragraph.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
+                elif "right" in align:
+                    paragraph.alignment = WD_PARAGRAPH_ALIGNMENT.RIGHT
+                self._render_inline(
+                    paragraph, cell_element, ctx, bold=cell_element.tag == "th"
+                )
+
+        ctx["blocks"].append(table._element)
+
+    def _render_block(self, element, ctx, indent_level=0):
+        """渲染单个块级元素"""
+        styles = ctx["styles"]
+        tag = element.tag
+
+        if tag == "p":
+            text = element.text or ""
+            # 独立成段的HTML占位符：围栏代码块或原始HTML块
+            match = _markdown().util.HTML_PLACEHOLDER_RE.fullmatch(text.strip())
+            if match and len(element) == 0:
+                raw = str(ctx["md"].htmlStash.rawHtmlBlocks[int(match.group(1))])
+                code_match = self.MARKDOWN_PRE_RE.search(raw)
+                if code_match:
+                    self._render_code_block(
+                        ctx, html.unescape(code_match.group(1)), indent_level
                     )
-                elif element.name == "ul":
-                    # 无序列表 - 添加新段落
-                    for li in element.find_all("li", recursive=False):
-                        paragraph = doc.add_paragraph()
-                        run = paragraph.add_run("• " + li.get_text())
-                        self._apply_font_format(run, font_name, font_size, font_color)
-                elif element.name == "ol":
-                    # 有序列表 - 添加新段落
-                    for i, li in enumerate(element.find_all("li", recursive=False)):
-                        paragraph = doc.add_paragraph()
-                        run = paragraph.add_run(f"{i+1}. " + li.get_text())
-                        self._apply_font_format(run, font_name, font_size, font_color)
-                elif element.name == "blockquote":
-                    # 引用块 - 创建新段落
-                    paragraph = doc.add_paragraph()
-                    run = paragraph.add_run(element.get_text())
-                    self._apply_font_format(run, font_name, font_size, font_color)
-                    paragraph.paragraph_format.left_indent = Pt(18)
-                elif element.name == "pre":
-                    # 代码块 - 创建新段落
-                    paragraph = doc.add_paragraph()
-                    code_text = element.get_text()
-                    run = paragraph.add_run(code_text)
-                    self._apply_font_format(run, "Consolas", font_size, font_color)
-                elif element.name == "hr":
-                    # 分割线 - 创建新段落
-                    paragraph = doc.add_paragraph()
-                    run = paragraph.add_run("-" * 50)
-                    self._apply_font_format(run, font_name, font_size, font_color)
-                else:
-                    # 其他标签 - 创建新段落
-                    paragraph = doc.add_paragraph()
-                    run = paragraph.add_run(element.get_text())
-                    self._apply_font_format(run, font_name, font_size, font_color)
+                    return
+            paragraph = self._new_block_paragraph(ctx, styles["body"], indent_level)
+            self._render_inline(paragraph, element, ctx)
+        elif tag in ("h1", "h2", "h3", "h4", "h5", "h6"):
+            # 标题 - 格式由标题样式决定，标题内的行内格式同样保留
+            paragraph = self._new_block_paragraph(ctx, styles[tag], indent_level)
+            self._render_inline(paragraph, element, ctx)
+        elif tag in ("ul", "ol"):
+            self._render_list(element, ctx, indent_level)
+        elif tag == "blockquote":
+            # 引用块 - 内部的块级元素整体缩进一级
+            for child in element:
+                self._render_block(child, ctx, indent_level + 1)
+        elif tag == "pre":
+            code = element.find("code")
+            code_text = (code.text if code is not None else element.text) or ""
+            self._render_code_block(ctx, html.unescape(code_text), indent_level)
+        elif tag == "hr":
+            paragraph = self._new_block_paragraph(ctx, styles["body"], indent_level)
+            self._add_run(paragraph, "-" * 50)
+        elif tag == "table":
+            self._render_table(element, ctx, indent_level)
+        elif any(child.tag in self.MARKDOWN_BLOCK_TAGS for child in element):
+            # 其他容器（如div）- 递归处理其中的块级元素
+            for child in element:
+                self._render_block(child, ctx, indent_level)
+        else:
+            paragraph = self._new_block_paragraph(ctx, styles["body"], indent_level)
+            self._render_inline(paragraph, element, ctx)
+
+    def _markdown_to_blocks(self, markdown_text, doc, styles):
+        """
+        将Markdown文本一次性转换为游离的w:p/w:tbl元素列表
 
+        直接遍历Python-Markdown的解析树生成Word元素，不再先序列化为HTML再用
+        BeautifulSoup重新解析；支持表格、嵌套列表以及标题和列表中的行内格式
+
+        Args:
+            markdown_text: Markdown文本
+            doc: Word文档对象
+            styles: 样式ID映射（见_ensure_styles）
+
+        Returns:
+            list: 按顺序排列的w:p/w:tbl元素
+        """
+        md = _markdown().Markdown(extensions=["tables", "fenced_code", "sane_lists"])
+        # prettify只用于美化HTML输出，会在树中插入多余的换行
+        md.treeprocessors.deregister("prettify")
+
+        lines = markdown_text.split("\n")
+        for preprocessor in md.preprocessors:
+            lines = preprocessor.run(lines)
+        root = md.parser.parseDocument(lines).getroot()
+        for treeprocessor in md.treeprocessors:
+            new_root = treeprocessor.run(root)
+            if new_root is not None:
+                root = new_root
+
+        try:
+            table_style = doc.styles["Table Grid"]
+        except KeyError:
+            table_style = None
+
+        ctx = {
+            "md": md,
+            "styles": styles,
+            "doc": doc,
+            "table_style": table_style,
+            "blocks": [],
+        }
+        for element in root:
+            self._render_block(element, ctx)
+        return ctx["blocks"]
+
+    def _markdown_to_docx(self, markdown_text, doc, styles):
+        """将Markdown文本转换为Word格式的游离块级元素列表（尚未插入文档）"""
+        try:
+            return self._markdown_to_blocks(markdown_text, doc, styles)
         except Exception as e:
             self.logger.warning(f"Markdown转换时出错: {str(e)}，使用纯文本插入")
             # 如果转换失败，使用纯文本插入
-            run = paragraph.add_run(markdown_text)
-            self._apply_font_format(run, font_name, font_size, font_color)
+            return self._plain_text_to_blocks(markdown_text, doc, styles)
 
-    def _apply_font_format(self, run, font_name, font_size, font_color):
-        """应用字体格式到文本运行"""
-        try:
-            run.font.name = font_name
-            run.font.size = Pt(font_size)
-            r, g, b = self._hex_to_rgb(font_color)
-            run.font.color.rgb = RGBColor(r, g, b)
-        except Exception as e:
-            self.logger.warning(f"设置字体格式时出错: {str(e)}")
+    def _plain_text_to_blocks(self, text, doc, styles):
+        """将纯文本转换为一个左对齐的正文段落（游离元素）"""
+        paragraph = Paragraph(OxmlElement("w:p"), doc)
+        paragraph._p.style = styles["body"]
+        paragraph.add_run(text)
+        # 设置段落对齐方式（左对齐）
+        paragraph.alignment = WD_PARAGRAPH_ALIGNMENT.LEFT
+        return [paragraph._p]
+
+    def _insert_blocks(self, doc, blocks, index):
+        """
+        将游离的块级元素作为一个整体一次性插入到文档body的指定位置
+
+        Args:
+            doc: Word文档对象
+            blocks: 按顺序排列的w:p/w:tbl元素
+            index: 插入位置（body子元素下标），None表示插入到正文末尾（分节符之前）
+        """
+        body = doc.element.body
+        if index is None:
+            sect_pr = body.sectPr
+            index = body.index(sect_pr) if sect_pr is not None else len(body)
+        body[index:index] = blocks
 
     def insert_text_to_document(
         self,
@@ -387,52 +710,376 @@ class WordInsertTextTool(Tool):
     ):
         """将文本插入到Word文档的指定位置，并应用指定的字体格式"""
         # 打开Word文档
-        doc = Document(input_path)
+        doc = open_document(input_path)
+
+        # 准备本次插入使用的样式
+        styles = self._ensure_styles(doc, font_name, font_size, font_color)
 
-        # 根据是否为Markdown文本选择不同的插入方式
+        # 先生成游离的内容片段，再一次性插入到目标位置，
+        # 开头插入和结尾插入的开销相同，与文档大小无关
         if is_markdown:
-            # 使用Markdown转换功能
-            if insert_position == "start":
-                # 记录当前文档段落数量
-                original_paragraph_count = len(doc.paragraphs)
-                # 在文档末尾插入所有Markdown内容
-                self._markdown_to_docx(
-                    text_to_insert, doc, None, font_name, font_size, font_color
+            blocks = self._markdown_to_docx(text_to_insert, doc, styles)
+        else:
+            blocks = self._plain_text_to_blocks(text_to_insert, doc, styles)
+        self._insert_blocks(doc, blocks, 0 if insert_position == "start" else None)
+
+        # 保存文档
+        self._save_document(doc, output_path, input_path)
+
+    def _parse_insert_operations(self, insert_operations, default_is_markdown=False):
+        """
+        解析批量插入操作
+
+        Args:
+            insert_operations: JSON字符串（或已解析的列表），每个操作形如
+                {"anchor": "第三条", "position": "after", "content": "...", "is_markdown": true}
+            default_is_markdown: 操作未指定is_markdown时使用的默认值
+
+        Returns:
+            list: 规范化后的操作列表
+        """
+        if isinstance(insert_operations, str):
+            insert_operations = json.loads(insert_operations)
+        if isinstance(insert_operations, dict):
+            insert_operations = [insert_operations]
+        if not isinstance(insert_operations, list):
+            raise ValueError("期望数组格式 [{\"anchor\": ..., \"position\": ..., \"content\": ...}, ...]")
+
+        operations = []
+        for i, item in enumerate(insert_operations):
+            if not isinstance(item, dict):
+                raise ValueError(f"第{i+1}个操作不是对象格式")
+            content = str(item.get("content") or "")
+            if not content.strip():
+                self.logger.warning(f"第{i+1}个操作没有content内容，已跳过，提供的字段: {', '.join(item) or '无'}")
+                continue
+            position = str(item.get("position") or "after").strip().lower()
+            if position not in self.OPERATION_POSITIONS:
+                raise ValueError(
+                    f"第{i+1}个操作的位置无效: {position}，可选值: {', '.join(self.OPERATION_POSITIONS)}"
                 )
-                
-                # 获取所有新增的段落
-                new_paragraphs = doc.paragraphs[original_paragraph_count:]
-                
-                # 将新增段落批量移动到文档开头
-                for i, paragraph in enumerate(new_paragraphs):
-                    element = paragraph._element
-                    doc.element.body.insert(i, element)
+            anchor = str(item.get("anchor") or "").strip()
+            if not anchor and position not in ("start", "end"):
+                raise ValueError(f"第{i+1}个操作缺少锚点")
+            is_markdown = item.get("is_markdown", default_is_markdown)
+            if isinstance(is_markdown, str):
+                is_markdown = is_markdown.strip().lower() in ("true", "1", "yes")
+            operations.append(
+                {
+                    "anchor": anchor,
+                    "position": position,
+                    "content": content,
+                    "is_markdown": bool(is_markdown),
+                }
+            )
+        if not operations:
+            raise ValueError("没有可执行的插入操作，每个操作都需要非空的content字段")
+        return operations
+
+    def _parse_chinese_number(self, text):
+        """将中文数字（如“十二”、“一百零五”）或阿拉伯数字转换为整数，无法识别时返回None"""
+        if text.isdigit():
+            return int(text)
+        total, section, number = 0, 0, 0
+        for ch in text:
+            if ch in self.CHINESE_DIGITS:
+                number = self.CHINESE_DIGITS[ch]
+            elif ch in self.CHINESE_UNITS:
+                unit = self.CHINESE_UNITS[ch]
+                if unit == 10000:
+                    total += (section + number) * unit
+                    section = 0
+                else:
+                    section += (number or 1) * unit
+                number = 0
             else:
-                # 在文档结尾插入，不需要预先创建段落
-                self._markdown_to_docx(
-                    text_to_insert, doc, None, font_name, font_size, font_color
+                return None
+        return total + section + number
+
+    def _anchor_key(self, text, heading=False):
+        """
+        提取文本开头的编号，返回(归一化编号, 编号类型, 层级)，没有编号时返回None
+
+        第三条、第3条 归一化为同一个编号，便于用任意写法的锚点定位。
+        heading为True（已确认是标题的段落或锚点本身）时，数字编号后可以是空格或直接结束
+        """
+        match = self.ANCHOR_CLAUSE_RE.match(text)
+        if match:
+            number = self._parse_chinese_number(match.group(1))
+            if number is not None:
+                unit = match.group(2)
+                return f"第{number}{unit}", "clause", self.CLAUSE_UNIT_LEVELS[unit]
+        number_re = self.ANCHOR_HEADING_NUMBER_RE if heading else self.ANCHOR_NUMBER_RE
+        match = number_re.match(text)
+        if match:
+            number = match.group(1)
+            return number, "number", number.count(".") + 1
+        match = self.ANCHOR_CHINESE_ORDINAL_RE.match(text)
+        if match:
+            number = self._parse_chinese_number(match.group(1))
+            if number is not None:
+                return f"{number}、", "ordinal", 1
+        return None
+
+    def _build_anchor_index(self, doc):
+        """
+        遍历一次文档body，建立标题/条款索引
+
+        Args:
+            doc: Word文档对象
+
+        Returns:
+            dict: 包含以下内容的索引
+                keys: 归一化编号 -> 首次出现的body子元素下标
+                texts: 归一化标题文本 -> 首次出现的下标
+                headings: 按顺序排列的(下标, 类型, 层级, 归一化文本)
+                paragraphs: 按顺序排列的(下标, 归一化文本)，用于全文兜底匹配
+                end: 正文末尾（分节符之前）的下标
+        """
+        # 样式ID -> 标题层级
+        heading_styles = {}
+        for style in doc.styles.element.findall(qn("w:style")):
+            name = style.find(qn("w:name"))
+            if name is None:
+                continue
+            match = self.ANCHOR_HEADING_STYLE_RE.match(name.get(qn("w:val"), "").strip())
+            if match:
+                heading_styles[style.get(qn("w:styleId"))] = int(match.group(1))
+
+        index = {"keys": {}, "texts": {}, "headings": [], "paragraphs": [], "end": 0}
+        p_tag, sect_tag, t_tag = qn("w:p"), qn("w:sectPr"), qn("w:t")
+        body = doc.element.body
+        for i, element in enumerate(body):
+            if element.tag == sect_tag:
+                break
+            index["end"] = i + 1
+            if element.tag != p_tag:
+                continue
+
+            text = "".join(t.text or "" for t in element.iter(t_tag)).strip()
+            if not text:
+                continue
+            normalized = self.ANCHOR_SPACE_RE.sub("", text)
+            index["paragraphs"].append((i, normalized))
+
+            # 标题层级：标题样式 > 大纲级别 > 编号
+            kind, level = None, None
+            p_pr = element.pPr
+            if p_pr is not None:
+                if p_pr.pStyle is not None and p_pr.pStyle.val in heading_styles:
+                    kind, level = "style", heading_styles[p_pr.pStyle.val]
+                else:
+                    outline = p_pr.find(qn("w:outlineLvl"))
+                    if outline is not None and outline.get(qn("w:val"), "").isdigit():
+                        kind, level = "style", int(outline.get(qn("w:val"))) + 1
+            key = self._anchor_key(text, heading=kind is not None)
+            if key is not None:
+                index["keys"].setdefault(key[0], i)
+                if kind is None:
+                    kind, level = key[1], key[2]
+            if kind is not None:
+                index["texts"].setdefault(normalized, i)
+                index["headings"].append((i, kind, level, normalized))
+
+        return index
+
+    def _resolve_anchors(self, index, operations):
+        """
+        一次性为所有操作确定插入位置（body子元素下标）
+
+        锚点依次按 标题全文 -> 编号 -> 标题前缀 匹配，仍未找到的锚点
+        在一次全文遍历中统一按包含关系查找
+
+        Returns:
+            list: 与operations一一对应的插入下标，未找到锚点时为None
+        """
+        anchor_positions = {}
+        unresolved = []
+        for operation in operations:
+            anchor = operation["anchor"]
+            if not anchor or anchor in anchor_positions:
+                continue
+            normalized = self.ANCHOR_SPACE_RE.sub("", anchor)
+            position = index["texts"].get(normalized)
+            if position is None:
+                key = self._anchor_key(anchor, heading=True)
+                if key is not None:
+                    position = index["keys"].get(key[0])
+            if position is None:
+                position = next(
+                    (i for i, _, _, text in index["headings"] if text.startswith(normalized)),
+                    None,
                 )
-        else:
-            # 使用原来的纯文本插入方式
-            # 创建新段落
-            if insert_position == "start":
-                # 在文档开头插入
-                paragraph = doc.add_paragraph()
-                # 将段落移动到文档开头
-                element = paragraph._element
-                doc.element.body.insert(0, element)
+            anchor_positions[anchor] = position
+            if position is None:
+                unresolved.append((anchor, normalized))
+
+        if unresolved:
+            for i, text in index["paragraphs"]:
+                for anchor, normalized in list(unresolved):
+                    if normalized in text:
+                        anchor_positions[anchor] = i
+                        unresolved.remove((anchor, normalized))
+                if not unresolved:
+                    break
+
+        # 标题下标 -> 在headings中的序号，用于查找章节末尾
+        heading_order = {entry[0]: n for n, entry in enumerate(index["headings"])}
+
+        targets = []
+        for operation in operations:
+            position = operation["position"]
+            if position == "start":
+                targets.append(0)
+                continue
+            if position == "end":
+                targets.append(index["end"])
+                continue
+            anchor_index = anchor_positions.get(operation["anchor"])
+            if anchor_index is None:
+                targets.append(None)
+            elif position == "before":
+                targets.append(anchor_index)
+            elif position == "after":
+                targets.append(anchor_index + 1)
             else:
-                # 在文档结尾插入
-                paragraph = doc.add_paragraph()
-                
-            run = paragraph.add_run(text_to_insert)
-            # 设置字体格式
-            try:
-                self._apply_font_format(run, font_name, font_size, font_color)
-                # 设置段落对齐方式（左对齐）
-                paragraph.alignment = WD_PARAGRAPH_ALIGNMENT.LEFT
-            except Exception as e:
-                self.logger.warning(f"设置字体格式时出错: {str(e)}，使用默认格式")
+                targets.append(self._section_end(index, heading_order, anchor_index))
+        return targets
 
-        # 保存文档
-        doc.save(output_path)
+    def _section_end(self, index, heading_order, anchor_index):
+        """返回锚点所在章节的结束位置：下一个同类型且层级不低于锚点的标题之前"""
+        order = heading_order.get(anchor_index)
+        if order is None:
+            # 锚点是普通段落，章节即该段落本身
+            return anchor_index + 1
+        _, kind, level, _ = index["headings"][order]
+        for i, other_kind, other_level, _ in index["headings"][order + 1:]:
+            if other_level <= level and (other_kind == kind or other_kind == "style"):
+                return i
+        return index["end"]
+
+    def insert_operations_to_document(
+        self,
+        input_path,
+        output_path,
+        operations,
+        font_name,
+        font_size,
+        font_color,
+    ):
+        """
+        批量将多段内容插入到Word文档中锚点（标题、条款编号或原文片段）附近的位置
+
+        只解析一次文档、建立一次标题/条款索引、保存一次。
+        所有锚点先在原始文档上定位，再从后往前插入，前面的插入不会影响后面的位置
+
+        Args:
+            input_path: 输入文档路径
+            output_path: 输出文档路径
+            operations: _parse_insert_operations返回的操作列表
+            font_name: 字体名称
+            font_size: 字体大小
+            font_color: 字体颜色（十六进制）
+
+        Returns:
+            list: 每个操作的执行结果 {"anchor", "position", "applied"}
+        """
+        doc = open_document(input_path)
+        styles = self._ensure_styles(doc, font_name, font_size, font_color)
+
+        with stage("match"):
+            index = self._build_anchor_index(doc)
+            targets = self._resolve_anchors(index, operations)
+        resolved = sum(1 for target in targets if target is not None)
+        set_value("anchors_resolved", resolved)
+        set_value("anchors_unresolved", len(targets) - resolved)
+
+        # 同一位置的多个操作按给定顺序拼接
+        pending = {}
+        results = []
+        for operation, target in zip(operations, targets):
+            label = operation["anchor"] or operation["position"]
+            results.append(
+                {"anchor": label, "position": operation["position"], "applied": target is not None}
+            )
+            if target is None:
+                self.logger.warning(f"未找到锚点: {label}，已跳过该操作")
+                continue
+            if operation["is_markdown"]:
+                blocks = self._markdown_to_docx(operation["content"], doc, styles)
+            else:
+                blocks = self._plain_text_to_blocks(operation["content"], doc, styles)
+            pending.setdefault(target, []).extend(blocks)
+
+        with stage("write"):
+            for target in sorted(pending, reverse=True):
+                self._insert_blocks(doc, pending[target], target)
+
+        self._save_document(doc, output_path, input_path)
+        return results
+
+    def _save_document(self, doc, output_path, input_path):
+        """保存文档：XML部件重新序列化，未修改的图片等二进制部件直接复制原始文件中的压缩数据"""
+        save_stats = save_document(
+            doc, output_path, input_path, document_parts(doc, RT.STYLES)
+        )
+        self.logger.info(
+            f"文档保存完成，重新序列化 {save_stats['parts_written']} 个部件，"
+            f"直接复制 {save_stats['parts_copied']} 个未修改的二进制部件（{save_stats['bytes_copied']} 压缩字节）"
+        )
+
+
+def _insert_text_task(
+    blob: bytes,
+    operations: list,
+    text_to_insert: str,
+    insert_position: str,
+    font_name: str,
+    font_size: int,
+    font_color: str,
+    is_markdown: bool,
+) -> tuple:
+    """
+    文本插入任务（在工作进程中执行）：有批量操作时按锚点批量插入，否则按位置插入单段文本
+
+    Args:
+        blob: 原始Word文档内容
+        operations: 批量插入操作列表（见_parse_insert_operations），为空时使用单段文本
+        text_to_insert: 单段插入的文本
+        insert_position: 单段插入的位置
+        font_name: 字体名称
+        font_size: 字体大小
+        font_color: 十六进制字体颜色
+        is_markdown: 单段文本是否为Markdown
+
+    Returns:
+        tuple: (插入后的文档内容, 批量操作的执行结果；单段插入时为None)
+    """
+    tool = WordInsertTextTool.from_credentials({})
+    with temporary_io_files(blob, ".docx", ".docx") as (input_path, output_path):
+        results = None
+        if operations:
+            results = tool.insert_operations_to_document(
+                input_path, output_path, operations, font_name, font_size, font_color
+            )
+            if not any(r["applied"] for r in results):
+                # 没有任何操作生效时不需要输出文档
+                return b"", results
+        else:
+            # 解析和保存在内部分别计时，write只包含生成和插入内容的耗时
+            with stage("write"):
+                tool.insert_text_to_document(
+                    input_path,
+                    output_path,
+                    text_to_insert,
+                    insert_position,
+                    font_name,
+                    font_size,
+                    font_color,
+                    is_markdown,
+                )
+        with open(output_path, "rb") as f:
+            return f.read(), results
+
+
+register_task(INSERT_TEXT_TASK, _insert_text_task)